@@ -0,0 +1,421 @@
+"""
+JSON API для интеграций: /api/v1/...
+
+Ресурсы: manuscripts, reviews, publications, news, история рукописи
+(/manuscripts/<id>/history) и лента изменений (/changes, см. changes.py).
+Доступ — по той же сессии и ролям, что и у страниц сайта
+(login_required, current_user из routes.py): рукописи
+видят редакторы и администраторы (все), рецензенты (назначенные) и
+авторы (свои), рецензии — редакторы, администраторы и рецензенты
+(свои), выпуски и новости — все. Историю своей рукописи автор видит
+без участников, комментариев и событий рецензирования (слепое
+рецензирование).
+
+Параметры списков:
+  after / before / per_page — постранично по курсору, как на страницах
+                              (pagination.keyset_paginate); ссылки на
+                              соседние страницы — в links.next / links.prev;
+  fields=id,title           — только перечисленные поля (из БД читаются
+                              только нужные колонки); для связанных
+                              объектов — fields[author]=id,full_name;
+  include=author,reviews    — связанные объекты; каждая связь загружается
+                              одним запросом на всю страницу.
+Ответы получают ETag по содержимому; запрос с If-None-Match получает 304.
+JSON собирается orjson, если пакет установлен, иначе стандартным json.
+"""
+import hashlib
+import json
+from collections import defaultdict, namedtuple
+from datetime import date, datetime
+
+from flask import Blueprint, Response, abort, current_app, request, stream_with_context, url_for
+from sqlalchemy import select
+from sqlalchemy.orm import load_only
+from werkzeug.exceptions import HTTPException
+
+from models import (db, User, Manuscript, Review, Publication, News, ManuscriptHistory,
+                    JournalSection, Keyword, manuscript_keywords)
+from pagination import keyset_paginate
+import changes
+from routes import current_user, login_required
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+
+# --- Сериализация ---
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError('Не сериализуется в JSON: %r' % type(value))
+
+
+def dumps(data):
+    if orjson is not None:
+        return orjson.dumps(data, default=_default)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=_default).encode('utf-8')
+
+
+def json_response(data, status=200):
+    body = dumps(data)
+    response = current_app.response_class(body, status=status, mimetype='application/json')
+    if status == 200:
+        response.set_etag(hashlib.sha1(body).hexdigest())
+        response.cache_control.no_cache = True
+        if current_user():
+            response.cache_control.private = True
+        return response.make_conditional(request)
+    return response
+
+
+@api.errorhandler(HTTPException)
+def api_error(e):
+    return json_response({'error': e.description}, e.code)
+
+
+# --- Описание ресурсов ---
+
+# loader(ключи, пользователь) -> {ключ: объект или список}; key — колонка основной записи
+Include = namedtuple('Include', 'key loader many')
+
+# fields — допустимые колонки; order — колонка сортировки для курсора
+Resource = namedtuple('Resource', 'model fields default_fields order includes')
+
+USER_FIELDS = ('id', 'full_name', 'role')
+
+# роли, которым доступны все рукописи, рецензии и история
+STAFF_ROLES = ('staff', 'admin')
+
+
+def _rows(query, fields, key=None):
+    """Строки запроса как словари с полями fields (+ key для группировки)."""
+    for row in db.session.execute(query):
+        mapping = row._mapping
+        yield (mapping[key] if key else None), {name: mapping[name] for name in fields}
+
+
+def _requested(name, allowed, default):
+    value = request.args.get(name)
+    if not value:
+        return default
+    fields = tuple(dict.fromkeys(f.strip() for f in value.split(',') if f.strip()))
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        abort(400, description='Неизвестные поля %s: %s' % (name, ', '.join(unknown)))
+    return fields
+
+
+def _by_id(model, allowed):
+    def loader(keys, user, fields):
+        columns = [getattr(model, name) for name in fields]
+        return {key: item for key, item in _rows(
+            select(model.id.label('_key'), *columns).where(model.id.in_(keys)), fields, '_key')}
+    loader.model = model
+    loader.fields = allowed
+    return loader
+
+
+def _children(model, fk, allowed, order, scope=None):
+    def loader(keys, user, fields):
+        columns = [getattr(model, name) for name in fields]
+        query = select(fk.label('_key'), *columns).where(fk.in_(keys)).order_by(fk, order, model.id)
+        if scope is not None:
+            query = scope(query, user)
+        grouped = defaultdict(list)
+        for key, item in _rows(query, fields, '_key'):
+            grouped[key].append(item)
+        return grouped
+    loader.model = model
+    loader.fields = allowed
+    return loader
+
+
+def _manuscript_keywords(keys, user, fields):
+    grouped = defaultdict(list)
+    for key, value in db.session.execute(
+            select(manuscript_keywords.c.manuscript_id, Keyword.value)
+            .join(Keyword, Keyword.id == manuscript_keywords.c.keyword_id)
+            .where(manuscript_keywords.c.manuscript_id.in_(keys))
+            .order_by(Keyword.value)):
+        grouped[key].append(value)
+    return grouped
+_manuscript_keywords.model = Keyword
+_manuscript_keywords.fields = ()
+
+
+def _reviews_scope(query, user):
+    # рецензенты видят только свои рецензии, авторы — никаких (слепое рецензирование)
+    if user.role in STAFF_ROLES:
+        return query
+    if user.role == 'reviewer':
+        return query.where(Review.reviewer_id == user.id)
+    abort(403, description='Рецензии недоступны.')
+
+
+def _history_scope(query, user):
+    if user.role in STAFF_ROLES:
+        return query
+    if user.role == 'author':
+        # автору доступны только свои рукописи — их и выбирает основной запрос
+        return query.where(ManuscriptHistory.action.notin_(AUTHOR_HIDDEN_ACTIONS))
+    abort(403, description='История рукописей недоступна.')
+
+
+def _visible(model, fields, user):
+    """Поля model, которые может видеть пользователь."""
+    if model is ManuscriptHistory and user is not None and user.role == 'author':
+        return tuple(name for name in fields if name in AUTHOR_HISTORY_FIELDS)
+    return fields
+
+
+REVIEW_FIELDS = ('id', 'manuscript_id', 'reviewer_id', 'text', 'score', 'status', 'created_at')
+HISTORY_FIELDS = ('id', 'manuscript_id', 'actor_id', 'actor_role', 'action', 'comment', 'created_at')
+# автор видит в истории только что и когда произошло: участники и комментарии
+# (имена рецензентов, оценки) и события рецензирования скрыты
+AUTHOR_HISTORY_FIELDS = ('id', 'manuscript_id', 'action', 'created_at')
+AUTHOR_HIDDEN_ACTIONS = ('reviewer_assigned', 'review_submitted')
+
+RESOURCES = {
+    'manuscripts': Resource(
+        Manuscript,
+        fields=('id', 'title', 'description', 'status', 'created_at', 'updated_at', 'author_id',
+                'publication_id', 'section_id', 'file_name', 'file_size'),
+        default_fields=('id', 'title', 'status', 'created_at', 'author_id', 'publication_id'),
+        order=Manuscript.created_at,
+        includes={
+            'author': Include('author_id', _by_id(User, USER_FIELDS), False),
+            'publication': Include('publication_id', _by_id(Publication, ('id', 'type', 'title', 'pub_date')), False),
+            'section': Include('section_id', _by_id(JournalSection, ('id', 'title')), False),
+            'keywords': Include('id', _manuscript_keywords, True),
+            'reviews': Include('id', _children(Review, Review.manuscript_id, REVIEW_FIELDS,
+                                               Review.created_at, _reviews_scope), True),
+            'history': Include('id', _children(ManuscriptHistory, ManuscriptHistory.manuscript_id, HISTORY_FIELDS,
+                                               ManuscriptHistory.created_at, _history_scope), True),
+        },
+    ),
+    'reviews': Resource(
+        Review,
+        fields=REVIEW_FIELDS,
+        default_fields=REVIEW_FIELDS,
+        order=Review.created_at,
+        includes={
+            'manuscript': Include('manuscript_id', _by_id(Manuscript, ('id', 'title', 'status', 'created_at')), False),
+            'reviewer': Include('reviewer_id', _by_id(User, USER_FIELDS), False),
+        },
+    ),
+    'publications': Resource(
+        Publication,
+        fields=('id', 'type', 'title', 'pub_date', 'description'),
+        default_fields=('id', 'type', 'title', 'pub_date', 'description'),
+        order=Publication.pub_date,
+        includes={
+            'manuscripts': Include('id', _children(
+                Manuscript, Manuscript.publication_id, ('id', 'title', 'description', 'author_id', 'created_at'),
+                Manuscript.created_at, lambda query, user: query.where(Manuscript.status == 'published')), True),
+        },
+    ),
+    'news': Resource(
+        News,
+        fields=('id', 'title', 'content', 'published_at'),
+        default_fields=('id', 'title', 'content', 'published_at'),
+        order=News.published_at,
+        includes={},
+    ),
+    'history': Resource(
+        ManuscriptHistory,
+        fields=HISTORY_FIELDS,
+        default_fields=HISTORY_FIELDS,
+        order=ManuscriptHistory.created_at,
+        includes={
+            'actor': Include('actor_id', _by_id(User, USER_FIELDS), False),
+        },
+    ),
+}
+
+
+# --- Выборка ---
+
+def _scoped(name, user):
+    """Запрос ресурса с учётом роли пользователя (как на страницах сайта)."""
+    if name == 'manuscripts':
+        if user.role in STAFF_ROLES:
+            return Manuscript.query
+        if user.role == 'reviewer':
+            return Manuscript.query.filter(Manuscript.id.in_(
+                select(Review.manuscript_id).where(Review.reviewer_id == user.id)))
+        if user.role == 'author':
+            return Manuscript.query.filter_by(author_id=user.id)
+    elif name == 'reviews':
+        if user.role in STAFF_ROLES:
+            return Review.query
+        if user.role == 'reviewer':
+            return Review.query.filter_by(reviewer_id=user.id)
+    elif name == 'history':
+        if user.role in STAFF_ROLES:
+            return ManuscriptHistory.query
+        if user.role == 'author':
+            return _history_scope(ManuscriptHistory.query.join(Manuscript), user) \
+                .filter(Manuscript.author_id == user.id)
+    elif name in ('publications', 'news'):
+        return RESOURCES[name].model.query
+    abort(403, description='Недостаточно прав.')
+
+
+def _prepare(name, query, user):
+    """Разбирает fields/include и ограничивает загружаемые колонки."""
+    resource = RESOURCES[name]
+    allowed = _visible(resource.model, resource.fields, user)
+    if allowed != resource.fields:
+        # скрытые поля недоступны и через связанные объекты (actor)
+        resource = resource._replace(includes={})
+    fields = _requested('fields', allowed, _visible(resource.model, resource.default_fields, user))
+    includes = _requested('include', resource.includes, ())
+    needed = set(fields) | {'id', resource.order.key} | {resource.includes[i].key for i in includes}
+    query = query.options(load_only(*[getattr(resource.model, n) for n in sorted(needed)]))
+    return resource, fields, includes, query
+
+
+def _serialize(resource, items, fields, includes, user):
+    data = [{name: getattr(item, name) for name in fields} for item in items]
+    for name in includes:
+        include = resource.includes[name]
+        keys = {getattr(item, include.key) for item in items} - {None}
+        allowed = _visible(include.loader.model, include.loader.fields, user)
+        nested = allowed and _requested('fields[%s]' % name, allowed, allowed)
+        loaded = include.loader(keys, user, nested) if keys else {}
+        for row, item in zip(data, items):
+            row[name] = loaded.get(getattr(item, include.key), [] if include.many else None)
+    return data
+
+
+def _list(name, query, user):
+    resource, fields, includes, query = _prepare(name, query, user)
+    page = keyset_paginate(query, resource.order, resource.model.id)
+    return json_response({
+        'data': _serialize(resource, page.items, fields, includes, user),
+        'links': {'next': page.next_url, 'prev': page.prev_url},
+    })
+
+
+def _detail(name, query, ident, user):
+    resource, fields, includes, query = _prepare(name, query, user)
+    item = query.filter(resource.model.id == ident).first()
+    if item is None:
+        abort(404, description='Не найдено.')
+    return json_response({'data': _serialize(resource, [item], fields, includes, user)[0]})
+
+
+# --- Маршруты ---
+
+@api.route('/')
+def index():
+    return json_response({
+        'resources': {name: url_for('api.%s_list' % name) for name in RESOURCES if name != 'history'},
+        'user': {'id': current_user().id, 'role': current_user().role} if current_user() else None,
+    })
+
+
+@api.route('/manuscripts')
+@login_required()
+def manuscripts_list():
+    query = _scoped('manuscripts', current_user())
+    status = request.args.get('status')
+    if status:
+        query = query.filter(Manuscript.status == status)
+    return _list('manuscripts', query, current_user())
+
+
+@api.route('/manuscripts/<int:manuscript_id>')
+@login_required()
+def manuscripts_detail(manuscript_id):
+    return _detail('manuscripts', _scoped('manuscripts', current_user()), manuscript_id, current_user())
+
+
+@api.route('/manuscripts/<int:manuscript_id>/history')
+@login_required()
+def manuscript_history(manuscript_id):
+    user = current_user()
+    if _scoped('manuscripts', user).filter(Manuscript.id == manuscript_id).first() is None:
+        abort(404, description='Рукопись не найдена.')
+    query = _scoped('history', user).filter(ManuscriptHistory.manuscript_id == manuscript_id)
+    return _list('history', query, user)
+
+
+@api.route('/reviews')
+@login_required()
+def reviews_list():
+    return _list('reviews', _scoped('reviews', current_user()), current_user())
+
+
+@api.route('/reviews/<int:review_id>')
+@login_required()
+def reviews_detail(review_id):
+    return _detail('reviews', _scoped('reviews', current_user()), review_id, current_user())
+
+
+@api.route('/publications')
+def publications_list():
+    return _list('publications', _scoped('publications', None), current_user())
+
+
+@api.route('/publications/<int:publication_id>')
+def publications_detail(publication_id):
+    return _detail('publications', _scoped('publications', None), publication_id, current_user())
+
+
+@api.route('/news')
+def news_list():
+    return _list('news', _scoped('news', None), current_user())
+
+
+@api.route('/news/<int:news_id>')
+def news_detail(news_id):
+    return _detail('news', _scoped('news', None), news_id, current_user())
+
+
+# --- Лента изменений (changes.py) ---
+
+def _require_staff():
+    if current_user().role not in STAFF_ROLES:
+        abort(403, description='Недостаточно прав.')
+
+
+def _feed_position(token):
+    if token == 'latest':
+        return changes.latest_position()
+    try:
+        return changes.decode_token(token)
+    except changes.InvalidToken as e:
+        abort(400, description=str(e))
+
+
+@api.route('/changes')
+@login_required()
+def changes_feed():
+    """?since=<токен из next> — изменения после него; без since — с начала; since=latest — только токен."""
+    _require_staff()
+    since = request.args.get('since')
+    limit = min(request.args.get('limit', current_app.config.get('CHANGES_PAGE_SIZE', 500), type=int),
+                current_app.config.get('CHANGES_PAGE_SIZE', 500))
+    position = _feed_position(since)
+    if since == 'latest':
+        return json_response({'history': [], 'manuscripts': [], 'next': changes.encode_token(position),
+                              'has_more': False})
+    return json_response(changes.feed_page(position, max(limit, 1)))
+
+
+@api.route('/changes/stream')
+@login_required()
+def changes_stream():
+    _require_staff()
+    position = _feed_position(request.headers.get('Last-Event-ID') or request.args.get('since'))
+    response = Response(stream_with_context(changes.stream_changes(position, dumps)),
+                        mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # nginx не должен буферизовать поток
+    return response
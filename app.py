@@ -1,12 +1,29 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_wtf import CSRFProtect
+from werkzeug.middleware.proxy_fix import ProxyFix
 import os
 
 from config import Config
-from models import db
-from db_init import init_db
+from models import db, User
+from db_init import init_db, init_seed
+from migrations import init_migrations
 from routes import routes
+from api import api
+from db_profile import init_db_profile
+from db_routing import init_db_routing
+from query_profiles import init_query_budget
+from instrumentation import init_instrumentation
+from profiler import init_profiler
+from passwords import init_passwords
+from ratelimit import init_rate_limits
+from stats import init_counters
+from page_cache import page_cache
+from search import init_search
+from extraction import init_extraction
+from storage import init_storage
+from jobs import init_jobs
+from assignment import init_assignment
 
 def create_app():
     app = Flask(__name__,
@@ -14,20 +31,67 @@ def create_app():
                 static_folder='static')
     app.config.from_object(Config)
 
+    # Адрес клиента и схема из заголовков доверенных прокси (TRUSTED_PROXIES), а не адрес nginx
+    proxies = app.config.get('TRUSTED_PROXIES')
+    if proxies:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies, x_proto=proxies)
+
     # Инициализация CSRF защиты для Flask-WTF
     csrf = CSRFProtect(app)
 
     # Инициализация базы данных
     db.init_app(app)
+    # PRAGMA SQLite для профиля DB_PROFILE=production
+    init_db_profile(app)
+    # Чтение публичных страниц и отчётов из реплики (если задан DATABASE_REPLICA_URL)
+    init_db_routing(app)
+
+    # Схема БД по версионным миграциям (migrations.py, команды db-upgrade и db-status)
+    init_migrations(app)
+
+    # Наполнение демо-данными при первом запуске (пустая БД)
+    with app.app_context():
+        first_run = User.query.first() is None
+    if first_run:
+        init_db(app)
+    # Синтетические данные большого объёма: команда seed
+    init_seed(app)
+
+    # Хранилище файлов по содержимому: таблица stored_files, колонки рукописей, команда gc-uploads
+    init_storage(app)
+
+    # Таблица счётчиков статистики (stats_counters) и команда rebuild-counters
+    init_counters(app)
+
+    # Кэш публичных страниц (сбрасывается при изменении новостей и публикаций)
+    page_cache.init_app(app)
+
+    # Таблица извлечённых текстов рукописей и команда extract-texts
+    init_extraction(app)
+
+    # Полнотекстовый индекс (SQLite FTS5) и команда rebuild-search-index
+    init_search(app)
+
+    # Очередь фоновых задач и команда worker
+    init_jobs(app)
+
+    # Назначение рецензентов с учётом нагрузки и команда assign-reviewers
+    init_assignment(app)
 
-    # Автоматическое создание и наполнение базы при первом запуске
-    db_path = app.config['SQLALCHEMY_DATABASE_URI'].replace('sqlite:///', '')
-    if not os.path.exists(db_path):
-        with app.app_context():
-            init_db(app)
+    # Контроль числа SQL-запросов на страницу (N+1 в шаблонах)
+    init_query_budget(app)
+    # Server-Timing, /metrics и журнал медленных SQL (INSTRUMENTATION=1)
+    init_instrumentation(app)
+    # Профилирование выбранных запросов по команде администратора (/admin/profiler)
+    init_profiler(app)
+    # Пул хэширования паролей и ограничение попыток входа/регистрации
+    init_passwords(app)
+    init_rate_limits(app)
 
     # Регистрация всех маршрутов (routes.py)
     app.register_blueprint(routes)
+    # JSON API для интеграций (api.py)
+    app.register_blueprint(api)
 
     # Создание папок для загрузки файлов (если ещё нет)
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -0,0 +1,243 @@
+"""
+Назначение рецензентов рукописям с учётом нагрузки и специализации.
+
+Пакет рукописей распределяется за один проход. Всё, что нужно для
+выбора, читается заранее несколькими запросами (load_tables):
+рецензенты, их нагрузка (открытые рецензии, status = 'pending'),
+разделы и ключевые слова рецензентов, раздел и ключевые слова рукописей
+пакета, уже назначенные рецензии. Дальше plan() работает только
+со словарями в памяти — без запросов на каждую рукопись.
+
+Рецензент оценивается для рукописи как
+    affinity - REVIEW_LOAD_PENALTY * нагрузка,
+где affinity = REVIEW_AFFINITY_SECTION за совпадение раздела журнала
+плюс REVIEW_AFFINITY_KEYWORD за каждое общее ключевое слово.
+Не назначаются автор рукописи (конфликт интересов), рецензенты, уже
+рецензирующие её, и рецензенты с REVIEWER_MAX_OPEN открытыми рецензиями.
+Рукописи обходятся от старых к новым, каждое назначение сразу
+увеличивает нагрузку рецензента — пакет распределяется равномерно.
+
+Кандидаты для рукописи — рецензенты с общей тематикой (по обратным
+индексам «раздел → рецензенты», «слово → рецензенты») и несколько
+наименее загруженных из кучи по нагрузке: остальные рецензенты без
+общей тематики не могут оказаться лучше них, поэтому перебирать всех
+не нужно.
+
+Запуск для всех поданных рукописей: `flask assign-reviewers`.
+"""
+import heapq
+from collections import Counter, defaultdict, namedtuple
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import func, insert, select, update
+
+import stats
+from history import record_history
+from models import (db, User, Manuscript, Review,
+                    manuscript_keywords, reviewer_sections, reviewer_keywords)
+from notifications import notify_many
+
+# рецензентов назначают только рукописям на этих этапах
+ASSIGNABLE_STATUSES = ('submitted', 'under_review')
+
+Settings = namedtuple('Settings', 'per_manuscript max_open section_weight keyword_weight load_penalty')
+
+# рукопись пакета; keywords — frozenset id ключевых слов
+Item = namedtuple('Item', 'id author_id section_id status keywords')
+
+# reviewers — {id: ФИО}; load — {id: открытых рецензий};
+# reviewer_sections / reviewer_keywords — {id рецензента: set}; manuscripts — [Item];
+# existing — {id рукописи: set id рецензентов}
+Tables = namedtuple('Tables', 'reviewers load reviewer_sections reviewer_keywords manuscripts existing')
+
+Assignment = namedtuple('Assignment', 'manuscript_id reviewer_id score')
+
+
+def settings(config):
+    return Settings(
+        per_manuscript=config.get('REVIEWS_PER_MANUSCRIPT', 2),
+        max_open=config.get('REVIEWER_MAX_OPEN', 0),
+        section_weight=config.get('REVIEW_AFFINITY_SECTION', 3),
+        keyword_weight=config.get('REVIEW_AFFINITY_KEYWORD', 1),
+        load_penalty=config.get('REVIEW_LOAD_PENALTY', 1),
+    )
+
+
+def load_tables(connection, manuscript_ids=None):
+    """Читает данные для распределения пакета: без manuscript_ids — все поданные рукописи."""
+    batch = select(Manuscript.id)
+    if manuscript_ids is None:
+        batch = batch.where(Manuscript.status == 'submitted')
+    else:
+        batch = batch.where(Manuscript.id.in_(manuscript_ids))
+
+    reviewers = dict(connection.execute(
+        select(User.id, User.full_name).where(User.role == 'reviewer', User.is_blocked.isnot(True))
+    ).all())
+    load = dict(connection.execute(
+        select(Review.reviewer_id, func.count()).where(Review.status == 'pending').group_by(Review.reviewer_id)
+    ).all())
+
+    sections = defaultdict(set)
+    for user_id, section_id in connection.execute(select(reviewer_sections)):
+        sections[user_id].add(section_id)
+    keywords = defaultdict(set)
+    for user_id, keyword_id in connection.execute(select(reviewer_keywords)):
+        keywords[user_id].add(keyword_id)
+
+    manuscript_words = defaultdict(set)
+    for manuscript_id, keyword_id in connection.execute(
+            select(manuscript_keywords).where(manuscript_keywords.c.manuscript_id.in_(batch))):
+        manuscript_words[manuscript_id].add(keyword_id)
+    existing = defaultdict(set)
+    for manuscript_id, reviewer_id in connection.execute(
+            select(Review.manuscript_id, Review.reviewer_id).where(Review.manuscript_id.in_(batch))):
+        existing[manuscript_id].add(reviewer_id)
+
+    manuscripts = [
+        Item(row.id, row.author_id, row.section_id, row.status, frozenset(manuscript_words.get(row.id, ())))
+        for row in connection.execute(
+            select(Manuscript.id, Manuscript.author_id, Manuscript.section_id, Manuscript.status)
+            .where(Manuscript.id.in_(batch))
+            .order_by(Manuscript.created_at, Manuscript.id)
+        )
+    ]
+    return Tables(reviewers, load, sections, keywords, manuscripts, existing)
+
+
+def _least_loaded(heap, load, count, skip, max_open):
+    """До count наименее загруженных рецензентов не из skip; куча остаётся прежней."""
+    found, aside = [], []
+    while heap and len(found) < count:
+        entry = heapq.heappop(heap)
+        current, reviewer_id = entry
+        if current != load[reviewer_id]:
+            continue  # устаревшая запись: нагрузка с тех пор выросла
+        if current >= max_open:
+            continue  # нагрузка только растёт — рецензент больше не понадобится
+        aside.append(entry)
+        if reviewer_id not in skip:
+            found.append(reviewer_id)
+    for entry in aside:
+        heapq.heappush(heap, entry)
+    return found
+
+
+def plan(tables, settings):
+    """
+    Распределяет пакет в памяти. Возвращает (назначения, нехватка), где
+    нехватка — {id рукописи: сколько рецензентов не нашлось}.
+    """
+    load = {reviewer_id: tables.load.get(reviewer_id, 0) for reviewer_id in tables.reviewers}
+    max_open = settings.max_open or float('inf')
+    penalty = settings.load_penalty
+
+    by_section = defaultdict(list)
+    by_keyword = defaultdict(list)
+    for reviewer_id in tables.reviewers:
+        for section_id in tables.reviewer_sections.get(reviewer_id, ()):
+            by_section[section_id].append(reviewer_id)
+        for keyword_id in tables.reviewer_keywords.get(reviewer_id, ()):
+            by_keyword[keyword_id].append(reviewer_id)
+
+    heap = [(count, reviewer_id) for reviewer_id, count in load.items()]
+    heapq.heapify(heap)
+
+    assignments = []
+    shortfall = {}
+    for item in tables.manuscripts:
+        if item.status not in ASSIGNABLE_STATUSES:
+            continue
+        taken = tables.existing.get(item.id, set())
+        need = settings.per_manuscript - len(taken)
+        if need <= 0:
+            continue
+        excluded = taken | {item.author_id}
+
+        affinity = Counter()
+        for reviewer_id in by_section.get(item.section_id, ()):
+            affinity[reviewer_id] += settings.section_weight
+        for keyword_id in item.keywords:
+            for reviewer_id in by_keyword.get(keyword_id, ()):
+                affinity[reviewer_id] += settings.keyword_weight
+
+        candidates = {reviewer_id: score for reviewer_id, score in affinity.items()
+                      if reviewer_id not in excluded and load[reviewer_id] < max_open}
+        for reviewer_id in _least_loaded(heap, load, need, excluded | affinity.keys(), max_open):
+            candidates[reviewer_id] = 0
+
+        chosen = heapq.nlargest(need, candidates, key=lambda r: (
+            candidates[r] - penalty * load[r], -load[r], -r))
+        for reviewer_id in chosen:
+            assignments.append(Assignment(item.id, reviewer_id, candidates[reviewer_id]))
+            load[reviewer_id] += 1
+            heapq.heappush(heap, (load[reviewer_id], reviewer_id))
+        if len(chosen) < need:
+            shortfall[item.id] = need - len(chosen)
+    return assignments, shortfall
+
+
+def assign_reviewers(user=None, manuscript_ids=None):
+    """
+    Назначает рецензентов пакету рукописей (по умолчанию — всем поданным)
+    в текущей транзакции: рецензии 'pending', статус under_review,
+    записи истории и уведомления рецензентам — по одному INSERT/UPDATE
+    на пакет. Возвращает (tables, назначения, нехватка); commit — за вызывающим.
+    """
+    tables = load_tables(db.session.connection(), manuscript_ids)
+    assignments, shortfall = plan(tables, settings(current_app.config))
+    if not assignments:
+        return tables, assignments, shortfall
+
+    now = datetime.utcnow()
+    db.session.execute(insert(Review), [{
+        'manuscript_id': a.manuscript_id,
+        'reviewer_id': a.reviewer_id,
+        'status': 'pending',
+        'created_at': now,
+    } for a in assignments])
+
+    statuses = {item.id: item.status for item in tables.manuscripts}
+    started = sorted({a.manuscript_id for a in assignments if statuses[a.manuscript_id] == 'submitted'})
+    if started:
+        # обходит события ORM — счётчик статусов переносится явно, по реально изменённым строкам
+        moved = db.session.execute(
+            update(Manuscript).where(Manuscript.id.in_(started), Manuscript.status == 'submitted')
+            .values(status='under_review')
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        stats.adjust_counter(db.session.connection(), 'manuscripts.status',
+                             'submitted', 'under_review', moved)
+
+    # без имени рецензента: историю видит автор, а редакция видит рецензента в рецензии
+    record_history([a.manuscript_id for a in assignments], 'reviewer_assigned', user, 'Назначен рецензент.')
+    notify_many('review_assigned', [
+        {'manuscript_id': a.manuscript_id, 'reviewer_id': a.reviewer_id} for a in assignments
+    ])
+    return tables, assignments, shortfall
+
+
+def init_assignment(app):
+    app.cli.add_command(assign_reviewers_command)
+
+
+@click.command('assign-reviewers')
+@click.option('--dry-run', is_flag=True, help='Только показать распределение, ничего не записывать.')
+@with_appcontext
+def assign_reviewers_command(dry_run):
+    """Назначить рецензентов всем поданным рукописям."""
+    if dry_run:
+        tables = load_tables(db.session.connection())
+        assignments, shortfall = plan(tables, settings(current_app.config))
+    else:
+        tables, assignments, shortfall = assign_reviewers()
+        db.session.commit()
+    per_reviewer = Counter(a.reviewer_id for a in assignments)
+    click.echo('Рукописей: %d, назначений: %d, с нехваткой рецензентов: %d'
+               % (len(tables.manuscripts), len(assignments), len(shortfall)))
+    for reviewer_id, count in per_reviewer.most_common():
+        click.echo('  %s: +%d (открытых было %d)'
+                   % (tables.reviewers[reviewer_id], count, tables.load.get(reviewer_id, 0)))
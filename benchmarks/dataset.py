@@ -0,0 +1,55 @@
+"""
+Синтетические данные для нагрузочных тестов — тот же генератор, что
+у команды ``flask --app app seed`` (db_init.seed_data): пользователи всех
+ролей, выпуски, новости, рукописи с распределением по статусам,
+рецензии, история и обращения. Данные детерминированы при одном и том
+же seed.
+
+Служебные учётные записи для сценариев нагрузки — ACCOUNTS, пароль
+BENCH_PASSWORD.
+
+Отдельный запуск (создаёт файл БД по схеме миграций):
+    python benchmarks/dataset.py --scale 100k --db /tmp/bench.sqlite3
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+
+from db_init import SEED_ACCOUNTS, SEED_PASSWORDS, parse_scale, seed_data
+
+ACCOUNTS = SEED_ACCOUNTS
+BENCH_PASSWORD = SEED_PASSWORDS[0]
+
+
+def create_database(path, manuscripts, seed=1):
+    """Новый файл SQLite со схемой по миграциям и синтетическими данными."""
+    from migrations import upgrade
+    if os.path.exists(path):
+        os.remove(path)
+    engine = create_engine('sqlite:///' + path)
+    upgrade(engine)
+    with engine.begin() as connection:
+        counts = seed_data(connection, manuscripts, seed)
+    engine.dispose()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', default='1k', help='1k, 100k, 1m или число рукописей')
+    parser.add_argument('--db', required=True, help='путь к создаваемому файлу SQLite')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    started = time.perf_counter()
+    counts = create_database(args.db, parse_scale(args.scale), args.seed)
+    print('%s за %.1f с' % (', '.join('%s: %d' % item for item in counts.items()),
+                             time.perf_counter() - started))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,294 @@
+"""
+Нагрузочный тест основных маршрутов на синтетических данных.
+
+Набор данных создаётся benchmarks/dataset.py (1k / 100k / 1m рукописей)
+во временном файле SQLite, либо берётся готовый (--db). Виртуальные
+пользователи четырёх ролей входят на сайт и по кругу выполняют свои
+сценарии:
+  author   — lk;
+  staff    — lk, manuscript_list, publish_manuscript (POST);
+  reviewer — lk, review_form (POST);
+  admin    — admin_reports, выгрузка CSV за месяц.
+Каждые --relogin итераций пользователь входит заново (замер login).
+
+Режимы (--mode):
+  client — Flask test client в том же процессе, по одному пользователю
+           каждой роли поочерёдно (время самого приложения, без конкуренции);
+  wsgi   — настоящий WSGI-сервер (werkzeug, потоки) и HTTP-клиенты
+           в --users потоках;
+  both   — оба по очереди.
+
+По каждому маршруту печатаются p50/p95/p99 времени ответа, среднее число
+SQL-запросов (заголовок X-Query-Count, который тест добавляет к ответам)
+и ошибки; по режиму — RSS процесса. С --baseline результаты сравниваются
+с сохранённым эталоном (регрессия: медиана выше эталонной больше чем на
+--tolerance или больше SQL-запросов; хвосты p95/p99 на коротком прогоне
+слишком шумные для сравнения; код возврата 1), --save-baseline
+записывает текущие результаты как эталон. Эталон зависит от машины —
+сохраняйте его там же, где сравниваете.
+
+Запуск из корня проекта:
+    python benchmarks/load_test.py --scale 1k --mode both --users 8 --iterations 30
+    python benchmarks/load_test.py --scale 1k --baseline benchmarks/baseline.json
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dataset import ACCOUNTS, BENCH_PASSWORD, create_database, parse_scale
+
+ROLES = ('author', 'staff', 'reviewer', 'admin')
+
+
+def scenario(role, manuscripts, rnd):
+    """Шаги одной итерации: (имя, метод, путь, данные формы)."""
+    manuscript_id = rnd.randint(1, manuscripts)
+    if role == 'author':
+        return [('lk', 'GET', '/lk', None)]
+    if role == 'staff':
+        return [('lk', 'GET', '/lk', None),
+                ('manuscript_list', 'GET', '/manuscripts', None),
+                ('publish_manuscript', 'POST', '/manuscripts/%d/publish' % manuscript_id, {})]
+    if role == 'reviewer':
+        return [('lk', 'GET', '/lk', None),
+                ('review_form', 'POST', '/reviews/%d' % manuscript_id,
+                 {'text': 'Нагрузочный тест', 'score': str(rnd.randint(1, 5))})]
+    return [('admin_reports', 'GET', '/admin/reports', None),
+            ('export_csv', 'GET', '/admin/reports/export/csv?' + urlencode(
+                {'date_from': '2023-01-01', 'date_to': '2023-01-31'}), None)]
+
+
+# --- Клиенты ---
+
+class TestClientDriver:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data)
+        response.get_data()  # потоковые ответы (CSV) читаются целиком
+        return response.status_code, int(response.headers.get('X-Query-Count', 0))
+
+
+class HTTPDriver:
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.cookies = {}
+
+    def request(self, method, path, data=None):
+        headers = {}
+        body = None
+        if self.cookies:
+            headers['Cookie'] = '; '.join('%s=%s' % item for item in self.cookies.items())
+        if data is not None:
+            body = urlencode(data)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            for name, value in response.getheaders():
+                if name.lower() == 'set-cookie':
+                    key, _, rest = value.partition('=')
+                    self.cookies[key] = rest.split(';', 1)[0]
+            return response.status, int(response.getheader('X-Query-Count') or 0)
+        finally:
+            connection.close()
+
+
+# --- Прогон ---
+
+def virtual_user(driver, role, manuscripts, iterations, relogin, seed, results, lock):
+    rnd = random.Random(seed)
+    samples = defaultdict(list)
+    errors = defaultdict(int)
+
+    def timed(name, method, path, data=None):
+        started = time.perf_counter()
+        try:
+            status, queries = driver.request(method, path, data)
+        except OSError:
+            status, queries = 599, 0
+        samples[name].append(((time.perf_counter() - started) * 1000, queries))
+        # успешные ответы маршрутов — 200 или перенаправление после POST
+        if status >= 400:
+            errors[name] += 1
+
+    for iteration in range(iterations):
+        if iteration % relogin == 0:
+            driver.request('GET', '/logout')
+            timed('login', 'POST', '/login', {'email': ACCOUNTS[role], 'password': BENCH_PASSWORD})
+        for step in scenario(role, manuscripts, rnd):
+            timed(*step)
+
+    with lock:
+        for name, items in samples.items():
+            results['samples'][name].extend(items)
+        for name, count in errors.items():
+            results['errors'][name] += count
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def rss_mb():
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024.0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def run(app, mode, users, iterations, relogin, manuscripts, seed):
+    results = {'samples': defaultdict(list), 'errors': defaultdict(int)}
+    lock = threading.Lock()
+    server = None
+    if mode == 'wsgi':
+        from werkzeug.serving import make_server
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)  # без строки лога на каждый запрос
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def driver():
+        return TestClientDriver(app) if server is None else HTTPDriver('127.0.0.1', server.server_port)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=virtual_user, args=(
+        driver(), ROLES[n % len(ROLES)], manuscripts, iterations, relogin, seed + n, results, lock))
+        for n in range(users)]
+    for thread in threads:
+        thread.start()
+        if server is None:
+            thread.join()  # test client — пользователи по очереди
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    if server is not None:
+        server.shutdown()
+
+    report = {}
+    for name, items in sorted(results['samples'].items()):
+        timings = [t for t, _ in items]
+        report[name] = {
+            'count': len(items),
+            'p50_ms': round(percentile(timings, 0.50), 2),
+            'p95_ms': round(percentile(timings, 0.95), 2),
+            'p99_ms': round(percentile(timings, 0.99), 2),
+            'queries': round(sum(q for _, q in items) / len(items), 2),
+            'errors': results['errors'].get(name, 0),
+        }
+    total = sum(item['count'] for item in report.values())
+    return {'routes': report, 'rss_mb': round(rss_mb(), 1), 'requests_per_sec': round(total / elapsed, 1)}
+
+
+def make_app(db_path):
+    import config
+    config.Config.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + db_path
+    config.Config.UPLOAD_FOLDER = os.path.join(os.path.dirname(db_path), 'media')
+    config.Config.JOB_WORKERS = 0
+    config.Config.MAIL_SERVER = ''
+    # все виртуальные пользователи входят с 127.0.0.1 — лимит попыток входа здесь не нужен
+    config.Config.RATE_LIMIT_STORAGE = ''
+    from flask import g
+    from app import create_app
+    app = create_app()
+
+    @app.after_request
+    def _query_count_header(response):
+        # число SQL-запросов считает query_profiles.init_query_budget
+        response.headers['X-Query-Count'] = str(g.get('query_count', 0))
+        return response
+    return app
+
+
+def print_report(key, result, baseline, tolerance):
+    print('\n== %s: %.1f запросов/с, RSS %.0f МБ' % (key, result['requests_per_sec'], result['rss_mb']))
+    print('%-20s %7s %9s %9s %9s %8s %7s  %s' % ('маршрут', 'число', 'p50, мс', 'p95, мс', 'p99, мс',
+                                                 'SQL', 'ошибок', 'эталон p50 / SQL'))
+    regressions = []
+    for name, item in result['routes'].items():
+        base = (baseline or {}).get('routes', {}).get(name)
+        note = ''
+        if base:
+            note = '%.2f / %.2f' % (base['p50_ms'], base['queries'])
+            slower = item['p50_ms'] > base['p50_ms'] * (1 + tolerance) and item['p50_ms'] - base['p50_ms'] > 5
+            more_queries = item['queries'] > base['queries'] + 0.5
+            if slower or more_queries:
+                note += '  РЕГРЕССИЯ'
+                regressions.append(name)
+        print('%-20s %7d %9.2f %9.2f %9.2f %8.2f %7d  %s' % (
+            name, item['count'], item['p50_ms'], item['p95_ms'], item['p99_ms'],
+            item['queries'], item['errors'], note))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', default='1k', help='1k, 100k, 1m или число рукописей')
+    parser.add_argument('--db', help='готовая БД из dataset.py (иначе создаётся временная)')
+    parser.add_argument('--mode', choices=('client', 'wsgi', 'both'), default='both')
+    parser.add_argument('--users', type=int, default=8, help='виртуальных пользователей')
+    parser.add_argument('--iterations', type=int, default=20, help='итераций сценария на пользователя')
+    parser.add_argument('--relogin', type=int, default=10, help='повторный вход каждые N итераций')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--baseline', help='JSON с эталоном для сравнения')
+    parser.add_argument('--save-baseline', help='записать результаты как эталон в этот файл')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='допустимый рост медианы (доля)')
+    args = parser.parse_args()
+
+    manuscripts = parse_scale(args.scale)
+    db_path = args.db
+    if not db_path:
+        db_path = os.path.join(tempfile.mkdtemp(prefix='bench_load_'), 'bench.sqlite3')
+        started = time.perf_counter()
+        counts = create_database(db_path, manuscripts, args.seed)
+        print('Данные: %s (%.1f с)' % (', '.join('%s %d' % item for item in counts.items()),
+                                       time.perf_counter() - started))
+    app = make_app(db_path)
+
+    baseline = {}
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = {}
+    regressions = []
+    for mode in (('client', 'wsgi') if args.mode == 'both' else (args.mode,)):
+        users = len(ROLES) if mode == 'client' else args.users
+        key = '%s:%s' % (mode, args.scale)
+        results[key] = run(app, mode, users, args.iterations, args.relogin, manuscripts, args.seed)
+        regressions += ['%s %s' % (key, name)
+                        for name in print_report(key, results[key], baseline.get(key), args.tolerance)]
+
+    if args.save_baseline:
+        saved = {}
+        if os.path.exists(args.save_baseline):
+            with open(args.save_baseline) as f:
+                saved = json.load(f)
+        saved.update(results)
+        with open(args.save_baseline, 'w') as f:
+            json.dump(saved, f, ensure_ascii=False, indent=2, sort_keys=True)
+        print('\nЭталон записан: %s' % args.save_baseline)
+    if regressions:
+        print('\nРегрессии: %s' % ', '.join(regressions))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""
+Скорость и качество назначения рецензентов (assignment.py).
+
+В временной БД SQLite создаются рецензенты с разделами и ключевыми
+словами, рукописи с тематикой и часть уже открытых рецензий. Замеряются:
+  - пакетное распределение — load_tables() (несколько запросов на пакет)
+    и plan() (в памяти);
+  - для сравнения — подбор с запросами на каждую рукопись (нагрузка и
+    специализация рецензентов читаются заново), на выборке рукописей
+    с пересчётом на весь пакет.
+Печатается и равномерность нагрузки после распределения.
+
+Запуск из корня проекта:
+    python benchmarks/reviewer_assignment.py --manuscripts 10000 --reviewers 500
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, func, insert, select
+
+from assignment import Settings, load_tables, plan
+from models import (db, User, Manuscript, Review, JournalSection, Keyword,
+                    manuscript_keywords, reviewer_sections, reviewer_keywords)
+
+
+def prepare(engine, manuscripts, reviewers, sections, keywords, open_reviews, seed):
+    rnd = random.Random(seed)
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(JournalSection.__table__), [{'title': 'Раздел %d' % i} for i in range(sections)])
+        conn.execute(insert(Keyword.__table__), [{'value': 'слово %d' % i} for i in range(keywords)])
+        authors = manuscripts // 5
+        conn.execute(insert(User.__table__), [
+            {'full_name': 'Рецензент %d' % i, 'email': 'r%d@example.com' % i,
+             'password_hash': 'x', 'role': 'reviewer'} for i in range(reviewers)
+        ] + [
+            {'full_name': 'Автор %d' % i, 'email': 'a%d@example.com' % i,
+             'password_hash': 'x', 'role': 'author'} for i in range(authors)
+        ])
+        reviewer_ids = list(range(1, reviewers + 1))
+        author_ids = list(range(reviewers + 1, reviewers + authors + 1))
+        # часть рецензентов пишет и сами рукописи — конфликт интересов
+        author_ids += reviewer_ids[:reviewers // 10]
+
+        conn.execute(insert(reviewer_sections), [
+            {'user_id': r, 'section_id': s}
+            for r in reviewer_ids for s in rnd.sample(range(1, sections + 1), rnd.randint(1, 2))
+        ])
+        conn.execute(insert(reviewer_keywords), [
+            {'user_id': r, 'keyword_id': k}
+            for r in reviewer_ids for k in rnd.sample(range(1, keywords + 1), rnd.randint(3, 10))
+        ])
+        conn.execute(insert(Manuscript.__table__), [
+            {'title': 'Рукопись %d' % i, 'file_path': 'media/x', 'status': 'submitted',
+             'author_id': rnd.choice(author_ids), 'section_id': rnd.randint(1, sections)}
+            for i in range(manuscripts)
+        ])
+        conn.execute(insert(manuscript_keywords), [
+            {'manuscript_id': m, 'keyword_id': k}
+            for m in range(1, manuscripts + 1) for k in rnd.sample(range(1, keywords + 1), rnd.randint(2, 5))
+        ])
+        # уже открытые рецензии по рукописям, которые распределять не нужно
+        conn.execute(insert(Manuscript.__table__), [
+            {'title': 'На рецензии', 'file_path': 'media/x', 'status': 'under_review',
+             'author_id': author_ids[0]}
+        ])
+        busy = manuscripts + 1
+        conn.execute(insert(Review.__table__), [
+            {'manuscript_id': busy, 'reviewer_id': rnd.choice(reviewer_ids), 'status': 'pending'}
+            for _ in range(open_reviews)
+        ])
+
+
+def naive_pick(conn, manuscript_id, settings):
+    """Подбор для одной рукописи с запросами к БД — так выглядит распределение «по одной»."""
+    m = conn.execute(select(Manuscript.author_id, Manuscript.section_id)
+                     .where(Manuscript.id == manuscript_id)).one()
+    words = set(conn.execute(select(manuscript_keywords.c.keyword_id)
+                             .where(manuscript_keywords.c.manuscript_id == manuscript_id)).scalars())
+    taken = set(conn.execute(select(Review.reviewer_id)
+                             .where(Review.manuscript_id == manuscript_id)).scalars())
+    load = dict(conn.execute(select(Review.reviewer_id, func.count())
+                             .where(Review.status == 'pending').group_by(Review.reviewer_id)).all())
+    best = []
+    for reviewer_id in conn.execute(select(User.id).where(User.role == 'reviewer')).scalars():
+        if reviewer_id == m.author_id or reviewer_id in taken:
+            continue
+        sections = set(conn.execute(select(reviewer_sections.c.section_id)
+                                    .where(reviewer_sections.c.user_id == reviewer_id)).scalars())
+        common = words & set(conn.execute(select(reviewer_keywords.c.keyword_id)
+                                          .where(reviewer_keywords.c.user_id == reviewer_id)).scalars())
+        affinity = settings.section_weight * (m.section_id in sections) + settings.keyword_weight * len(common)
+        best.append((affinity - settings.load_penalty * load.get(reviewer_id, 0), reviewer_id))
+    return sorted(best, reverse=True)[:settings.per_manuscript]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--manuscripts', type=int, default=10000)
+    parser.add_argument('--reviewers', type=int, default=500)
+    parser.add_argument('--sections', type=int, default=20)
+    parser.add_argument('--keywords', type=int, default=300)
+    parser.add_argument('--open-reviews', type=int, default=1000, help='уже открытых рецензий')
+    parser.add_argument('--per-manuscript', type=int, default=2)
+    parser.add_argument('--max-open', type=int, default=0, help='лимит открытых рецензий (0 — без лимита)')
+    parser.add_argument('--naive-sample', type=int, default=20, help='рукописей для замера подбора «по одной»')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix='bench_assign_'), 'bench.sqlite3')
+    engine = create_engine('sqlite:///' + path)
+    started = time.perf_counter()
+    prepare(engine, args.manuscripts, args.reviewers, args.sections, args.keywords,
+            args.open_reviews, args.seed)
+    print('Подготовка БД: %.1f с' % (time.perf_counter() - started))
+
+    settings = Settings(per_manuscript=args.per_manuscript, max_open=args.max_open,
+                        section_weight=3, keyword_weight=1, load_penalty=1)
+    with engine.connect() as conn:
+        started = time.perf_counter()
+        tables = load_tables(conn)
+        loaded = time.perf_counter()
+        assignments, shortfall = plan(tables, settings)
+        planned = time.perf_counter()
+
+        sample = [item.id for item in tables.manuscripts[:args.naive_sample]]
+        naive_started = time.perf_counter()
+        for manuscript_id in sample:
+            naive_pick(conn, manuscript_id, settings)
+        naive_each = (time.perf_counter() - naive_started) / max(len(sample), 1)
+
+    print('Рукописей: %d, рецензентов: %d, назначений: %d, с нехваткой: %d'
+          % (len(tables.manuscripts), len(tables.reviewers), len(assignments), len(shortfall)))
+    print('Пакетно:  load_tables %.0f мс + plan %.0f мс = %.2f с'
+          % ((loaded - started) * 1000, (planned - loaded) * 1000, planned - started))
+    print('По одной: %.1f мс на рукопись, ~%.0f с на пакет (оценка по %d рукописям)'
+          % (naive_each * 1000, naive_each * len(tables.manuscripts), len(sample)))
+
+    load = {reviewer_id: tables.load.get(reviewer_id, 0) for reviewer_id in tables.reviewers}
+    for a in assignments:
+        load[a.reviewer_id] += 1
+    values = list(load.values())
+    print('Нагрузка после распределения: мин %d, макс %d, среднее %.1f, ст. отклонение %.2f'
+          % (min(values), max(values), statistics.mean(values), statistics.pstdev(values)))
+    with_affinity = sum(1 for a in assignments if a.score > 0)
+    print('Назначений по тематике: %.1f%%' % (100.0 * with_affinity / max(len(assignments), 1)))
+    authors = {item.id: item.author_id for item in tables.manuscripts}
+    assert not any(authors[a.manuscript_id] == a.reviewer_id for a in assignments), 'конфликт интересов'
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Сравнение пропускной способности SQLite в профилях 'default' и 'production'.
+
+Несколько потоков одновременно читают список рукописей (как manuscript_list)
+и подают рукописи с записью в историю (как submit_manuscript); считаются
+операции в секунду и ошибки «database is locked».
+
+Запуск из корня проекта:
+    python benchmarks/sqlite_profile.py --threads 8 --seconds 10
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event, insert, select
+from sqlalchemy.exc import OperationalError
+
+from config import SQLITE_PRODUCTION_PRAGMAS, SQLITE_PRODUCTION_ENGINE_OPTIONS
+from db_profile import apply_pragmas
+from models import db, User, Manuscript, ManuscriptHistory
+
+manuscripts = Manuscript.__table__
+history = ManuscriptHistory.__table__
+
+
+def make_engine(path, profile):
+    url = 'sqlite:///' + path
+    if profile == 'production':
+        engine = create_engine(url, **SQLITE_PRODUCTION_ENGINE_OPTIONS)
+
+        @event.listens_for(engine, 'connect')
+        def _pragmas(dbapi_connection, connection_record):
+            apply_pragmas(dbapi_connection, SQLITE_PRODUCTION_PRAGMAS)
+    else:
+        engine = create_engine(url)
+    return engine
+
+
+def prepare(engine, rows):
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        author_id = conn.execute(insert(User.__table__).values(
+            full_name='Автор', email='bench@example.com', password_hash='x', role='author'
+        )).inserted_primary_key[0]
+        conn.execute(insert(manuscripts), [
+            {'title': 'Рукопись %d' % i, 'file_path': 'media/x', 'status': 'submitted', 'author_id': author_id}
+            for i in range(rows)
+        ])
+    return author_id
+
+
+def worker(engine, author_id, deadline, write_ratio, stats, lock):
+    reads = writes = errors = 0
+    rnd = random.Random()
+    while time.perf_counter() < deadline:
+        try:
+            if rnd.random() < write_ratio:
+                with engine.begin() as conn:
+                    m_id = conn.execute(insert(manuscripts).values(
+                        title='Новая', file_path='media/x', status='submitted', author_id=author_id
+                    )).inserted_primary_key[0]
+                    conn.execute(insert(history).values(
+                        manuscript_id=m_id, actor_id=author_id, actor_role='author', action='submitted'
+                    ))
+                writes += 1
+            else:
+                with engine.connect() as conn:
+                    conn.execute(
+                        select(manuscripts).order_by(manuscripts.c.created_at.desc()).limit(50)
+                    ).all()
+                reads += 1
+        except OperationalError:
+            errors += 1
+    with lock:
+        stats['reads'] += reads
+        stats['writes'] += writes
+        stats['errors'] += errors
+
+
+def run(profile, threads, seconds, rows, write_ratio):
+    directory = tempfile.mkdtemp(prefix='bench_sqlite_')
+    path = os.path.join(directory, 'bench.sqlite3')
+    engine = make_engine(path, profile)
+    author_id = prepare(engine, rows)
+
+    stats = {'reads': 0, 'writes': 0, 'errors': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+    pool = [threading.Thread(target=worker, args=(engine, author_id, deadline, write_ratio, stats, lock))
+            for _ in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    engine.dispose()
+    stats['ops_per_sec'] = (stats['reads'] + stats['writes']) / seconds
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--rows', type=int, default=10000, help='рукописей в БД перед замером')
+    parser.add_argument('--write-ratio', type=float, default=0.2, help='доля операций записи')
+    args = parser.parse_args()
+
+    print('%-12s %10s %10s %10s %12s' % ('профиль', 'чтений', 'записей', 'ошибок', 'опер./с'))
+    for profile in ('default', 'production'):
+        stats = run(profile, args.threads, args.seconds, args.rows, args.write_ratio)
+        print('%-12s %10d %10d %10d %12.1f' % (
+            profile, stats['reads'], stats['writes'], stats['errors'], stats['ops_per_sec']))
+
+
+if __name__ == '__main__':
+    main()
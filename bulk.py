@@ -0,0 +1,198 @@
+"""
+Массовые операции редактора над рукописями: публикация, включение
+в выпуск, смена статуса и назначение рецензентов для списка рукописей
+за одну транзакцию.
+
+Все выбранные рукописи читаются одним SELECT (id, статус, выпуск),
+выпуск определяется один раз, статусы меняются одним условным UPDATE
+на каждый прежний статус (WHERE status = прочитанный), записи истории
+(history.py) и задачи уведомлений вставляются одним executemany. Массовый
+UPDATE не проходит через события ORM, поэтому счётчики статистики
+(stats.adjust_counter) и кэш публичных страниц (page_cache) обновляются
+здесь же явно. Для каждой рукописи возвращается результат:
+  ok        — изменена (назначены рецензенты);
+  not_found — рукописи нет;
+  skipped   — изменение не требуется или недопустимо (см. message).
+"""
+from collections import defaultdict, namedtuple
+
+from sqlalchemy import func, select, update
+
+import stats
+from assignment import ASSIGNABLE_STATUSES, assign_reviewers
+from history import record_history
+from models import db, Manuscript, Publication
+from notifications import notify_many
+from page_cache import invalidate_on_commit
+
+# статусы, которые редактор может выставить массово (см. Manuscript.status)
+STATUSES = {
+    'submitted': 'Подана',
+    'under_review': 'На рецензировании',
+    'accepted': 'Принята',
+    'rejected': 'Отклонена',
+    'published': 'Опубликована',
+}
+
+ItemResult = namedtuple('ItemResult', 'id result message')
+
+
+class BulkError(ValueError):
+    """Ошибка параметров всей операции (неизвестный статус, нет выпуска и т.п.)."""
+
+
+def parse_ids(values, limit):
+    """Список id без повторов в исходном порядке; не больше limit."""
+    ids = []
+    for value in values:
+        try:
+            ident = int(value)
+        except (TypeError, ValueError):
+            raise BulkError('Некорректный номер рукописи: %r' % (value,))
+        if ident not in ids:
+            ids.append(ident)
+    if not ids:
+        raise BulkError('Не выбрано ни одной рукописи.')
+    if len(ids) > limit:
+        raise BulkError('За один раз можно обработать не больше %d рукописей.' % limit)
+    return ids
+
+
+def resolve_publication(publication_id=None):
+    """Выпуск по id или, если не указан, последний по дате (как в publish_manuscript)."""
+    if publication_id:
+        try:
+            publication = db.session.get(Publication, int(publication_id))
+        except (TypeError, ValueError):
+            publication = None
+        if publication is None:
+            raise BulkError('Выпуск %s не найден.' % publication_id)
+        return publication
+    return (Publication.query.order_by(Publication.pub_date.desc().nullslast()).first()
+            or Publication.query.order_by(Publication.id.asc()).first())
+
+
+def _apply(ids, user, check, values, action, comment, notify_event=None):
+    """
+    check(status, publication_id) -> None, если рукопись нужно изменить,
+    иначе пояснение для skipped. values — колонки для UPDATE.
+    """
+    rows = {row.id: row for row in db.session.execute(
+        select(Manuscript.id, Manuscript.status, Manuscript.publication_id).where(Manuscript.id.in_(ids))
+    )}
+    results = []
+    changed = []
+    for ident in ids:
+        row = rows.get(ident)
+        if row is None:
+            results.append(ItemResult(ident, 'not_found', 'Рукопись не найдена'))
+            continue
+        reason = check(row.status, row.publication_id)
+        if reason:
+            results.append(ItemResult(ident, 'skipped', reason))
+        else:
+            results.append(ItemResult(ident, 'ok', None))
+            changed.append(row)
+    if not changed:
+        return results
+
+    # UPDATE условный по прочитанному статусу: рукопись, которую успели изменить
+    # параллельно, не трогается, а счётчики переносятся по реально изменённым строкам
+    by_status = defaultdict(list)
+    for row in changed:
+        by_status[row.status].append(row.id)
+    new_status = values.get('status')
+    connection = db.session.connection()
+    updated = set()
+    for old_status, status_ids in by_status.items():
+        matched = db.session.execute(
+            update(Manuscript)
+            .where(Manuscript.id.in_(status_ids), Manuscript.status == old_status)
+            .values(**values)
+            .returning(Manuscript.id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+        updated.update(matched)
+        if new_status is not None:
+            stats.adjust_counter(connection, 'manuscripts.status', old_status, new_status, len(matched))
+
+    results = [ItemResult(item.id, 'skipped', 'Рукопись изменена другим пользователем, повторите')
+               if item.result == 'ok' and item.id not in updated else item for item in results]
+    changed = [row for row in changed if row.id in updated]
+    if not changed:
+        return results
+    changed_ids = [row.id for row in changed]
+    record_history(changed_ids, action, user, comment)
+
+    # опубликованные рукописи выводятся на публичных страницах выпусков
+    if 'published' in {new_status} | {row.status for row in changed}:
+        invalidate_on_commit('publications')
+    if notify_event:
+        notify_many(notify_event, [{'manuscript_id': ident} for ident in changed_ids])
+    return results
+
+
+def bulk_publish(ids, user, publication_id=None):
+    """Публикует рукописи; не привязанные к выпуску включаются в указанный или последний выпуск."""
+    publication = resolve_publication(publication_id)
+    values = {'status': 'published'}
+    if publication is not None:
+        values['publication_id'] = func.coalesce(Manuscript.publication_id, publication.id)
+    return _apply(
+        ids, user,
+        lambda status, _: 'Уже опубликована' if status == 'published' else None,
+        values, 'published', 'Рукопись допущена к публикации редактором.',
+        notify_event='manuscript_published',
+    )
+
+
+def bulk_assign(ids, user, publication_id):
+    """Включает рукописи в выпуск, не меняя статус."""
+    if not publication_id:
+        raise BulkError('Не выбран выпуск.')
+    publication = resolve_publication(publication_id)
+    return _apply(
+        ids, user,
+        lambda _, current: 'Уже в этом выпуске' if current == publication.id else None,
+        {'publication_id': publication.id}, 'assigned',
+        'Рукопись включена в выпуск «%s».' % publication.title,
+    )
+
+
+def bulk_set_status(ids, user, status, comment=None):
+    """Меняет статус рукописей; для публикации используйте bulk_publish."""
+    if status not in STATUSES or status == 'published':
+        raise BulkError('Недопустимый статус: %s' % status)
+    return _apply(
+        ids, user,
+        lambda current, _: 'Статус уже «%s»' % STATUSES[status] if current == status else None,
+        {'status': status}, status,
+        comment or 'Статус изменён редактором: %s.' % STATUSES[status],
+    )
+
+
+def bulk_assign_reviewers(ids, user):
+    """Назначает рецензентов выбранным рукописям (см. assignment.py)."""
+    tables, assignments, shortfall = assign_reviewers(user, ids)
+    assigned = defaultdict(list)
+    for a in assignments:
+        assigned[a.manuscript_id].append(tables.reviewers[a.reviewer_id])
+    items = {item.id: item for item in tables.manuscripts}
+    results = []
+    for ident in ids:
+        item = items.get(ident)
+        if item is None:
+            results.append(ItemResult(ident, 'not_found', 'Рукопись не найдена'))
+        elif item.status not in ASSIGNABLE_STATUSES:
+            results.append(ItemResult(ident, 'skipped', 'Рукопись в статусе «%s» не рецензируется'
+                                      % STATUSES.get(item.status, item.status)))
+        elif ident in assigned:
+            message = 'Назначены: %s' % ', '.join(assigned[ident])
+            if ident in shortfall:
+                message += ' (не хватило рецензентов: %d)' % shortfall[ident]
+            results.append(ItemResult(ident, 'ok', message))
+        elif ident in shortfall:
+            results.append(ItemResult(ident, 'skipped', 'Нет свободных рецензентов'))
+        else:
+            results.append(ItemResult(ident, 'skipped', 'Рецензенты уже назначены'))
+    return results
@@ -0,0 +1,171 @@
+"""
+Лента изменений рукописей для внешних систем (репозиторий университета,
+типография): /api/v1/changes?since=<токен> и поток Server-Sent Events
+/api/v1/changes/stream (маршруты — в api.py).
+
+Лента строится из двух последовательностей:
+  - записей ManuscriptHistory по возрастанию id (события: подача,
+    рецензия, публикация, назначение рецензента и т.п.);
+  - рукописей по возрастанию (updated_at, id) — текущее состояние всех
+    изменившихся рукописей, в том числе без записи в истории.
+Токен — позиция в обеих последовательностях (последний выданный id
+истории и последняя пара (updated_at, id)); потребитель хранит токен из
+ответа и в следующий раз получает только то, что изменилось после него.
+
+Ни одна из последовательностей не видна читателю монотонно: id истории
+выдаются при вставке, а фиксируются транзакции в своём порядке
+(в PostgreSQL запись с меньшим id из последовательности может появиться
+после записи с большим), updated_at и created_at выставляются до commit.
+Поэтому строки моложе CHANGES_SETTLE_SECONDS секунд в ленту ещё не
+попадают — за это время такие транзакции успевают завершиться, — а
+история выдаётся только до первой такой строки, чтобы курсор не
+перескочил через запись, которая ещё может появиться перед ней.
+"""
+import base64
+import json
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, or_, select
+
+from models import db, Manuscript, ManuscriptHistory
+
+HISTORY_FIELDS = ('id', 'manuscript_id', 'action', 'actor_id', 'actor_role', 'comment', 'created_at')
+MANUSCRIPT_FIELDS = ('id', 'title', 'status', 'author_id', 'publication_id', 'section_id',
+                     'file_name', 'file_sha256', 'created_at', 'updated_at')
+
+START = (0, None, 0)
+
+# сколько последних записей истории просматривает latest_position в поисках неустоявшихся
+SETTLE_LOOKBACK = 100
+
+
+class InvalidToken(ValueError):
+    pass
+
+
+def encode_token(position):
+    history_id, updated_at, manuscript_id = position
+    raw = json.dumps([history_id, updated_at.isoformat() if updated_at else None, manuscript_id],
+                     separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_token(token):
+    """Позиция (id истории, updated_at, id рукописи); пустой токен — начало ленты."""
+    if not token:
+        return START
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        history_id, updated_at, manuscript_id = json.loads(raw)
+        return (int(history_id),
+                datetime.fromisoformat(updated_at) if updated_at else None,
+                int(manuscript_id))
+    except (ValueError, TypeError):
+        raise InvalidToken('Некорректный токен ленты изменений')
+
+
+def latest_position():
+    """Текущий конец ленты — чтобы начать следить за изменениями, не выгружая всё прошлое."""
+    settled = _settled()
+    recent = db.session.execute(
+        select(ManuscriptHistory.id, ManuscriptHistory.created_at)
+        .order_by(ManuscriptHistory.id.desc()).limit(SETTLE_LOOKBACK)
+    ).all()
+    history_id = recent[0].id if recent else 0
+    for row in recent:
+        # конец ленты — перед самой ранней ещё не «устоявшейся» записью
+        if row.created_at is not None and row.created_at > settled:
+            history_id = row.id - 1
+    last = db.session.execute(
+        select(Manuscript.updated_at, Manuscript.id).where(Manuscript.updated_at <= settled)
+        .order_by(Manuscript.updated_at.desc(), Manuscript.id.desc()).limit(1)
+    ).first()
+    return (history_id, last.updated_at, last.id) if last else (history_id, None, 0)
+
+
+def _settled():
+    return datetime.utcnow() - timedelta(seconds=current_app.config.get('CHANGES_SETTLE_SECONDS', 2))
+
+
+def read_changes(position, limit):
+    """
+    Изменения после позиции: не больше limit событий истории и limit рукописей.
+    Возвращает (история, рукописи, новая позиция, есть ли ещё).
+    """
+    history_id, updated_at, manuscript_id = position
+    settled = _settled()
+
+    history = []
+    history_more = False
+    for row in db.session.execute(
+            select(*[getattr(ManuscriptHistory, name) for name in HISTORY_FIELDS])
+            .where(ManuscriptHistory.id > history_id)
+            .order_by(ManuscriptHistory.id).limit(limit + 1)):
+        if row.created_at is not None and row.created_at > settled:
+            break  # эта и следующие записи — в следующий опрос
+        if len(history) == limit:
+            history_more = True
+            break
+        history.append(dict(row._mapping))
+
+    query = select(*[getattr(Manuscript, name) for name in MANUSCRIPT_FIELDS]).where(
+        Manuscript.updated_at <= settled)
+    if updated_at is not None:
+        query = query.where(or_(
+            Manuscript.updated_at > updated_at,
+            and_(Manuscript.updated_at == updated_at, Manuscript.id > manuscript_id),
+        ))
+    manuscripts = [dict(row._mapping) for row in db.session.execute(
+        query.order_by(Manuscript.updated_at, Manuscript.id).limit(limit + 1)
+    )]
+
+    has_more = history_more or len(manuscripts) > limit
+    manuscripts = manuscripts[:limit]
+    if history:
+        history_id = history[-1]['id']
+    if manuscripts:
+        updated_at, manuscript_id = manuscripts[-1]['updated_at'], manuscripts[-1]['id']
+    return history, manuscripts, (history_id, updated_at, manuscript_id), has_more
+
+
+def feed_page(position, limit):
+    history, manuscripts, position, has_more = read_changes(position, limit)
+    return {
+        'history': history,
+        'manuscripts': manuscripts,
+        'next': encode_token(position),
+        'has_more': has_more,
+    }
+
+
+def stream_changes(position, dumps):
+    """
+    Генератор Server-Sent Events: событие 'changes' с тем же содержимым,
+    что и /changes, id события — токен. Браузерный EventSource при
+    переподключении передаёт его в Last-Event-ID и продолжает с места
+    разрыва. Поток закрывается через CHANGES_STREAM_TIMEOUT секунд,
+    чтобы не занимать поток сервера бесконечно.
+    """
+    config = current_app.config
+    limit = config.get('CHANGES_PAGE_SIZE', 500)
+    interval = config.get('CHANGES_POLL_INTERVAL', 2)
+    deadline = time.monotonic() + config.get('CHANGES_STREAM_TIMEOUT', 300)
+    heartbeat = time.monotonic()
+
+    yield 'retry: %d\n\n' % (interval * 1000)
+    while time.monotonic() < deadline:
+        page = feed_page(position, limit)
+        # транзакция чтения закрывается: следующий опрос увидит новые данные
+        db.session.close()
+        if page['history'] or page['manuscripts']:
+            position = decode_token(page['next'])
+            yield 'id: %s\nevent: changes\ndata: %s\n\n' % (page['next'], dumps(page).decode('utf-8'))
+            heartbeat = time.monotonic()
+            if page['has_more']:
+                continue
+        elif time.monotonic() - heartbeat >= 15:
+            yield ': ping\n\n'
+            heartbeat = time.monotonic()
+        time.sleep(interval)
@@ -2,12 +2,58 @@ import os
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 
+# Профиль SQLite для боевого сервера (DB_PROFILE=production)
+SQLITE_PRODUCTION_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'foreign_keys': 'ON',
+    'busy_timeout': 5000,            # мс ожидания блокировки
+    'cache_size': -64000,            # 64 МБ на соединение
+    'mmap_size': 268435456,          # 256 МБ
+    'temp_store': 'MEMORY',
+}
+SQLITE_PRODUCTION_ENGINE_OPTIONS = {
+    'pool_size': 10,
+    'max_overflow': 20,
+    'pool_timeout': 30,
+    'pool_recycle': 3600,
+    'connect_args': {'timeout': 5, 'check_same_thread': False},
+}
+
+# PostgreSQL (DATABASE_URL=postgresql://..., нужен драйвер psycopg2)
+DATABASE_URL = os.environ.get('DATABASE_URL', '').replace('postgres://', 'postgresql://', 1)
+DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL', '').replace('postgres://', 'postgresql://', 1)
+POSTGRES_ENGINE_OPTIONS = {
+    'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+    'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+    'pool_timeout': 30,
+    'pool_recycle': 1800,
+    'pool_pre_ping': True,           # отбрасывать соединения, разорванные сервером
+}
+
 class Config:
     # Секретный ключ для сессий и форм Flask-WTF
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'top-secret-key-12345'
-    # Путь к базе данных SQLite
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(BASE_DIR, 'database.sqlite3')
+    # База данных: DATABASE_URL (PostgreSQL) или файл SQLite
+    SQLALCHEMY_DATABASE_URI = DATABASE_URL or 'sqlite:///' + os.path.join(BASE_DIR, 'database.sqlite3')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Профиль подключения к БД: 'default' или 'production' (WAL, PRAGMA и пул соединений, см. db_profile.py)
+    DB_PROFILE = os.environ.get('DB_PROFILE', 'default')
+    SQLITE_PRAGMAS = SQLITE_PRODUCTION_PRAGMAS if DB_PROFILE == 'production' else {}
+    if SQLALCHEMY_DATABASE_URI.startswith('postgresql'):
+        SQLALCHEMY_ENGINE_OPTIONS = POSTGRES_ENGINE_OPTIONS
+    else:
+        SQLALCHEMY_ENGINE_OPTIONS = SQLITE_PRODUCTION_ENGINE_OPTIONS if DB_PROFILE == 'production' else {}
+    # Реплика для чтения (DATABASE_REPLICA_URL) и маршруты, которые читают из неё (см. db_routing.py)
+    SQLALCHEMY_BINDS = {'replica': DATABASE_REPLICA_URL} if DATABASE_REPLICA_URL else {}
+    DB_REPLICA_ENDPOINTS = (
+        'index', 'news', 'news_detail', 'publications', 'publication_detail',
+        'admin_reports', 'admin_reports_export_csv', 'admin_reports_export_xlsx',
+        # JSON API: выпуски и новости (api.py)
+        'news_list', 'publications_list', 'publications_detail',
+    )
+    # Применять недостающие миграции схемы при запуске (иначе — `flask db-upgrade` при выкладке)
+    AUTO_MIGRATE = os.environ.get('AUTO_MIGRATE', '1') == '1'
     # Ограничение на размер загружаемых файлов (10 МБ)
     MAX_CONTENT_LENGTH = 10 * 1024 * 1024
     # Папка для загрузки файлов (рукописи, рецензии)
@@ -16,6 +62,89 @@ class Config:
     ALLOWED_EXTENSIONS = {'pdf', 'doc', 'docx', 'rtf', 'txt'}
     # Flask-WTF config
     WTF_CSRF_ENABLED = False
+    # Постраничный вывод списков: размер страницы по умолчанию и верхняя граница для ?per_page=
+    PAGE_SIZE = 50
+    PAGE_SIZE_MAX = 200
+    # Максимум SQL-запросов на одну страницу; в режиме отладки превышение — ошибка (0 — не считать)
+    QUERY_BUDGET = int(os.environ.get('QUERY_BUDGET', 25))
+    # Кэш роли/блокировки пользователя в подписанной сессии для публичных страниц, секунды (0 — выключен)
+    SESSION_USER_CACHE_TTL = int(os.environ.get('SESSION_USER_CACHE_TTL', 0))
+    # Кэш готовых публичных страниц: 'memory', 'filesystem' (общий для процессов) или '' — выключен
+    PAGE_CACHE_TYPE = os.environ.get('PAGE_CACHE_TYPE', 'memory')
+    PAGE_CACHE_SIZE = 256
+    PAGE_CACHE_DIR = os.path.join(BASE_DIR, 'instance', 'page_cache')
+    PAGE_CACHE_TTL = 300
+    PAGE_CACHE_MAX_FILES = 2000   # записей в PAGE_CACHE_DIR; сверх этого удаляются устаревшие и старые
+    # Фоновые задачи (jobs.py): потоков-воркеров в процессе сайта (0 — задачи выполняет `flask worker`)
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+    JOB_POLL_INTERVAL = 5    # с, проверка отложенных задач и повторов
+    JOB_RETRY_DELAY = 30     # с, задержка первого повтора (далее удваивается)
+    JOB_TIMEOUT = 600        # с, после этого задача в running считается прерванной
+    JOB_CONCURRENCY = {}     # лимиты одновременных задач по видам, например {'extract_text': 4}
+    # Уведомления по e-mail (notifications.py, mailer.py); без MAIL_SERVER письма не отправляются
+    MAIL_SERVER = os.environ.get('MAIL_SERVER', '')
+    MAIL_PORT = int(os.environ.get('MAIL_PORT', 25))
+    MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS') == '1'
+    MAIL_USE_SSL = os.environ.get('MAIL_USE_SSL') == '1'
+    MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
+    MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
+    MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER', 'noreply@editorial.ru')
+    MAIL_SENDER_NAME = 'Редакционно-издательский отдел'
+    MAIL_TIMEOUT = 10
+    MAIL_POOL_SIZE = 2       # постоянных SMTP-соединений на процесс
+    MAIL_RATE_LIMIT = int(os.environ.get('MAIL_RATE_LIMIT', 60))  # писем в минуту
+    # Уведомления одного получателя за это время (с) собираются в одно письмо
+    NOTIFY_DIGEST_WINDOW = int(os.environ.get('NOTIFY_DIGEST_WINDOW', 300))
+    # Адрес сайта для ссылок в письмах
+    SITE_URL = os.environ.get('SITE_URL', 'http://localhost:5000')
+    # Замер запросов (instrumentation.py): заголовок Server-Timing, /metrics, журнал медленных SQL
+    INSTRUMENTATION = os.environ.get('INSTRUMENTATION') == '1'
+    SLOW_QUERY_MS = int(os.environ.get('SLOW_QUERY_MS', 200))
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')  # Bearer-токен для /metrics; без него /metrics закрыт
+    # Профилировщик в админ-панели (profiler.py): файлы сеансов, частота выборки стеков и пределы сеанса
+    PROFILER_DIR = os.path.join(BASE_DIR, 'instance', 'profiles')
+    PROFILER_INTERVAL_MS = 5
+    PROFILER_MAX_SECONDS = 300
+    PROFILER_MAX_REQUESTS = 500
+    PROFILER_KEEP = 20
+    # Пароли (passwords.py): параметры хэша (при смене хэши пересчитываются при входе) и пул хэширования
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_POOL = os.environ.get('PASSWORD_HASH_POOL', 'thread')   # 'thread' или 'process'
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 0))  # 0 — половина ядер
+    PASSWORD_HASH_QUEUE = 16       # задач в ожидании; сверх этого — отказ без ожидания
+    PASSWORD_HASH_TIMEOUT = 10     # с
+    # Сколько обратных прокси (nginx, балансировщик) стоит перед сайтом: столько последних адресов
+    # X-Forwarded-For и X-Forwarded-Proto им доверяется (ProxyFix). 0 — сайт принимает запросы напрямую;
+    # за прокси без этой настройки request.remote_addr — адрес прокси, и лимит входов общий для всех
+    TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', 0))
+    # Ограничение попыток входа и регистрации (ratelimit.py): 'memory', 'sqlite' (общее для процессов) или ''
+    RATE_LIMIT_STORAGE = os.environ.get('RATE_LIMIT_STORAGE', 'memory')
+    RATE_LIMIT_DB = os.path.join(BASE_DIR, 'instance', 'ratelimit.sqlite3')
+    # вид ключа -> (ёмкость корзины, пополнение попыток в минуту)
+    RATE_LIMITS = {
+        'login_ip': (20, 10),
+        'login_email': (10, 5),
+        'register_ip': (5, 1),
+    }
+    # Назначение рецензентов (assignment.py)
+    REVIEWS_PER_MANUSCRIPT = 2
+    REVIEWER_MAX_OPEN = int(os.environ.get('REVIEWER_MAX_OPEN', 10))  # открытых рецензий на рецензента (0 — без лимита)
+    REVIEW_AFFINITY_SECTION = 3   # вес совпадения раздела журнала
+    REVIEW_AFFINITY_KEYWORD = 1   # вес каждого общего ключевого слова
+    REVIEW_LOAD_PENALTY = 1       # штраф за каждую открытую рецензию
+    # Лента изменений /api/v1/changes (changes.py)
+    CHANGES_PAGE_SIZE = 500        # событий истории и рукописей в одном ответе
+    CHANGES_SETTLE_SECONDS = 2     # рукописи, изменённые позже, попадут в следующий опрос
+    CHANGES_POLL_INTERVAL = 2      # с, опрос БД в потоке Server-Sent Events
+    CHANGES_STREAM_TIMEOUT = 300   # с, после этого поток закрывается (клиент переподключается)
+    # Массовые операции над рукописями (bulk.py): не больше рукописей за один запрос
+    BULK_MAX_ITEMS = 1000
+    # Максимальная длина извлечённого текста рукописи
+    EXTRACTION_MAX_CHARS = 2000000
+    # Отдача файлов: 'python' (send_file), 'x-accel' (nginx X-Accel-Redirect) или 'x-sendfile'
+    MEDIA_DELIVERY = os.environ.get('MEDIA_DELIVERY', 'python')
+    # internal-локация nginx, указывающая на UPLOAD_FOLDER (для режима 'x-accel')
+    MEDIA_ACCEL_PREFIX = '/protected-media/'
 
 # Для совместимости
 config = Config
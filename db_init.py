@@ -1,13 +1,20 @@
-from models import db, User, Manuscript, Review, Publication, News, Message, ManuscriptHistory
+from models import (db, User, Manuscript, Review, Publication, News, Message, ManuscriptHistory,
+                    JournalSection, Keyword, manuscript_keywords, reviewer_sections, reviewer_keywords)
+from migrations import upgrade
 from werkzeug.security import generate_password_hash
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
+from sqlalchemy import func, insert, select
+from flask.cli import with_appcontext
+import click
 import os
+import random
+import time
 
 
 def init_db(app=None):
     """
     Инициализация БД: создание и первичное наполнение.
-    Вызывается из app.py при первом запуске, если БД ещё не существует.
+    Вызывается из app.py при первом запуске, если в БД ещё нет пользователей.
     """
     if app is not None:
         # ВНИМАНИЕ: здесь НЕ надо вызывать db.init_app(app) — он уже вызван в app.py
@@ -25,8 +32,8 @@ def init_db(app=None):
 
 
 def _init_and_fill():
-    # Создать таблицы
-    db.create_all()
+    # Создать или обновить схему (версионные миграции)
+    upgrade()
 
     # Проверка, если БД уже наполнена — не дублировать
     if User.query.first():
@@ -77,6 +84,14 @@ def _init_and_fill():
     db.session.add_all([pub1, pub2])
     db.session.commit()
 
+    # === Разделы журнала (для назначения рецензентов) ===
+    db.session.add_all([
+        JournalSection(title="Педагогика и образование"),
+        JournalSection(title="Информационные технологии"),
+        JournalSection(title="Экономика и управление"),
+    ])
+    db.session.commit()
+
     # === Новости ===
     news1 = News(
         title="Открыта подача рукописей",
@@ -181,6 +196,237 @@ def _init_and_fill():
     print("Database created and filled with demo data.")
 
 
+# === Синтетические данные большого объёма (команда seed) ===
+#
+# Для стенда и нагрузочных тестов (benchmarks/) нужны объёмы, которые
+# _init_and_fill построчно через ORM не вытянет. seed_data вставляет
+# строки пачками через Core (executemany, без объектов ORM и их событий)
+# в одной транзакции, рукописи — порциями по SEED_CHUNK вместе с их
+# рецензиями, историей и ключевыми словами, чтобы не держать весь набор
+# в памяти. Пароли хэшируются один раз на небольшой пул (SEED_PASSWORDS),
+# а не для каждого пользователя. Данные определяются seed: один и тот же
+# seed на пустой БД даёт те же строки (кроме солей в хэшах паролей).
+# Счётчики статистики и поисковый индекс пересчитываются после вставки.
+
+SEED_SCALES = {'1k': 1000, '100k': 100000, '1m': 1000000}
+
+SEED_PASSWORDS = ('seedpass0', 'seedpass1', 'seedpass2', 'seedpass3')
+
+# учётные записи с известным паролем (SEED_PASSWORDS[0]) — по одной на роль
+SEED_ACCOUNTS = {
+    'author': 'seed-author@example.com',
+    'staff': 'seed-staff@example.com',
+    'reviewer': 'seed-reviewer@example.com',
+    'admin': 'seed-admin@example.com',
+}
+
+# доли статусов рукописей
+SEED_STATUSES = {
+    'submitted': 30,
+    'under_review': 30,
+    'accepted': 10,
+    'rejected': 10,
+    'published': 20,
+}
+
+SEED_CHUNK = 10000
+_SEED_START = datetime(2022, 1, 1)
+_SEED_SPAN = 3 * 365 * 24 * 3600  # данные за три года, секунды
+
+
+def parse_scale(value):
+    """'1k' / '100k' / '1m' или число рукописей."""
+    return SEED_SCALES.get(str(value).lower()) or int(value)
+
+
+def _next_id(connection, model):
+    return (connection.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+def _insert_rows(connection, table, rows):
+    if rows:
+        connection.execute(insert(table), rows)
+    return len(rows)
+
+
+def seed_data(connection, manuscripts, seed=1, passwords=SEED_PASSWORDS):
+    """
+    Добавляет синтетический набор из manuscripts рукописей (схема уже создана;
+    в БД могут быть и другие данные — id и email новых строк с ними не
+    пересекаются). Возвращает число вставленных строк по таблицам.
+    """
+    rnd = random.Random(seed)
+
+    def moment():
+        return _SEED_START + timedelta(seconds=rnd.randrange(_SEED_SPAN))
+
+    hashes = [generate_password_hash(password) for password in passwords]
+    counts = dict.fromkeys(('users', 'publications', 'news', 'sections', 'keywords', 'manuscripts',
+                            'reviews', 'history', 'manuscript_keywords', 'reviewer_specialization',
+                            'messages'), 0)
+
+    # --- Пользователи ---
+    roles = {
+        'author': max(10, manuscripts // 5),
+        'reviewer': max(5, manuscripts // 50),
+        'staff': max(2, manuscripts // 2000),
+        'admin': 2,
+    }
+    taken = set(connection.execute(
+        select(User.email).where(User.email.in_(SEED_ACCOUNTS.values()))).scalars())
+    user_id = _next_id(connection, User)
+    ids = {}
+    for role, count in roles.items():
+        ids[role] = list(range(user_id, user_id + count))
+        for start in range(0, count, SEED_CHUNK):
+            rows = []
+            for n in range(start, min(count, start + SEED_CHUNK)):
+                known = n == 0 and SEED_ACCOUNTS[role] not in taken
+                rows.append({
+                    'id': user_id,
+                    'full_name': '%s %d' % (role.capitalize(), user_id),
+                    'email': SEED_ACCOUNTS[role] if known else '%s%d@seed.example.com' % (role, user_id),
+                    'password_hash': hashes[0] if known else hashes[n % len(hashes)],
+                    'role': role,
+                    'registered_at': moment(),
+                    'is_blocked': False,
+                })
+                user_id += 1
+            counts['users'] += _insert_rows(connection, User.__table__, rows)
+
+    # --- Справочники, выпуски, новости ---
+    publication_id = _next_id(connection, Publication)
+    count = max(1, manuscripts // 200)
+    counts['publications'] = _insert_rows(connection, Publication.__table__, [
+        {'id': publication_id + n, 'type': 'journal', 'title': 'Выпуск %d' % (publication_id + n),
+         'pub_date': moment().date(), 'description': 'Синтетический выпуск'}
+        for n in range(count)])
+    publication_ids = range(publication_id, publication_id + count)
+
+    counts['news'] = _insert_rows(connection, News.__table__, [
+        {'title': 'Новость %d' % n, 'content': 'Текст новости %d' % n, 'published_at': moment()}
+        for n in range(max(1, manuscripts // 100))])
+
+    section_ids = list(connection.execute(select(JournalSection.id).order_by(JournalSection.id)).scalars())
+    if not section_ids:
+        counts['sections'] = _insert_rows(connection, JournalSection.__table__,
+                                          [{'title': 'Раздел %d' % n} for n in range(1, 11)])
+        section_ids = list(connection.execute(select(JournalSection.id).order_by(JournalSection.id)).scalars())
+
+    words = ['тема %d' % n for n in range(1, 201)]
+    existing = set(connection.execute(select(Keyword.value).where(Keyword.value.in_(words))).scalars())
+    counts['keywords'] = _insert_rows(connection, Keyword.__table__,
+                                      [{'value': w} for w in words if w not in existing])
+    keyword_ids = list(connection.execute(
+        select(Keyword.id).where(Keyword.value.in_(words)).order_by(Keyword.id)).scalars())
+
+    rows = []
+    for reviewer_id in ids['reviewer']:
+        for section_id in rnd.sample(section_ids, min(len(section_ids), rnd.randint(1, 2))):
+            rows.append({'user_id': reviewer_id, 'section_id': section_id})
+    counts['reviewer_specialization'] += _insert_rows(connection, reviewer_sections, rows)
+    rows = []
+    for reviewer_id in ids['reviewer']:
+        for keyword_id in rnd.sample(keyword_ids, rnd.randint(3, 8)):
+            rows.append({'user_id': reviewer_id, 'keyword_id': keyword_id})
+    counts['reviewer_specialization'] += _insert_rows(connection, reviewer_keywords, rows)
+
+    # --- Рукописи с рецензиями, историей и ключевыми словами ---
+    statuses = list(SEED_STATUSES)
+    weights = list(SEED_STATUSES.values())
+    first_id = _next_id(connection, Manuscript)
+    for start in range(first_id, first_id + manuscripts, SEED_CHUNK):
+        rows, reviews, history, links = [], [], [], []
+        for manuscript_id in range(start, min(first_id + manuscripts, start + SEED_CHUNK)):
+            status = rnd.choices(statuses, weights)[0]
+            created = moment()
+            author_id = rnd.choice(ids['author'])
+            rows.append({
+                'id': manuscript_id,
+                'title': 'Рукопись %d' % manuscript_id,
+                'description': 'Аннотация рукописи %d' % manuscript_id,
+                'file_path': 'media/manuscripts/seed.txt',
+                'status': status,
+                'created_at': created,
+                'updated_at': created if status == 'submitted' else created + timedelta(days=45),
+                'author_id': author_id,
+                'publication_id': rnd.choice(publication_ids) if status == 'published' else None,
+                'section_id': rnd.choice(section_ids),
+            })
+            for keyword_id in rnd.sample(keyword_ids, rnd.randint(2, 4)):
+                links.append({'manuscript_id': manuscript_id, 'keyword_id': keyword_id})
+            history.append({'manuscript_id': manuscript_id, 'actor_id': author_id, 'actor_role': 'author',
+                            'action': 'submitted', 'comment': 'Автор отправил рукопись в редакцию.',
+                            'created_at': created})
+            if status == 'submitted':
+                continue
+            for reviewer_id in rnd.sample(ids['reviewer'], min(2, len(ids['reviewer']))):
+                done = status != 'under_review' or rnd.random() < 0.5
+                reviews.append({'manuscript_id': manuscript_id, 'reviewer_id': reviewer_id,
+                                'text': 'Текст рецензии' if done else None,
+                                'score': rnd.randint(1, 5) if done else None,
+                                'status': 'submitted' if done else 'pending',
+                                'created_at': created + timedelta(days=rnd.randint(1, 30))})
+                if done:
+                    history.append({'manuscript_id': manuscript_id, 'actor_id': reviewer_id,
+                                    'actor_role': 'reviewer', 'action': 'review_submitted',
+                                    'comment': 'Рецензент отправил рецензию.',
+                                    'created_at': created + timedelta(days=30)})
+            if status != 'under_review':
+                history.append({'manuscript_id': manuscript_id, 'actor_id': rnd.choice(ids['staff']),
+                                'actor_role': 'staff', 'action': status, 'comment': None,
+                                'created_at': created + timedelta(days=45)})
+        counts['manuscripts'] += _insert_rows(connection, Manuscript.__table__, rows)
+        counts['manuscript_keywords'] += _insert_rows(connection, manuscript_keywords, links)
+        counts['reviews'] += _insert_rows(connection, Review.__table__, reviews)
+        counts['history'] += _insert_rows(connection, ManuscriptHistory.__table__, history)
+
+    # --- Обращения ---
+    count = max(1, manuscripts // 20)
+    for start in range(0, count, SEED_CHUNK):
+        counts['messages'] += _insert_rows(connection, Message.__table__, [
+            {'sender_id': rnd.choice(ids['author']), 'subject': 'Вопрос %d' % n,
+             'body': 'Текст обращения', 'sent_at': moment(),
+             'status': rnd.choice(('new', 'done')), 'is_read': False}
+            for n in range(start, min(count, start + SEED_CHUNK))])
+    return counts
+
+
+def init_seed(app):
+    app.cli.add_command(seed_command)
+
+
+@click.command('seed')
+@click.option('--scale', default='1k', show_default=True, help='1k, 100k, 1m или число рукописей')
+@click.option('--seed', 'seed_value', type=int, default=1, show_default=True, help='зерно генератора')
+@with_appcontext
+def seed_command(scale, seed_value):
+    """Наполнить БД синтетическими данными (пользователи, рукописи, рецензии, история, обращения)."""
+    from search import index_table, search_enabled
+    from stats import rebuild_counters
+
+    # вид документа поиска -> (модель, колонки заголовка и текста)
+    indexed = {
+        'manuscript': (Manuscript, 'title', 'description'),
+        'publication': (Publication, 'title', 'description'),
+        'news': (News, 'title', 'content'),
+        'user': (User, 'full_name', 'email'),
+    }
+    started = time.perf_counter()
+    with db.engine.begin() as connection:
+        first = {kind: _next_id(connection, model) for kind, (model, _, _) in indexed.items()}
+        counts = seed_data(connection, parse_scale(scale), seed_value)
+        if search_enabled():
+            for kind, (_, title, body) in indexed.items():
+                index_table(connection, kind, title, body, first[kind])
+    inserted = time.perf_counter()
+    rebuild_counters()
+    click.echo(', '.join('%s: %d' % item for item in counts.items() if item[1]))
+    click.echo('Строк: %d за %.1f с (пересчёт счётчиков — ещё %.1f с)' % (
+        sum(counts.values()), inserted - started, time.perf_counter() - inserted))
+    click.echo('Вход: %s, пароль %s' % (', '.join(SEED_ACCOUNTS.values()), SEED_PASSWORDS[0]))
+
+
 # Точка входа для ручного запуска (опционально)
 if __name__ == "__main__":
     init_db()
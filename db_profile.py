@@ -0,0 +1,37 @@
+"""
+Профили подключения к БД.
+
+DB_PROFILE=production включает для SQLite журнал WAL (читатели не
+блокируют писателя), synchronous=NORMAL, увеличенные cache_size и
+mmap_size, busy_timeout (вместо мгновенного «database is locked»
+соединение ждёт освобождения блокировки) и проверку внешних ключей.
+PRAGMA выполняются на каждом новом соединении пула (и основной БД, и
+реплики); параметры пула задаются SQLALCHEMY_ENGINE_OPTIONS в config.py.
+"""
+from sqlalchemy import event
+
+from models import db
+
+
+def apply_pragmas(dbapi_connection, pragmas):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute('PRAGMA %s = %s' % (name, value))
+    finally:
+        cursor.close()
+
+
+def init_db_profile(app):
+    pragmas = app.config.get('SQLITE_PRAGMAS')
+    if not pragmas:
+        return
+    with app.app_context():
+        engines = list(db.engines.values())  # основная БД и реплика для чтения
+
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        apply_pragmas(dbapi_connection, pragmas)
+
+    for engine in engines:
+        if engine.dialect.name == 'sqlite':
+            event.listen(engine, 'connect', _set_sqlite_pragmas)
@@ -0,0 +1,47 @@
+"""
+Маршрутизация запросов сессии между основной БД и репликой для чтения.
+
+Если задан DATABASE_REPLICA_URL, в SQLALCHEMY_BINDS появляется привязка
+'replica'. GET-запросы к маршрутам из DB_REPLICA_ENDPOINTS (главная,
+новости, выпуски, отчёты и выгрузки) читают из реплики; всё остальное,
+а также любые INSERT/UPDATE/DELETE и flush, идут в основную БД. После
+первой записи запрос до конца работает с основной БД, чтобы не читать
+из реплики ещё не доехавшие туда собственные изменения.
+
+Для проверки на одной машине основной БД и репликой могут быть два
+файла SQLite (реплика — копия основного файла).
+"""
+from flask import g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql.dml import UpdateBase
+
+REPLICA_BIND = 'replica'
+
+
+def _replica_requested():
+    return has_request_context() and g.get('db_replica', False)
+
+
+class RoutingSession(Session):
+    """Сессия Flask-SQLAlchemy, отправляющая чтение в реплику, когда это разрешено."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and _replica_requested():
+            if self._flushing or isinstance(clause, UpdateBase):
+                g.db_replica = False
+            else:
+                engine = self._db.engines.get(REPLICA_BIND)
+                if engine is not None:
+                    return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def init_db_routing(app):
+    endpoints = frozenset(app.config.get('DB_REPLICA_ENDPOINTS', ()))
+    if not endpoints or REPLICA_BIND not in app.config.get('SQLALCHEMY_BINDS', {}):
+        return
+
+    @app.before_request
+    def _choose_database():
+        endpoint = (request.endpoint or '').rsplit('.', 1)[-1]
+        g.db_replica = request.method in ('GET', 'HEAD') and endpoint in endpoints
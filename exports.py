@@ -0,0 +1,177 @@
+"""
+Потоковая выгрузка отчёта по рукописям в CSV и XLSX.
+
+Строки читаются из БД пачками (yield_per) сразу с ФИО автора и отдаются
+клиенту по мере формирования, поэтому память не зависит от объёма
+выгрузки, а первый байт уходит сразу. XLSX собирается «на лету»
+стандартным zipfile без внешних библиотек.
+"""
+import csv
+import io
+import zipfile
+from datetime import datetime, timedelta
+from xml.sax.saxutils import escape
+
+from sqlalchemy import select
+
+from models import db, User, Manuscript
+
+BATCH_SIZE = 1000
+
+REPORT_HEADER = [
+    "ID рукописи",
+    "Название",
+    "Автор",
+    "Статус",
+    "Дата создания",
+]
+
+
+def parse_report_filters(args):
+    """Фильтры отчёта из параметров запроса: date_from, date_to (ГГГГ-ММ-ДД), status."""
+    filters = {}
+    for name in ('date_from', 'date_to'):
+        value = args.get(name)
+        if value:
+            try:
+                filters[name] = datetime.strptime(value, '%Y-%m-%d')
+            except ValueError:
+                pass
+    status = args.get('status')
+    if status:
+        filters['status'] = status
+    return filters
+
+
+def manuscript_report_batches(filters=None, batch_size=BATCH_SIZE):
+    """Генератор пачек строк отчёта (списков значений для REPORT_HEADER)."""
+    filters = filters or {}
+    stmt = (
+        select(Manuscript.id, Manuscript.title, User.full_name,
+               Manuscript.status, Manuscript.created_at)
+        .outerjoin(User, Manuscript.author_id == User.id)
+        .order_by(Manuscript.created_at.desc(), Manuscript.id.desc())
+    )
+    if 'date_from' in filters:
+        stmt = stmt.where(Manuscript.created_at >= filters['date_from'])
+    if 'date_to' in filters:
+        # date_to включительно: до начала следующего дня
+        stmt = stmt.where(Manuscript.created_at < filters['date_to'] + timedelta(days=1))
+    if 'status' in filters:
+        stmt = stmt.where(Manuscript.status == filters['status'])
+
+    result = db.session.execute(stmt.execution_options(yield_per=batch_size))
+    for partition in result.partitions():
+        yield [
+            [m_id, title, author_name or "—", status,
+             created.strftime('%Y-%m-%d %H:%M') if created else ""]
+            for m_id, title, author_name, status, created in partition
+        ]
+
+
+def stream_csv(batches):
+    """CSV с разделителем «;» и BOM в начале (для корректного открытия в Excel)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';')
+    writer.writerow(REPORT_HEADER)
+    yield buffer.getvalue().encode('utf-8-sig')
+    for rows in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+
+
+# --- XLSX ---
+
+class _ChunkSink(io.RawIOBase):
+    """Несмещаемый поток для zipfile: накапливает записанное до следующего yield."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+_XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Рукописи" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+_XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+
+def _xlsx_row(values):
+    cells = []
+    for value in values:
+        if isinstance(value, int):
+            cells.append('<c t="n"><v>%d</v></c>' % value)
+        else:
+            cells.append('<c t="inlineStr"><is><t>%s</t></is></c>' % escape(str(value)))
+    return '<row>%s</row>' % ''.join(cells)
+
+
+def stream_xlsx(batches):
+    """Один лист с тем же набором колонок, что и CSV; строки пишутся по мере чтения."""
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', _XLSX_CONTENT_TYPES)
+        archive.writestr('_rels/.rels', _XLSX_ROOT_RELS)
+        archive.writestr('xl/workbook.xml', _XLSX_WORKBOOK)
+        archive.writestr('xl/_rels/workbook.xml.rels', _XLSX_WORKBOOK_RELS)
+        yield sink.drain()
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                '<sheetData>' + _xlsx_row(REPORT_HEADER)
+            ).encode('utf-8'))
+            for rows in batches:
+                sheet.write(''.join(_xlsx_row(row) for row in rows).encode('utf-8'))
+                chunk = sink.drain()
+                if chunk:
+                    yield chunk
+            sheet.write(b'</sheetData></worksheet>')
+    yield sink.drain()
@@ -0,0 +1,244 @@
+"""
+Фоновое извлечение текста из загруженных файлов рукописей.
+
+submit_manuscript ставит фоновую задачу 'extract_text' (jobs.py) в той
+же транзакции, что и рукопись; текст извлекается воркером, вне
+HTTP-запроса. Результат, время извлечения и ошибка сохраняются в
+manuscript_texts, откуда текст попадает в полнотекстовый индекс
+(search.py, вид 'manuscript_file').
+
+Поддерживаются форматы ALLOWED_EXTENSIONS: txt, docx и rtf читаются
+стандартной библиотекой, pdf — если установлен пакет pypdf, для
+старого двоичного .doc извлечение не поддерживается (фиксируется ошибка).
+"""
+import logging
+import os
+import re
+import time
+import zipfile
+from datetime import datetime
+from xml.etree import ElementTree
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from jobs import task
+from models import db, Manuscript, ManuscriptText
+
+log = logging.getLogger(__name__)
+
+
+class ExtractionError(Exception):
+    pass
+
+
+# --- Извлечение по форматам ---
+
+def extract_txt(path):
+    with open(path, 'rb') as f:
+        raw = f.read()
+    for encoding in ('utf-8-sig', 'cp1251'):
+        try:
+            return raw.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return raw.decode('utf-8', errors='replace')
+
+
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+def extract_docx(path):
+    try:
+        with zipfile.ZipFile(path) as archive, archive.open('word/document.xml') as document:
+            parts = []
+            for event, element in ElementTree.iterparse(document, events=('end',)):
+                if element.tag == _W + 't' and element.text:
+                    parts.append(element.text)
+                elif element.tag == _W + 'tab':
+                    parts.append('\t')
+                elif element.tag == _W + 'p':
+                    parts.append('\n')
+                    element.clear()
+            return ''.join(parts)
+    except (zipfile.BadZipFile, KeyError, ElementTree.ParseError) as e:
+        raise ExtractionError('Повреждённый файл docx: %s' % e)
+
+
+# группы RTF, которые не содержат текста документа
+_RTF_SKIP = {'fonttbl', 'colortbl', 'stylesheet', 'info', 'pict', 'header', 'footer',
+             'headerl', 'headerr', 'footerl', 'footerr', 'object', 'themedata', 'datastore'}
+_RTF_TOKEN = re.compile(r"\\([a-z]{1,32})(-?\d{1,10})? ?|\\'([0-9a-f]{2})|\\([^a-z])|([{}])|[\r\n]+|([^\\{}\r\n]+)", re.I)
+
+def extract_rtf(path):
+    with open(path, 'rb') as f:
+        data = f.read().decode('latin-1')
+    encoding = 'cp1251'
+    match = re.search(r'\\ansicpg(\d+)', data)
+    if match:
+        encoding = 'cp' + match.group(1)
+
+    out = []
+    stack = []
+    skip = False
+    uc_skip = 1  # сколько символов пропускать после \uN
+    pending_skip = 0
+    pending_bytes = bytearray()
+
+    def flush_bytes():
+        if pending_bytes:
+            out.append(pending_bytes.decode(encoding, errors='replace'))
+            pending_bytes.clear()
+
+    for word, arg, hexcode, symbol, brace, plain in _RTF_TOKEN.findall(data):
+        if brace == '{':
+            flush_bytes()
+            stack.append((skip, uc_skip))
+        elif brace == '}':
+            flush_bytes()
+            skip, uc_skip = stack.pop() if stack else (False, 1)
+        elif skip:
+            continue
+        elif hexcode:
+            if pending_skip:
+                pending_skip -= 1
+            else:
+                pending_bytes.append(int(hexcode, 16))
+        elif word:
+            flush_bytes()
+            if word in _RTF_SKIP:
+                skip = True
+            elif word == 'uc':
+                uc_skip = int(arg or 1)
+            elif word == 'u':
+                code = int(arg)
+                out.append(chr(code + 65536 if code < 0 else code))
+                pending_skip = uc_skip
+            elif word in ('par', 'line', 'sect', 'page'):
+                out.append('\n')
+            elif word == 'tab':
+                out.append('\t')
+        elif symbol:
+            flush_bytes()
+            if symbol == '*':
+                skip = True
+            elif symbol in '\\{}':
+                out.append(symbol)
+            elif symbol == '~':
+                out.append('\u00a0')
+        elif plain:
+            flush_bytes()
+            if pending_skip:
+                skip_now = min(pending_skip, len(plain))
+                plain = plain[skip_now:]
+                pending_skip -= skip_now
+            out.append(plain)
+    flush_bytes()
+    return ''.join(out)
+
+
+def extract_pdf(path):
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise ExtractionError('Для извлечения текста из PDF нужен пакет pypdf')
+    try:
+        reader = PdfReader(path)
+        return '\n'.join(page.extract_text() or '' for page in reader.pages)
+    except Exception as e:
+        raise ExtractionError('Не удалось прочитать PDF: %s' % e)
+
+
+def extract_doc(path):
+    raise ExtractionError('Извлечение текста из формата .doc не поддерживается')
+
+
+EXTRACTORS = {
+    'txt': extract_txt,
+    'docx': extract_docx,
+    'rtf': extract_rtf,
+    'pdf': extract_pdf,
+    'doc': extract_doc,
+}
+
+
+def resolve_upload_path(file_path):
+    """Путь к файлу рукописи: file_path хранится как 'media/...' относительно корня проекта."""
+    if os.path.isabs(file_path):
+        return file_path
+    if file_path.startswith('media/'):
+        return os.path.join(current_app.config['UPLOAD_FOLDER'], file_path[len('media/'):])
+    return os.path.join(current_app.root_path, file_path)
+
+
+def extract_text(path, name=None):
+    """Формат определяется по расширению name (исходного имени файла), иначе — path."""
+    name = name or os.path.basename(path)
+    extension = name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+    extractor = EXTRACTORS.get(extension)
+    if extractor is None:
+        raise ExtractionError('Неподдерживаемый формат файла: %s' % (extension or 'без расширения'))
+    if not os.path.exists(path):
+        raise ExtractionError('Файл не найден: %s' % path)
+    return extractor(path)
+
+
+# --- Обработка одной рукописи ---
+
+def process_manuscript(manuscript_id):
+    """Извлекает текст файла рукописи и сохраняет результат в manuscript_texts."""
+    manuscript = db.session.get(Manuscript, manuscript_id)
+    if manuscript is None:
+        return None
+    record = db.session.get(ManuscriptText, manuscript_id) or ManuscriptText(manuscript_id=manuscript_id)
+    # file_path в хранилище по содержимому — имя по SHA-256; исходное имя файла — в file_name
+    record.source_name = manuscript.file_name or os.path.basename(manuscript.file_path)
+
+    started = time.perf_counter()
+    try:
+        content = extract_text(resolve_upload_path(manuscript.file_path), record.source_name)
+        limit = current_app.config.get('EXTRACTION_MAX_CHARS')
+        record.content = content[:limit] if limit else content
+        record.status = 'done'
+        record.error = None
+    except Exception as e:
+        log.warning('Извлечение текста рукописи %s не удалось: %s', manuscript_id, e)
+        record.content = None
+        record.status = 'failed'
+        record.error = str(e)
+    record.duration_ms = int((time.perf_counter() - started) * 1000)
+    record.extracted_at = datetime.utcnow()
+
+    db.session.add(record)
+    db.session.commit()
+    return record
+
+
+# не больше двух извлечений одновременно: разбор больших docx/pdf занимает CPU
+@task('extract_text', concurrency=2)
+def extract_text_job(manuscript_id):
+    process_manuscript(manuscript_id)
+
+
+def init_extraction(app):
+    app.cli.add_command(extract_texts_command)
+
+
+@click.command('extract-texts')
+@click.option('--all', 'process_all', is_flag=True, help='Переизвлечь текст для всех рукописей.')
+@with_appcontext
+def extract_texts_command(process_all):
+    """Извлечь текст из файлов рукописей, для которых его ещё нет или была ошибка."""
+    query = db.session.query(Manuscript.id)
+    if not process_all:
+        done = db.session.query(ManuscriptText.manuscript_id).filter(ManuscriptText.status == 'done')
+        query = query.filter(Manuscript.id.notin_(done))
+    done_count = failed_count = 0
+    for (manuscript_id,) in query.all():
+        record = process_manuscript(manuscript_id)
+        if record.status == 'done':
+            done_count += 1
+        else:
+            failed_count += 1
+            click.echo('%d: %s' % (manuscript_id, record.error))
+    click.echo('Готово: %d, ошибок: %d' % (done_count, failed_count))
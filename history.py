@@ -0,0 +1,31 @@
+"""
+Записи истории рукописей (ManuscriptHistory).
+
+История пишется синхронно, в транзакции изменения, которое она
+описывает: запись фиксируется тем же commit, что и само изменение, и
+порядок id совпадает с порядком событий (по id историю читают лента
+изменений changes.py и API). Фоновые задачи (jobs.py) — только для
+медленной работы: извлечения текста и писем.
+"""
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from models import db, ManuscriptHistory
+
+
+def record_history(manuscript_ids, action, user=None, comment=None):
+    """Добавляет запись action каждой рукописи из manuscript_ids одним INSERT в текущей транзакции."""
+    now = datetime.utcnow()
+    rows = [{
+        'manuscript_id': ident,
+        'actor_id': user.id if user else None,
+        'actor_role': user.role if user else None,
+        'action': action,
+        'comment': comment,
+        'created_at': now,
+    } for ident in manuscript_ids]
+    if rows:
+        db.session.execute(insert(ManuscriptHistory), rows)
+    return len(rows)
+
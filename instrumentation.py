@@ -0,0 +1,280 @@
+"""
+Замер времени обработки HTTP-запросов: где уходит время в маршрутах.
+
+Для каждого запроса учитываются маршрут (endpoint), полное время,
+время рендеринга шаблонов, число SQL-запросов и их суммарное время
+(события before_cursor_execute / after_cursor_execute) и число
+прочитанных строк. Результаты отдаются:
+  - заголовком Server-Timing (видно во вкладке Network браузера);
+  - на /metrics в текстовом формате Prometheus (накопительно с запуска
+    процесса; при нескольких процессах сервера у каждого свои значения),
+    только с заголовком Authorization: Bearer <METRICS_TOKEN>; без
+    заданного токена /metrics отвечает 403;
+  - в журнал медленных SQL (логгер instrumentation, уровень WARNING):
+    запросы дольше SLOW_QUERY_MS с «отпечатком» — текстом запроса без
+    литералов и с одинаково свёрнутыми списками IN, чтобы одинаковые
+    запросы с разными параметрами собирались вместе.
+
+Включается INSTRUMENTATION=1. Выключенный замер не регистрирует ни
+событий SQLAlchemy, ни обработчиков запроса — накладных расходов нет.
+Для потоковых ответов (CSV, Server-Sent Events) время считается до
+начала отдачи тела.
+"""
+import hashlib
+import hmac
+import logging
+import re
+import threading
+import time
+from functools import lru_cache
+
+from flask import Response, abort, before_render_template, g, has_request_context, request, \
+    template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+log = logging.getLogger(__name__)
+
+# границы корзин гистограммы времени ответа, секунды
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestTiming:
+    __slots__ = ('started', 'sql_count', 'sql_time', 'rows', 'template_time', 'template_started')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.rows = 0
+        self.template_time = 0.0
+        self.template_started = []
+
+
+class _CountingCursor:
+    """Курсор DBAPI, считающий прочитанные строки; остальное — как у исходного."""
+    __slots__ = ('_cursor', '_timing')
+
+    def __init__(self, cursor, timing):
+        self._cursor = cursor
+        self._timing = timing
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._timing.rows += 1
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._cursor.fetchmany(*args)
+        self._timing.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._timing.rows += len(rows)
+        return rows
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+# --- Отпечатки SQL ---
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|%\(\w+\)s|%s|:\w+|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_SPACES = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(statement):
+    """SQL без литералов и параметров: 'id IN (?, ?, ?)' и 'id IN (?, ?)' совпадают."""
+    text = _LITERALS.sub('?', statement)
+    text = _IN_LISTS.sub('(?, ...)', text)
+    return _SPACES.sub(' ', text).strip()
+
+
+def fingerprint_id(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+
+
+# --- Накопленные метрики процесса ---
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}      # (endpoint, method, status) -> число
+        self.durations = {}     # endpoint -> [число по корзинам..., сумма, число]
+        self.totals = {}        # endpoint -> [SQL-запросы, время SQL, строки, время шаблонов]
+        self.slow = {}          # id отпечатка -> [отпечаток, число, суммарное время, максимум]
+
+    def observe(self, endpoint, method, status, elapsed, timing):
+        with self._lock:
+            key = (endpoint, method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            histogram = self.durations.setdefault(endpoint, [0] * len(BUCKETS) + [0.0, 0])
+            for n, bound in enumerate(BUCKETS):
+                if elapsed <= bound:
+                    histogram[n] += 1
+            histogram[-2] += elapsed
+            histogram[-1] += 1
+            totals = self.totals.setdefault(endpoint, [0, 0.0, 0, 0.0])
+            totals[0] += timing.sql_count
+            totals[1] += timing.sql_time
+            totals[2] += timing.rows
+            totals[3] += timing.template_time
+
+    def slow_query(self, text, elapsed):
+        key = fingerprint_id(text)
+        with self._lock:
+            item = self.slow.setdefault(key, [text, 0, 0.0, 0.0])
+            item[1] += 1
+            item[2] += elapsed
+            item[3] = max(item[3], elapsed)
+        return key
+
+    def render(self):
+        """Текстовый формат Prometheus (exposition format 0.0.4)."""
+        with self._lock:
+            requests = dict(self.requests)
+            durations = {k: list(v) for k, v in self.durations.items()}
+            totals = {k: list(v) for k, v in self.totals.items()}
+            slow = {k: list(v) for k, v in self.slow.items()}
+
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append('# HELP %s %s' % (name, help_text))
+            lines.append('# TYPE %s %s' % (name, kind))
+
+        family('editorial_requests_total', 'counter', 'HTTP requests by endpoint, method and status.')
+        for (endpoint, method, status), value in sorted(requests.items()):
+            lines.append('editorial_requests_total{%s} %d' % (
+                _labels(endpoint=endpoint, method=method, status=status), value))
+
+        family('editorial_request_duration_seconds', 'histogram', 'Request wall time.')
+        for endpoint, histogram in sorted(durations.items()):
+            for n, bound in enumerate(BUCKETS):
+                lines.append('editorial_request_duration_seconds_bucket{%s} %d' % (
+                    _labels(endpoint=endpoint, le=repr(bound)), histogram[n]))
+            lines.append('editorial_request_duration_seconds_bucket{%s} %d' % (
+                _labels(endpoint=endpoint, le='+Inf'), histogram[-1]))
+            lines.append('editorial_request_duration_seconds_sum{%s} %.6f' % (
+                _labels(endpoint=endpoint), histogram[-2]))
+            lines.append('editorial_request_duration_seconds_count{%s} %d' % (
+                _labels(endpoint=endpoint), histogram[-1]))
+
+        for n, (name, help_text, fmt) in enumerate((
+                ('editorial_sql_queries_total', 'SQL statements executed.', '%d'),
+                ('editorial_sql_duration_seconds_total', 'Time spent in SQL statements.', '%.6f'),
+                ('editorial_sql_rows_total', 'Rows fetched from the database.', '%d'),
+                ('editorial_template_duration_seconds_total', 'Time spent rendering templates.', '%.6f'))):
+            family(name, 'counter', help_text)
+            for endpoint, values in sorted(totals.items()):
+                lines.append(('%s{%s} ' + fmt) % (name, _labels(endpoint=endpoint), values[n]))
+
+        family('editorial_slow_queries_total', 'counter', 'SQL statements slower than SLOW_QUERY_MS.')
+        for key, (text, count, total, longest) in sorted(slow.items()):
+            lines.append('editorial_slow_queries_total{%s} %d' % (_labels(fingerprint=key), count))
+        family('editorial_slow_query_duration_seconds_total', 'counter', 'Time spent in slow SQL statements.')
+        for key, (text, count, total, longest) in sorted(slow.items()):
+            lines.append('editorial_slow_query_duration_seconds_total{%s} %.6f' % (
+                _labels(fingerprint=key), total))
+        family('editorial_slow_query_max_seconds', 'gauge', 'Longest slow SQL statement.')
+        for key, (text, count, total, longest) in sorted(slow.items()):
+            lines.append('editorial_slow_query_max_seconds{%s} %.6f' % (_labels(fingerprint=key), longest))
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(**labels):
+    return ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"')
+                                 .replace('\n', '\\n'))
+                    for name, value in labels.items())
+
+
+metrics = Metrics()
+
+
+# --- Подключение ---
+
+_state = {'slow_seconds': 0.2}
+
+
+def _timing():
+    if has_request_context():
+        return g.get('timing')
+    return None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['instrumentation_started'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info.pop('instrumentation_started', time.perf_counter())
+    timing = _timing()
+    if timing is not None:
+        timing.sql_count += 1
+        timing.sql_time += elapsed
+        if context is not None and cursor.description is not None:
+            # результат (CursorResult) создаётся после события и читает context.cursor
+            context.cursor = _CountingCursor(cursor, timing)
+    if elapsed >= _state['slow_seconds']:
+        text = fingerprint(statement)
+        key = metrics.slow_query(text, elapsed)
+        log.warning('Медленный SQL %.0f мс [%s] %s%s', elapsed * 1000, key, text,
+                    ' (%s)' % request.endpoint if has_request_context() else '')
+
+
+def init_instrumentation(app):
+    if not app.config.get('INSTRUMENTATION'):
+        return
+    _state['slow_seconds'] = app.config.get('SLOW_QUERY_MS', 200) / 1000.0
+    token = app.config.get('METRICS_TOKEN')
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    def _template_started(sender, template, context, **extra):
+        timing = _timing()
+        if timing is not None:
+            timing.template_started.append(time.perf_counter())
+
+    def _template_finished(sender, template, context, **extra):
+        timing = _timing()
+        if timing is not None and timing.template_started:
+            timing.template_time += time.perf_counter() - timing.template_started.pop()
+
+    before_render_template.connect(_template_started, app, weak=False)
+    template_rendered.connect(_template_finished, app, weak=False)
+
+    @app.before_request
+    def _start_timing():
+        g.timing = RequestTiming()
+
+    @app.after_request
+    def _finish_timing(response):
+        timing = g.pop('timing', None)
+        if timing is None:
+            return response
+        elapsed = time.perf_counter() - timing.started
+        metrics.observe(request.endpoint or 'unmatched', request.method, response.status_code,
+                        elapsed, timing)
+        response.headers.add('Server-Timing', 'app;dur=%.1f, db;dur=%.1f;desc="%d queries, %d rows", '
+                                              'tpl;dur=%.1f' % (elapsed * 1000, timing.sql_time * 1000,
+                                                                timing.sql_count, timing.rows,
+                                                                timing.template_time * 1000))
+        return response
+
+    def metrics_view():
+        # только по METRICS_TOKEN: за прокси на этой же машине remote_addr у всех запросов
+        # 127.0.0.1, поэтому проверка адреса открыла бы метрики всему интернету
+        if not token:
+            abort(403)
+        given = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        if not hmac.compare_digest(given.encode('utf-8'), token.encode('utf-8')):
+            abort(403)
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
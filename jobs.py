@@ -0,0 +1,309 @@
+"""
+Очередь фоновых задач в таблице jobs.
+
+Маршрут вызывает enqueue() до db.session.commit(): задача сохраняется
+в той же транзакции, что и изменения, которые её вызвали, поэтому не
+теряется и не выполняется для откаченных изменений. Сам ответ ждёт
+только commit; обработчики (@task) выполняются воркером:
+  - в процессе веб-сервера — JOB_WORKERS потоков, которые запускаются
+    вместе с приложением (кроме команд flask, кроме `flask run`, и
+    тестов), сразу разбирают накопившуюся очередь и будятся после
+    каждого commit с новыми задачами;
+  - отдельным процессом — `flask worker` (тогда JOB_WORKERS = 0).
+
+Задачи выбираются по приоритету (больше — раньше), затем по времени
+запуска. Ошибка ведёт к повтору с экспоненциальной задержкой
+(JOB_RETRY_DELAY * 2^(попытка-1)) до max_attempts, после чего задача
+получает статус failed. Число одновременно выполняемых задач одного
+вида ограничивается параметром concurrency обработчика (переопределяется
+JOB_CONCURRENCY). Задачи, «зависшие» в running дольше JOB_TIMEOUT
+(воркер упал), возвращаются в очередь.
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import event, func, insert, select, update
+
+from models import db, Job
+
+log = logging.getLogger(__name__)
+
+Task = namedtuple('Task', 'name function max_attempts concurrency priority')
+
+TASKS = {}
+
+STATUSES = ('queued', 'running', 'done', 'failed')
+
+
+def task(name, max_attempts=3, concurrency=None, priority=0):
+    """Регистрирует обработчик задачи; аргументы задачи передаются именованными."""
+    def decorator(function):
+        TASKS[name] = Task(name, function, max_attempts, concurrency, priority)
+        return function
+    return decorator
+
+
+def enqueue(name, priority=None, delay=None, **payload):
+    """
+    Добавляет задачу в текущую сессию; она фиксируется вместе с остальными
+    изменениями при db.session.commit().
+    """
+    registered = TASKS[name]
+    job = Job(
+        name=name,
+        payload=json.dumps(payload, ensure_ascii=False),
+        priority=registered.priority if priority is None else priority,
+        max_attempts=registered.max_attempts,
+        run_at=datetime.utcnow() + timedelta(seconds=delay or 0),
+    )
+    db.session.add(job)
+    db.session.info['jobs_enqueued'] = True
+    return job
+
+
+def enqueue_many(name, payloads, priority=None):
+    """Ставит задачи одного вида одним INSERT (executemany) в текущей транзакции."""
+    registered = TASKS[name]
+    now = datetime.utcnow()
+    rows = [{
+        'name': name,
+        'payload': json.dumps(payload, ensure_ascii=False),
+        'priority': registered.priority if priority is None else priority,
+        'max_attempts': registered.max_attempts,
+        'run_at': now,
+        'created_at': now,
+    } for payload in payloads]
+    if rows:
+        db.session.execute(insert(Job.__table__), rows)
+        db.session.info['jobs_enqueued'] = True
+    return len(rows)
+
+
+# --- Выполнение ---
+
+def _concurrency_limit(name):
+    overrides = current_app.config.get('JOB_CONCURRENCY') or {}
+    return overrides.get(name, TASKS[name].concurrency)
+
+
+def requeue_stale():
+    """Возвращает в очередь задачи, выполнение которых прервалось (воркер упал)."""
+    timeout = current_app.config.get('JOB_TIMEOUT', 600)
+    result = db.session.execute(
+        update(Job)
+        .where(Job.status == 'running', Job.locked_at < datetime.utcnow() - timedelta(seconds=timeout))
+        .values(status='queued', locked_by=None, locked_at=None)
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def claim(worker_id):
+    """
+    Забирает следующую готовую задачу. Задача переводится в running
+    условным UPDATE (... WHERE status = 'queued'), поэтому два воркера
+    не получат одну и ту же задачу.
+    """
+    now = datetime.utcnow()
+    running = dict(db.session.execute(
+        select(Job.name, func.count()).where(Job.status == 'running').group_by(Job.name)
+    ).all())
+    blocked = [name for name in TASKS
+               if _concurrency_limit(name) and running.get(name, 0) >= _concurrency_limit(name)]
+
+    query = select(Job.id).where(Job.status == 'queued', Job.run_at <= now, Job.name.in_(TASKS))
+    if blocked:
+        query = query.where(Job.name.notin_(blocked))
+    candidates = db.session.execute(
+        query.order_by(Job.priority.desc(), Job.run_at, Job.id).limit(10)
+    ).scalars().all()
+
+    for job_id in candidates:
+        result = db.session.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == 'queued')
+            .values(status='running', locked_by=worker_id, locked_at=now, attempts=Job.attempts + 1)
+        )
+        db.session.commit()
+        if result.rowcount == 1:
+            return db.session.get(Job, job_id)
+    return None
+
+
+def run_job(job):
+    """Выполняет задачу и сохраняет результат: done, повтор позже или failed."""
+    job_id, name, payload = job.id, job.name, json.loads(job.payload)
+    started = time.perf_counter()
+    try:
+        TASKS[name].function(**payload)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        job = db.session.get(Job, job_id)
+        job.last_error = traceback.format_exc(limit=5)
+        job.locked_by = job.locked_at = None
+        if job.attempts >= job.max_attempts:
+            job.status = 'failed'
+            job.finished_at = datetime.utcnow()
+            log.error('Задача %s #%s не выполнена после %d попыток', name, job_id, job.attempts)
+        else:
+            job.status = 'queued'
+            delay = current_app.config.get('JOB_RETRY_DELAY', 30) * 2 ** (job.attempts - 1)
+            job.run_at = datetime.utcnow() + timedelta(seconds=delay)
+            log.warning('Задача %s #%s: ошибка, повтор через %d с', name, job_id, delay)
+        db.session.commit()
+        return False
+
+    job = db.session.get(Job, job_id)
+    job.status = 'done'
+    job.finished_at = datetime.utcnow()
+    job.locked_by = job.locked_at = None
+    db.session.commit()
+    log.info('Задача %s #%s выполнена за %.0f мс', name, job_id, (time.perf_counter() - started) * 1000)
+    return True
+
+
+def work_off(limit=None, worker_id=None):
+    """Выполняет готовые задачи в текущем потоке; возвращает (выполнено, с ошибкой)."""
+    worker_id = worker_id or _worker_id()
+    done = failed = 0
+    while limit is None or done + failed < limit:
+        job = claim(worker_id)
+        if job is None:
+            break
+        if run_job(job):
+            done += 1
+        else:
+            failed += 1
+    return done, failed
+
+
+def queue_summary():
+    """Число задач по видам и статусам: {имя: {статус: число}}."""
+    summary = {name: {} for name in sorted(TASKS)}
+    for name, status, count in db.session.execute(
+            select(Job.name, Job.status, func.count()).group_by(Job.name, Job.status)):
+        summary.setdefault(name, {})[status] = count
+    return summary
+
+
+def retry(job):
+    """Возвращает задачу со статусом failed в очередь с новым набором попыток."""
+    job.status = 'queued'
+    job.attempts = 0
+    job.run_at = datetime.utcnow()
+    job.finished_at = None
+    db.session.info['jobs_enqueued'] = True
+
+
+def _worker_id():
+    return '%s:%d:%s' % (socket.gethostname(), os.getpid(), threading.current_thread().name)
+
+
+# --- Воркеры в процессе веб-сервера ---
+
+_wakeup = threading.Event()
+_threads = []
+_threads_lock = threading.Lock()
+
+
+def _worker_loop(app):
+    interval = app.config.get('JOB_POLL_INTERVAL', 5)
+    while True:
+        _wakeup.wait(interval)
+        _wakeup.clear()
+        with app.app_context():
+            try:
+                requeue_stale()
+                work_off()
+            except Exception:
+                log.exception('Ошибка воркера фоновых задач')
+                db.session.rollback()
+
+
+def _start_workers(app):
+    with _threads_lock:
+        if _threads:
+            return
+        for number in range(app.config.get('JOB_WORKERS', 0)):
+            thread = threading.Thread(target=_worker_loop, args=(app,), daemon=True,
+                                      name='jobs-%d' % (number + 1))
+            thread.start()
+            _threads.append(thread)
+
+
+def _after_commit(session):
+    if session.info.pop('jobs_enqueued', False):
+        _wakeup.set()
+
+
+def _after_rollback(session):
+    session.info.pop('jobs_enqueued', None)
+
+event.listen(db.session, 'after_commit', _after_commit)
+event.listen(db.session, 'after_rollback', _after_rollback)
+
+
+def _serving(app):
+    # в командах flask (db-upgrade, worker, ...) воркеры не нужны, в `flask run` — нужны
+    if app.config.get('TESTING'):
+        return False
+    context = click.get_current_context(silent=True)
+    return context is None or context.info_name == 'run'
+
+
+def init_jobs(app):
+    app.cli.add_command(worker_command)
+    if app.config.get('JOB_WORKERS') and _serving(app):
+        # задачи, оставшиеся в очереди с прошлого запуска, и отложенные повторы
+        _start_workers(app)
+        _wakeup.set()
+
+
+@click.command('worker')
+@click.option('--threads', default=1, show_default=True, help='Число потоков выполнения задач.')
+@click.option('--burst', is_flag=True, help='Выполнить готовые задачи и завершиться.')
+@with_appcontext
+def worker_command(threads, burst):
+    """Выполнять фоновые задачи из таблицы jobs."""
+    app = current_app._get_current_object()
+    if burst:
+        requeue_stale()
+        done, failed = work_off()
+        click.echo('Выполнено: %d, с ошибкой: %d' % (done, failed))
+        return
+
+    interval = app.config.get('JOB_POLL_INTERVAL', 5)
+
+    def loop():
+        with app.app_context():
+            while True:
+                try:
+                    requeue_stale()
+                    done, failed = work_off()
+                except Exception:
+                    log.exception('Ошибка воркера фоновых задач')
+                    db.session.rollback()
+                    done = failed = 0
+                if not done and not failed:
+                    time.sleep(interval)
+
+    click.echo('Воркер запущен: потоков %d, задачи: %s' % (threads, ', '.join(sorted(TASKS))))
+    pool = [threading.Thread(target=loop, name='worker-%d' % (n + 1), daemon=True) for n in range(threads)]
+    for thread in pool:
+        thread.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        click.echo('Воркер остановлен')
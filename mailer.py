@@ -0,0 +1,150 @@
+"""
+Отправка писем через SMTP: пул постоянных соединений и ограничение частоты.
+
+Соединение с SMTP-сервером не открывается на каждое письмо: после
+отправки оно возвращается в пул (до MAIL_POOL_SIZE соединений) и
+проверяется командой NOOP перед повторным использованием. Частота
+отправки ограничивается MAIL_RATE_LIMIT писем в минуту на процесс,
+чтобы не упираться в лимиты почтового сервера.
+
+Если MAIL_SERVER не задан, отправка выключена (mail_enabled() — False).
+Для проверки на локальной машине подойдёт любая SMTP-заглушка,
+например `python -m aiosmtpd -n -l localhost:1025` с MAIL_PORT=1025.
+"""
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+from email.message import EmailMessage
+from email.utils import formataddr
+
+from flask import current_app
+
+
+class RateLimiter:
+    """Не больше per_minute событий в минуту: wait() выдерживает нужную паузу."""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute else 0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+class SMTPPool:
+    def __init__(self):
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _connect(self, config):
+        timeout = config.get('MAIL_TIMEOUT', 10)
+        if config.get('MAIL_USE_SSL'):
+            connection = smtplib.SMTP_SSL(config['MAIL_SERVER'], config['MAIL_PORT'], timeout=timeout)
+        else:
+            connection = smtplib.SMTP(config['MAIL_SERVER'], config['MAIL_PORT'], timeout=timeout)
+            if config.get('MAIL_USE_TLS'):
+                connection.starttls()
+        if config.get('MAIL_USERNAME'):
+            connection.login(config['MAIL_USERNAME'], config.get('MAIL_PASSWORD') or '')
+        return connection
+
+    def _take_idle(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                connection = self._idle.pop()
+            try:
+                if connection.noop()[0] == 250:
+                    return connection
+            except (smtplib.SMTPException, OSError):
+                pass
+            _close(connection)
+
+    @contextmanager
+    def connection(self, config):
+        connection = self._take_idle() or self._connect(config)
+        try:
+            yield connection
+        except BaseException:
+            # ошибка или отправка прервана (генератор send_messages закрыт на середине):
+            # состояние сессии неизвестно — соединение закрываем, в пул не возвращаем
+            _close(connection)
+            raise
+        with self._lock:
+            if len(self._idle) < config.get('MAIL_POOL_SIZE', 2):
+                self._idle.append(connection)
+                return
+        _close(connection)
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            _close(connection)
+
+
+def _close(connection):
+    try:
+        connection.quit()
+    except (smtplib.SMTPException, OSError):
+        connection.close()
+
+
+smtp_pool = SMTPPool()
+_limiters = {}
+
+
+def _limiter(per_minute):
+    if per_minute not in _limiters:
+        _limiters[per_minute] = RateLimiter(per_minute)
+    return _limiters[per_minute]
+
+
+def mail_enabled():
+    return bool(current_app.config.get('MAIL_SERVER'))
+
+
+def build_message(to, subject, body):
+    config = current_app.config
+    message = EmailMessage()
+    message['From'] = formataddr((config.get('MAIL_SENDER_NAME') or '', config['MAIL_DEFAULT_SENDER']))
+    message['To'] = to
+    message['Subject'] = subject
+    # base64: письмо дойдёт и через релеи без поддержки 8BITMIME
+    message.set_content(body, cte='base64')
+    return message
+
+
+def send_messages(items):
+    """
+    Отправляет письма [(ключ, EmailMessage)] через одно соединение из пула
+    с учётом MAIL_RATE_LIMIT. Генератор: после каждого письма выдаёт
+    (ключ, None) или (ключ, текст ошибки), если сервер отклонил адрес, —
+    так вызывающий код отмечает отправленное сразу. Сбой соединения
+    пробрасывается (задача будет повторена для оставшихся писем).
+    Генератор, брошенный на середине, нужно закрыть (contextlib.closing):
+    соединение освобождается при его закрытии.
+    """
+    config = current_app.config
+    limiter = _limiter(config.get('MAIL_RATE_LIMIT', 60))
+    with smtp_pool.connection(config) as connection:
+        for key, message in items:
+            limiter.wait()
+            try:
+                connection.send_message(message)
+            except smtplib.SMTPRecipientsRefused as e:
+                yield key, '; '.join('%s: %s' % item for item in e.recipients.items())
+            except (smtplib.SMTPDataError, smtplib.SMTPSenderRefused) as e:
+                yield key, str(e)
+            else:
+                yield key, None
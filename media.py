@@ -0,0 +1,79 @@
+"""
+Отдача файлов рукописей и проверка прав на скачивание.
+
+Режим отдачи задаётся MEDIA_DELIVERY:
+  'python'     — send_file: поддержка Range и If-None-Match, тело идёт через
+                 wsgi.file_wrapper, который gunicorn/uWSGI отдают через sendfile();
+  'x-accel'    — после проверки прав ответ без тела с X-Accel-Redirect,
+                 файл отдаёт nginx из internal-локации MEDIA_ACCEL_PREFIX;
+  'x-sendfile' — то же для Apache (mod_xsendfile) / lighttpd через X-Sendfile.
+
+Права проверяются одним запросом EXISTS по таблице manuscripts,
+без загрузки рукописей и их связей.
+"""
+import mimetypes
+import os
+from urllib.parse import quote
+
+from flask import current_app, request, send_file
+from sqlalchemy import and_, exists, or_, select
+
+from models import db, Manuscript
+
+
+def can_download(user, condition):
+    """
+    condition — условие на Manuscript, выбирающее рукописи с этим файлом.
+    Редактор и администратор скачивают любые файлы, рецензент — файл любой
+    рукописи (форма рецензии открывается для любой рукописи), автор —
+    свои рукописи, остальные и гости (user is None) — опубликованные.
+    """
+    if user is None:
+        condition = and_(condition, Manuscript.status == 'published')
+    elif user.role in ('staff', 'admin'):
+        return True
+    elif user.role != 'reviewer':
+        condition = and_(condition, or_(
+            Manuscript.author_id == user.id,
+            Manuscript.status == 'published'
+        ))
+    return db.session.execute(select(exists().where(condition))).scalar()
+
+
+def send_media(path, relative_path, download_name, etag=None, max_age=None):
+    """path — абсолютный путь к файлу, relative_path — путь внутри UPLOAD_FOLDER."""
+    mode = current_app.config.get('MEDIA_DELIVERY', 'python')
+    if not os.path.isfile(path):
+        return None
+
+    if mode == 'python':
+        return send_file(
+            path,
+            as_attachment=True,
+            download_name=download_name,
+            etag=etag if etag is not None else True,
+            conditional=True,
+            max_age=max_age
+        )
+
+    response = current_app.response_class()
+    if mode == 'x-accel':
+        prefix = current_app.config.get('MEDIA_ACCEL_PREFIX', '/protected-media/')
+        response.headers['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(relative_path.replace(os.sep, '/'))
+    elif mode == 'x-sendfile':
+        response.headers['X-Sendfile'] = path
+    else:
+        raise ValueError('Неизвестный режим MEDIA_DELIVERY: %s' % mode)
+
+    response.mimetype = mimetypes.guess_type(download_name)[0] or 'application/octet-stream'
+    response.headers['Content-Disposition'] = "attachment; filename*=UTF-8''%s" % quote(download_name)
+    if etag:
+        response.set_etag(etag)
+        # на 304 можем ответить сами, не передавая запрос фронтенду
+        if request.if_none_match.contains(etag):
+            response.headers.pop('X-Accel-Redirect', None)
+            response.headers.pop('X-Sendfile', None)
+            response.status_code = 304
+    if max_age:
+        response.cache_control.max_age = max_age
+    return response
@@ -0,0 +1,388 @@
+"""
+Версионные миграции схемы БД.
+
+Каждая миграция — функция, получающая соединение в открытой транзакции,
+с номером версии и описанием (декоратор @migration). Применённые версии
+записываются в schema_migrations; upgrade() выполняет недостающие
+по возрастанию номера.
+
+Миграция объявляет свои таблицы, колонки и индексы явно (Table и Index
+SQLAlchemy Core) в том виде, какой они имели в её версии, и не зависит
+от текущих моделей. Пустая БД создаётся сразу по моделям
+(db.metadata.create_all) и помечается последней версией; то, что схема
+после всех миграций совпадает со схемой моделей, проверяют тесты.
+БД, созданные до появления миграций (таблицы есть, schema_migrations
+нет), проходят все миграции, поэтому миграции проверяют, нет ли уже
+таблицы, колонки или индекса.
+
+При запуске приложения upgrade() вызывается автоматически, если
+AUTO_MIGRATE включён; иначе — командой `flask db-upgrade`. Использование
+индексов частыми запросами проверяет `flask check-indexes` (query_plans.py).
+"""
+from collections import namedtuple
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import (Boolean, Column, Date, DateTime, ForeignKey, Index, Integer, MetaData, String,
+                        Table, Text, inspect, insert, select, text)
+
+from models import db, User, SchemaMigration
+from query_plans import check_indexes_command
+
+Migration = namedtuple('Migration', 'version description function')
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    def decorator(function):
+        MIGRATIONS.append(Migration(version, description, function))
+        MIGRATIONS.sort(key=lambda m: m.version)
+        return function
+    return decorator
+
+
+# --- Вспомогательные операции ---
+
+def create_tables(connection, *tables):
+    for table in tables:
+        table.create(bind=connection, checkfirst=True)
+
+
+def add_columns(connection, table_name, *columns):
+    existing = {column['name'] for column in inspect(connection).get_columns(table_name)}
+    for column in columns:
+        if column.name not in existing:
+            column_type = column.type.compile(connection.dialect)
+            connection.execute(text('ALTER TABLE %s ADD COLUMN %s %s' % (table_name, column.name, column_type)))
+
+
+def create_indexes(connection, *indexes):
+    for index in indexes:
+        index.create(bind=connection, checkfirst=True)
+
+
+def referenced(metadata, *names):
+    """Таблицы, на которые ссылаются внешние ключи миграции (сами не создаются)."""
+    for name in names:
+        Table(name, metadata, Column('id', Integer, primary_key=True))
+
+
+# --- Миграции ---
+# Таблицы, колонки и индексы объявлены здесь такими, какими они были в своей
+# версии; модели (models.py) меняются дальше, миграции — нет.
+
+@migration(1, 'Начальная схема')
+def _initial_schema(connection):
+    metadata = MetaData()
+    users = Table(
+        'users', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('full_name', String(128), nullable=False),
+        Column('email', String(128), unique=True, nullable=False),
+        Column('password_hash', String(128), nullable=False),
+        Column('role', String(32), nullable=False),
+        Column('registered_at', DateTime),
+        Column('is_blocked', Boolean),
+    )
+    publications = Table(
+        'publications', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('type', String(64), nullable=False),
+        Column('title', String(256), nullable=False),
+        Column('pub_date', Date),
+        Column('description', Text),
+    )
+    manuscripts = Table(
+        'manuscripts', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('title', String(256), nullable=False),
+        Column('description', Text),
+        Column('file_path', String(256), nullable=False),
+        Column('status', String(32), nullable=False),
+        Column('created_at', DateTime),
+        Column('updated_at', DateTime),
+        Column('author_id', Integer, ForeignKey('users.id'), nullable=False),
+        Column('publication_id', Integer, ForeignKey('publications.id'), nullable=True),
+    )
+    reviews = Table(
+        'reviews', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('manuscript_id', Integer, ForeignKey('manuscripts.id'), nullable=False),
+        Column('reviewer_id', Integer, ForeignKey('users.id'), nullable=False),
+        Column('text', Text),
+        Column('score', Integer),
+        Column('created_at', DateTime),
+        Column('status', String(32), nullable=False),
+    )
+    news = Table(
+        'news', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('title', String(256), nullable=False),
+        Column('content', Text, nullable=False),
+        Column('published_at', DateTime),
+    )
+    messages = Table(
+        'messages', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('sender_id', Integer, ForeignKey('users.id'), nullable=True),
+        Column('sender_email', String(128), nullable=True),
+        Column('subject', String(256), nullable=False),
+        Column('body', Text, nullable=False),
+        Column('sent_at', DateTime),
+        Column('status', String(16)),
+        Column('is_read', Boolean),
+    )
+    history = Table(
+        'manuscript_history', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('manuscript_id', Integer, ForeignKey('manuscripts.id'), nullable=False),
+        Column('actor_id', Integer, ForeignKey('users.id'), nullable=True),
+        Column('actor_role', String(32), nullable=True),
+        Column('action', String(64), nullable=False),
+        Column('comment', Text, nullable=True),
+        Column('created_at', DateTime),
+    )
+    departments = Table(
+        'departments', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('name', String(128), nullable=False),
+        Column('description', Text, nullable=True),
+    )
+    sections = Table(
+        'journal_sections', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('title', String(128), nullable=False),
+        Column('description', Text, nullable=True),
+    )
+    keywords = Table(
+        'keywords', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('value', String(64), nullable=False, unique=True),
+    )
+    create_tables(connection, users, publications, manuscripts, reviews, news, messages,
+                  history, departments, sections, keywords)
+
+
+@migration(2, 'Счётчики статистики (stats_counters)')
+def _stats_counters(connection):
+    counters = Table(
+        'stats_counters', MetaData(),
+        Column('scope', String(64), primary_key=True),
+        Column('key', String(64), primary_key=True),
+        Column('value', Integer, nullable=False),
+    )
+    create_tables(connection, counters)
+
+
+@migration(3, 'Извлечённые тексты рукописей (manuscript_texts)')
+def _manuscript_texts(connection):
+    metadata = MetaData()
+    referenced(metadata, 'manuscripts')
+    texts = Table(
+        'manuscript_texts', metadata,
+        Column('manuscript_id', Integer, ForeignKey('manuscripts.id'), primary_key=True),
+        Column('source_name', String(256), nullable=True),
+        Column('content', Text, nullable=True),
+        Column('status', String(16), nullable=False),
+        Column('error', Text, nullable=True),
+        Column('duration_ms', Integer, nullable=True),
+        Column('extracted_at', DateTime, nullable=True),
+    )
+    create_tables(connection, texts)
+
+
+@migration(4, 'Хранилище файлов по содержимому (stored_files, файл рукописи)')
+def _stored_files(connection):
+    stored_files = Table(
+        'stored_files', MetaData(),
+        Column('sha256', String(64), primary_key=True),
+        Column('path', String(256), nullable=False),
+        Column('size', Integer, nullable=False),
+        Column('ref_count', Integer, nullable=False),
+        Column('created_at', DateTime),
+    )
+    create_tables(connection, stored_files)
+    add_columns(connection, 'manuscripts',
+                Column('file_sha256', String(64)),
+                Column('file_size', Integer),
+                Column('file_name', String(256)))
+
+
+@migration(5, 'Индексы для частых запросов')
+def _hot_path_indexes(connection):
+    metadata = MetaData()
+    users = Table('users', metadata, Column('id', Integer), Column('registered_at', DateTime))
+    manuscripts = Table('manuscripts', metadata, Column('id', Integer), Column('author_id', Integer),
+                        Column('status', String(32)), Column('created_at', DateTime),
+                        Column('publication_id', Integer), Column('file_path', String(256)))
+    reviews = Table('reviews', metadata, Column('manuscript_id', Integer), Column('reviewer_id', Integer),
+                    Column('created_at', DateTime))
+    publications = Table('publications', metadata, Column('id', Integer), Column('pub_date', Date))
+    news = Table('news', metadata, Column('id', Integer), Column('published_at', DateTime))
+    messages = Table('messages', metadata, Column('id', Integer), Column('sent_at', DateTime),
+                     Column('status', String(16)))
+    history = Table('manuscript_history', metadata, Column('manuscript_id', Integer),
+                    Column('created_at', DateTime))
+    create_indexes(
+        connection,
+        Index('ix_users_registered_at', users.c.registered_at, users.c.id),
+        Index('ix_manuscripts_author_created', manuscripts.c.author_id, manuscripts.c.created_at),
+        Index('ix_manuscripts_status_created', manuscripts.c.status, manuscripts.c.created_at),
+        Index('ix_manuscripts_created', manuscripts.c.created_at, manuscripts.c.id),
+        Index('ix_manuscripts_publication_status', manuscripts.c.publication_id, manuscripts.c.status),
+        Index('ix_manuscripts_file_path', manuscripts.c.file_path),
+        Index('ix_reviews_manuscript_reviewer', reviews.c.manuscript_id, reviews.c.reviewer_id),
+        Index('ix_reviews_reviewer_created', reviews.c.reviewer_id, reviews.c.created_at),
+        Index('ix_publications_pub_date', publications.c.pub_date, publications.c.id),
+        Index('ix_news_published_at', news.c.published_at, news.c.id),
+        Index('ix_messages_sent_at', messages.c.sent_at, messages.c.id),
+        Index('ix_messages_status_sent', messages.c.status, messages.c.sent_at),
+        Index('ix_manuscript_history_manuscript_created', history.c.manuscript_id, history.c.created_at),
+    )
+
+
+@migration(6, 'Очередь фоновых задач (jobs)')
+def _jobs(connection):
+    jobs = Table(
+        'jobs', MetaData(),
+        Column('id', Integer, primary_key=True),
+        Column('name', String(64), nullable=False),
+        Column('payload', Text, nullable=False),
+        Column('priority', Integer, nullable=False),
+        Column('status', String(16), nullable=False),
+        Column('attempts', Integer, nullable=False),
+        Column('max_attempts', Integer, nullable=False),
+        Column('run_at', DateTime, nullable=False),
+        Column('locked_by', String(64), nullable=True),
+        Column('locked_at', DateTime, nullable=True),
+        Column('last_error', Text, nullable=True),
+        Column('created_at', DateTime),
+        Column('finished_at', DateTime, nullable=True),
+        Index('ix_jobs_status_priority_run', 'status', 'priority', 'run_at'),
+        Index('ix_jobs_name_status', 'name', 'status'),
+        Index('ix_jobs_created', 'created_at', 'id'),
+    )
+    create_tables(connection, jobs)
+
+
+@migration(7, 'Уведомления по e-mail (notifications)')
+def _notifications(connection):
+    metadata = MetaData()
+    referenced(metadata, 'users')
+    notifications = Table(
+        'notifications', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('user_id', Integer, ForeignKey('users.id'), nullable=True),
+        Column('email', String(128), nullable=False),
+        Column('event', String(32), nullable=False),
+        Column('subject', String(256), nullable=False),
+        Column('body', Text, nullable=False),
+        Column('status', String(16), nullable=False),
+        Column('error', Text, nullable=True),
+        Column('created_at', DateTime),
+        Column('sent_at', DateTime, nullable=True),
+        Index('ix_notifications_status_email', 'status', 'email', 'created_at'),
+    )
+    create_tables(connection, notifications)
+
+
+@migration(8, 'Разделы и ключевые слова рукописей, специализация рецензентов')
+def _reviewer_affinity(connection):
+    add_columns(connection, 'manuscripts', Column('section_id', Integer))
+    metadata = MetaData()
+    referenced(metadata, 'manuscripts', 'keywords', 'users', 'journal_sections')
+    manuscript_keywords = Table(
+        'manuscript_keywords', metadata,
+        Column('manuscript_id', Integer, ForeignKey('manuscripts.id'), primary_key=True),
+        Column('keyword_id', Integer, ForeignKey('keywords.id'), primary_key=True),
+    )
+    reviewer_sections = Table(
+        'reviewer_sections', metadata,
+        Column('user_id', Integer, ForeignKey('users.id'), primary_key=True),
+        Column('section_id', Integer, ForeignKey('journal_sections.id'), primary_key=True),
+    )
+    reviewer_keywords = Table(
+        'reviewer_keywords', metadata,
+        Column('user_id', Integer, ForeignKey('users.id'), primary_key=True),
+        Column('keyword_id', Integer, ForeignKey('keywords.id'), primary_key=True),
+    )
+    create_tables(connection, manuscript_keywords, reviewer_sections, reviewer_keywords)
+    reviews = Table('reviews', metadata, Column('status', String(32)), Column('reviewer_id', Integer))
+    create_indexes(connection, Index('ix_reviews_status_reviewer', reviews.c.status, reviews.c.reviewer_id))
+
+
+@migration(9, 'Индекс ленты изменений рукописей')
+def _changes_index(connection):
+    manuscripts = Table('manuscripts', MetaData(), Column('id', Integer), Column('updated_at', DateTime))
+    create_indexes(connection, Index('ix_manuscripts_updated', manuscripts.c.updated_at, manuscripts.c.id))
+
+
+# --- Применение ---
+
+def applied_versions(connection):
+    table = SchemaMigration.__table__
+    if not inspect(connection).has_table(table.name):
+        return set()
+    return set(connection.execute(select(table.c.version)).scalars())
+
+
+def _record(connection, item):
+    connection.execute(insert(SchemaMigration.__table__).values(
+        version=item.version, description=item.description, applied_at=datetime.utcnow()
+    ))
+
+
+def upgrade(engine=None):
+    """Применяет недостающие миграции; возвращает список применённых."""
+    engine = engine or db.engine
+    with engine.begin() as connection:
+        done = applied_versions(connection)
+        if not done and not inspect(connection).has_table(User.__tablename__):
+            # пустая БД: схема целиком по моделям
+            db.metadata.create_all(bind=connection)
+            for item in MIGRATIONS:
+                _record(connection, item)
+            return list(MIGRATIONS)
+        SchemaMigration.__table__.create(bind=connection, checkfirst=True)
+
+    applied = []
+    for item in MIGRATIONS:
+        if item.version in done:
+            continue
+        with engine.begin() as connection:
+            item.function(connection)
+            _record(connection, item)
+        applied.append(item)
+    return applied
+
+
+def init_migrations(app):
+    app.cli.add_command(db_upgrade_command)
+    app.cli.add_command(db_status_command)
+    app.cli.add_command(check_indexes_command)
+    if app.config.get('AUTO_MIGRATE', True):
+        with app.app_context():
+            upgrade()
+
+
+@click.command('db-upgrade')
+@with_appcontext
+def db_upgrade_command():
+    """Применить недостающие миграции схемы БД."""
+    applied = upgrade()
+    for item in applied:
+        click.echo('%3d  %s' % (item.version, item.description))
+    click.echo('Применено миграций: %d' % len(applied))
+
+
+@click.command('db-status')
+@with_appcontext
+def db_status_command():
+    """Показать применённые и ожидающие миграции."""
+    with db.engine.connect() as connection:
+        done = applied_versions(connection)
+    for item in MIGRATIONS:
+        click.echo('%3d  %-9s %s' % (item.version, 'готово' if item.version in done else 'ожидает',
+                                     item.description))
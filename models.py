@@ -1,7 +1,29 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 
-db = SQLAlchemy()
+from db_routing import RoutingSession
+
+# сессия выбирает основную БД или реплику для чтения (см. db_routing.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+
+# Тематика рукописей и специализация рецензентов (разделы журнала и ключевые слова);
+# используются при назначении рецензентов (assignment.py)
+manuscript_keywords = db.Table(
+    'manuscript_keywords',
+    db.Column('manuscript_id', db.Integer, db.ForeignKey('manuscripts.id'), primary_key=True),
+    db.Column('keyword_id', db.Integer, db.ForeignKey('keywords.id'), primary_key=True),
+)
+reviewer_sections = db.Table(
+    'reviewer_sections',
+    db.Column('user_id', db.Integer, db.ForeignKey('users.id'), primary_key=True),
+    db.Column('section_id', db.Integer, db.ForeignKey('journal_sections.id'), primary_key=True),
+)
+reviewer_keywords = db.Table(
+    'reviewer_keywords',
+    db.Column('user_id', db.Integer, db.ForeignKey('users.id'), primary_key=True),
+    db.Column('keyword_id', db.Integer, db.ForeignKey('keywords.id'), primary_key=True),
+)
 
 
 # Пользователь: автор, редактор (staff), рецензент, администратор
@@ -16,6 +38,10 @@ class User(db.Model):
     registered_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_blocked = db.Column(db.Boolean, default=False)
 
+    __table_args__ = (
+        db.Index('ix_users_registered_at', 'registered_at', 'id'),  # admin_users
+    )
+
     # связи
     manuscripts = db.relationship('Manuscript', backref='author', lazy=True)
     reviews_made = db.relationship('Review', foreign_keys='Review.reviewer_id',
@@ -25,6 +51,9 @@ class User(db.Model):
                                       backref='actor',
                                       lazy=True,
                                       foreign_keys='ManuscriptHistory.actor_id')
+    # специализация рецензента
+    sections = db.relationship('JournalSection', secondary=reviewer_sections, lazy=True)
+    keywords = db.relationship('Keyword', secondary=reviewer_keywords, lazy=True)
 
 
 class Manuscript(db.Model):
@@ -43,6 +72,32 @@ class Manuscript(db.Model):
     author_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     publication_id = db.Column(db.Integer, db.ForeignKey('publications.id'), nullable=True)
 
+    # файл в хранилище по содержимому (см. storage.py); у старых записей — пусто
+    file_sha256 = db.Column(db.String(64), db.ForeignKey('stored_files.sha256'), nullable=True)
+    file_size = db.Column(db.Integer, nullable=True)
+    file_name = db.Column(db.String(256), nullable=True)  # исходное имя файла при загрузке
+    stored_file = db.relationship('StoredFile', lazy=True)
+
+    # раздел журнала и ключевые слова — для подбора рецензентов
+    section_id = db.Column(db.Integer, db.ForeignKey('journal_sections.id'), nullable=True)
+    section = db.relationship('JournalSection', lazy=True)
+    keywords = db.relationship('Keyword', secondary=manuscript_keywords, lazy=True)
+
+    __table_args__ = (
+        # ЛК автора и «Статус рукописей»
+        db.Index('ix_manuscripts_author_created', 'author_id', 'created_at'),
+        # выгрузки и счётчики по статусу
+        db.Index('ix_manuscripts_status_created', 'status', 'created_at'),
+        # списки рукописей редактора (постранично по created_at, id)
+        db.Index('ix_manuscripts_created', 'created_at', 'id'),
+        # опубликованные рукописи выпуска
+        db.Index('ix_manuscripts_publication_status', 'publication_id', 'status'),
+        # проверка прав при скачивании /media/<путь>
+        db.Index('ix_manuscripts_file_path', 'file_path'),
+        # лента изменений (changes.py)
+        db.Index('ix_manuscripts_updated', 'updated_at', 'id'),
+    )
+
     reviews = db.relationship('Review', backref='manuscript', lazy=True)
     history = db.relationship('ManuscriptHistory',
                               backref='manuscript',
@@ -66,6 +121,15 @@ class Review(db.Model):
     # связь к пользователю-рецензенту (удобная ссылка)
     reviewer = db.relationship('User', foreign_keys=[reviewer_id])
 
+    __table_args__ = (
+        # рецензии по рукописи и поиск рецензии рецензента в review_form
+        db.Index('ix_reviews_manuscript_reviewer', 'manuscript_id', 'reviewer_id'),
+        # ЛК рецензента
+        db.Index('ix_reviews_reviewer_created', 'reviewer_id', 'created_at'),
+        # нагрузка рецензентов: открытые (pending) рецензии
+        db.Index('ix_reviews_status_reviewer', 'status', 'reviewer_id'),
+    )
+
 
 class Publication(db.Model):
     __tablename__ = 'publications'
@@ -78,6 +142,10 @@ class Publication(db.Model):
 
     manuscripts = db.relationship('Manuscript', backref='publication', lazy=True)
 
+    __table_args__ = (
+        db.Index('ix_publications_pub_date', 'pub_date', 'id'),
+    )
+
 
 class News(db.Model):
     __tablename__ = 'news'
@@ -87,6 +155,10 @@ class News(db.Model):
     content = db.Column(db.Text, nullable=False)
     published_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_news_published_at', 'published_at', 'id'),
+    )
+
 
 class Message(db.Model):
     __tablename__ = 'messages'
@@ -105,6 +177,11 @@ class Message(db.Model):
     status = db.Column(db.String(16), default='new')  # new, done
     is_read = db.Column(db.Boolean, default=False)
 
+    __table_args__ = (
+        db.Index('ix_messages_sent_at', 'sent_at', 'id'),
+        db.Index('ix_messages_status_sent', 'status', 'sent_at'),
+    )
+
 
 class ManuscriptHistory(db.Model):
     """
@@ -125,6 +202,10 @@ class ManuscriptHistory(db.Model):
 
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_manuscript_history_manuscript_created', 'manuscript_id', 'created_at'),
+    )
+
 class Department(db.Model):
     """
     Справочник подразделений / кафедр университета.
@@ -160,3 +241,127 @@ class Keyword(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     value = db.Column(db.String(64), nullable=False, unique=True)
+
+
+class StatsCounter(db.Model):
+    """
+    Материализованные счётчики для админ-панели и отчётов.
+    Поддерживаются событиями SQLAlchemy (см. stats.py), поэтому чтение
+    статистики не зависит от размера таблиц. scope — что считаем
+    (например, 'manuscripts.status'), key — значение группировки.
+    """
+    __tablename__ = 'stats_counters'
+
+    scope = db.Column(db.String(64), primary_key=True)
+    key = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ManuscriptText(db.Model):
+    """
+    Текст, извлечённый из загруженного файла рукописи (docx/pdf/rtf/txt).
+    Заполняется фоновым извлечением (см. extraction.py) и попадает
+    в полнотекстовый индекс. Здесь же — время извлечения и ошибка, если
+    файл прочитать не удалось.
+    """
+    __tablename__ = 'manuscript_texts'
+
+    manuscript_id = db.Column(db.Integer, db.ForeignKey('manuscripts.id'), primary_key=True)
+    source_name = db.Column(db.String(256), nullable=True)  # имя файла, из которого извлечён текст
+    content = db.Column(db.Text, nullable=True)
+
+    status = db.Column(db.String(16), nullable=False, default='pending')  # pending, done, failed
+    error = db.Column(db.Text, nullable=True)
+    duration_ms = db.Column(db.Integer, nullable=True)
+    extracted_at = db.Column(db.DateTime, nullable=True)
+
+
+class StoredFile(db.Model):
+    """
+    Файл в хранилище по содержимому: один экземпляр на SHA-256,
+    ref_count — число рукописей, ссылающихся на файл. Файлы с нулевым
+    счётчиком удаляются командой gc-uploads.
+    """
+    __tablename__ = 'stored_files'
+
+    sha256 = db.Column(db.String(64), primary_key=True)
+    path = db.Column(db.String(256), nullable=False)  # относительно UPLOAD_FOLDER
+    size = db.Column(db.Integer, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class SchemaMigration(db.Model):
+    """
+    Применённые миграции схемы БД (см. migrations.py): номер версии,
+    описание и время применения.
+    """
+    __tablename__ = 'schema_migrations'
+
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    description = db.Column(db.String(256), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class Job(db.Model):
+    """
+    Фоновая задача (см. jobs.py): имя обработчика, аргументы в JSON,
+    приоритет, число попыток и время следующего запуска. Добавляется
+    в той же транзакции, что и изменения, которые её вызвали.
+    """
+    __tablename__ = 'jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(64), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')
+    priority = db.Column(db.Integer, nullable=False, default=0)  # больше — раньше
+
+    status = db.Column(db.String(16), nullable=False, default='queued')
+    # queued, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    locked_by = db.Column(db.String(64), nullable=True)  # воркер, выполняющий задачу
+    locked_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        # выбор следующей задачи воркером
+        db.Index('ix_jobs_status_priority_run', 'status', 'priority', 'run_at'),
+        # ограничение числа одновременно выполняемых задач одного вида
+        db.Index('ix_jobs_name_status', 'name', 'status'),
+        # страница /admin/jobs
+        db.Index('ix_jobs_created', 'created_at', 'id'),
+    )
+
+
+class Notification(db.Model):
+    """
+    Уведомление пользователя о событии (подача рукописи, рецензия,
+    публикация, новое обращение). Неотправленные уведомления одного
+    получателя объединяются в одно письмо-дайджест (см. notifications.py).
+    """
+    __tablename__ = 'notifications'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    email = db.Column(db.String(128), nullable=False)
+
+    event = db.Column(db.String(32), nullable=False)
+    subject = db.Column(db.String(256), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+
+    status = db.Column(db.String(16), nullable=False, default='pending')
+    # pending, sent, failed, skipped
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        # выборка неотправленных уведомлений для дайджестов
+        db.Index('ix_notifications_status_email', 'status', 'email', 'created_at'),
+    )
@@ -0,0 +1,179 @@
+"""
+Уведомления по e-mail о событиях рукописей и обращений.
+
+Маршрут вызывает notify() до commit: в очередь ставится задача
+'notify', которая определяет получателей события и сохраняет
+уведомления в notifications. Отправку выполняет задача 'send_digests',
+запланированная через NOTIFY_DIGEST_WINDOW секунд после первого
+неотправленного уведомления: всё, что накопилось у получателя за это
+время, уходит одним письмом-дайджестом. Письма отправляются через пул
+SMTP-соединений с ограничением частоты (mailer.py).
+
+События и получатели:
+  manuscript_submitted — редакторы: новая рукопись;
+  review_submitted     — редакторы и автор: получена рецензия;
+  manuscript_published — автор: рукопись опубликована;
+  review_assigned      — рецензент: назначена рукопись на рецензию;
+  message_received     — администраторы: новое обращение.
+"""
+import logging
+from contextlib import closing
+from datetime import datetime
+from itertools import groupby
+from textwrap import indent
+
+from flask import current_app
+from sqlalchemy import update
+
+from jobs import enqueue, enqueue_many, task
+from mailer import build_message, mail_enabled, send_messages
+from models import db, User, Manuscript, Message, Notification, Job
+
+log = logging.getLogger(__name__)
+
+
+def _active_users(*roles):
+    return User.query.filter(User.role.in_(roles), User.is_blocked.isnot(True)).all()
+
+
+def _manuscript_submitted(manuscript_id):
+    manuscript = db.session.get(Manuscript, manuscript_id)
+    if manuscript is None:
+        return
+    for staff in _active_users('staff'):
+        yield staff, 'Новая рукопись: «%s»' % manuscript.title, (
+            'Поступила рукопись «%s» (автор — %s). Она ждёт рассмотрения в разделе «Все рукописи».'
+            % (manuscript.title, manuscript.author.full_name))
+
+
+def _review_submitted(manuscript_id, reviewer_id):
+    manuscript = db.session.get(Manuscript, manuscript_id)
+    reviewer = db.session.get(User, reviewer_id)
+    if manuscript is None or reviewer is None:
+        return
+    for staff in _active_users('staff'):
+        yield staff, 'Рецензия на рукопись «%s»' % manuscript.title, (
+            'Рецензент %s отправил рецензию на рукопись «%s».' % (reviewer.full_name, manuscript.title))
+    yield manuscript.author, 'Получена рецензия на вашу рукопись', (
+        'На рукопись «%s» получена рецензия. Статус рукописи — в разделе «Мои рукописи».'
+        % manuscript.title)
+
+
+def _manuscript_published(manuscript_id):
+    manuscript = db.session.get(Manuscript, manuscript_id)
+    if manuscript is None:
+        return
+    issue = ' в выпуске «%s»' % manuscript.publication.title if manuscript.publication else ''
+    yield manuscript.author, 'Рукопись опубликована', (
+        'Рукопись «%s» допущена к публикации%s.' % (manuscript.title, issue))
+
+
+def _review_assigned(manuscript_id, reviewer_id):
+    manuscript = db.session.get(Manuscript, manuscript_id)
+    reviewer = db.session.get(User, reviewer_id)
+    if manuscript is None or reviewer is None:
+        return
+    yield reviewer, 'Рукопись на рецензию: «%s»' % manuscript.title, (
+        'Вам назначена на рецензию рукопись «%s». Она доступна в разделе «Рецензирование».'
+        % manuscript.title)
+
+
+def _message_received(message_id):
+    message = db.session.get(Message, message_id)
+    if message is None:
+        return
+    sender = message.sender.full_name if message.sender else (message.sender_email or 'гость сайта')
+    for admin in _active_users('admin'):
+        yield admin, 'Новое обращение: %s' % message.subject, (
+            'Обращение от %s:\n\n%s' % (sender, message.body))
+
+
+EVENTS = {
+    'manuscript_submitted': _manuscript_submitted,
+    'review_submitted': _review_submitted,
+    'manuscript_published': _manuscript_published,
+    'review_assigned': _review_assigned,
+    'message_received': _message_received,
+}
+
+
+def notify(event, **ids):
+    """Ставит уведомление о событии; фиксируется вместе с изменениями при commit."""
+    if event not in EVENTS:
+        raise ValueError('Неизвестное событие: %s' % event)
+    return enqueue('notify', event=event, **ids)
+
+
+def notify_many(event, items):
+    """То же для списка событий одного вида — одним INSERT задач."""
+    if event not in EVENTS:
+        raise ValueError('Неизвестное событие: %s' % event)
+    return enqueue_many('notify', [dict(event=event, **ids) for ids in items])
+
+
+@task('notify', priority=5)
+def create_notifications(event, **ids):
+    created = 0
+    for user, subject, body in EVENTS[event](**ids):
+        if not user.email:
+            continue
+        db.session.add(Notification(user_id=user.id, email=user.email, event=event,
+                                    subject=subject, body=body))
+        created += 1
+    if created:
+        schedule_digests()
+
+
+def schedule_digests():
+    """Планирует отправку дайджестов, если она ещё не стоит в очереди."""
+    queued = db.session.query(Job.id).filter(Job.name == 'send_digests', Job.status == 'queued').first()
+    if queued is None:
+        enqueue('send_digests', delay=current_app.config.get('NOTIFY_DIGEST_WINDOW', 300))
+
+
+def build_digest(notifications):
+    """Письмо получателю: одно уведомление — как есть, несколько — списком."""
+    site_url = current_app.config.get('SITE_URL', '').rstrip('/')
+    footer = '\n\n--\nРедакционно-издательский отдел\nЛичный кабинет: %s/lk\n' % site_url
+    if len(notifications) == 1:
+        item = notifications[0]
+        return build_message(item.email, item.subject, 'Здравствуйте!\n\n' + item.body + footer)
+    lines = ['Здравствуйте!', '', 'Новые события (%d):' % len(notifications), '']
+    for item in notifications:
+        lines.append('— %s (%s)' % (item.subject, item.created_at.strftime('%d.%m.%Y %H:%M')))
+        lines.append(indent(item.body, '  '))
+        lines.append('')
+    subject = 'Редакция: новых уведомлений — %d' % len(notifications)
+    return build_message(notifications[0].email, subject, '\n'.join(lines).rstrip() + footer)
+
+
+@task('send_digests', concurrency=1)
+def send_digests():
+    if not mail_enabled():
+        skipped = db.session.execute(
+            update(Notification).where(Notification.status == 'pending').values(status='skipped')
+        ).rowcount
+        log.info('MAIL_SERVER не задан — уведомления не отправлены: %d', skipped)
+        return
+
+    pending = Notification.query.filter_by(status='pending').order_by(
+        Notification.email, Notification.created_at
+    ).all()
+    groups = {email: list(items) for email, items in groupby(pending, key=lambda n: n.email)}
+    messages = ((email, build_digest(items)) for email, items in groups.items())
+
+    sent = failed = 0
+    with closing(send_messages(messages)) as results:
+        for email, error in results:
+            now = datetime.utcnow()
+            for item in groups[email]:
+                item.status = 'failed' if error else 'sent'
+                item.error = error
+                item.sent_at = None if error else now
+            # отправленное фиксируется сразу: при повторе задачи письмо не уйдёт дважды
+            db.session.commit()
+            if error:
+                failed += 1
+            else:
+                sent += 1
+    log.info('Дайджестов отправлено: %d, отклонено: %d', sent, failed)
@@ -0,0 +1,283 @@
+"""
+Кэш готовых HTML-страниц публичной части сайта.
+
+Страница кэшируется по ключу «маршрут + аргументы + параметры запроса,
+которые читает представление (params в cached) + состояние входа (аноним
+или роль)». Запрос с другими параметрами (/news?x=1) отдаётся без кэша,
+чтобы произвольные параметры не порождали новых записей. Каждая запись помечена тегами данных,
+от которых она зависит ('news', 'publications'); при изменении строк News,
+Publication или публикации рукописи версия тега увеличивается, и все
+зависящие от него записи становятся недействительными.
+
+Хранилища: LRU в памяти процесса (PAGE_CACHE_SIZE записей) и, при
+PAGE_CACHE_TYPE = 'filesystem', общий каталог PAGE_CACHE_DIR, через
+который записи и версии тегов видят все процессы сервера. В каталоге
+не больше PAGE_CACHE_MAX_FILES записей: при превышении удаляются
+устаревшие по PAGE_CACHE_TTL, а затем самые старые.
+Ответы получают ETag/Last-Modified, повторный запрос браузера
+с If-None-Match получает 304.
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import current_app, request, session, make_response
+from sqlalchemy import event, inspect
+
+from models import db, News, Publication, Manuscript
+
+
+class MemoryLRU:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class FileStore:
+    """Записи в виде pickle-файлов; запись атомарная (временный файл + os.replace)."""
+
+    def __init__(self, directory, max_files=2000, ttl=None):
+        self.directory = directory
+        self.max_files = max_files
+        self.ttl = ttl
+        os.makedirs(os.path.join(directory, 'tags'), exist_ok=True)
+        self._lock = threading.Lock()
+        # приблизительно: записи добавляют и другие процессы, точное число даёт prune
+        self._count = len(self._entries())
+
+    def _entries(self):
+        return [entry for entry in os.scandir(self.directory) if entry.name.endswith('.page')]
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.page')
+
+    def _write(self, path, data):
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                return pickle.load(f)
+        except (OSError, pickle.PickleError, EOFError):
+            return None
+
+    def set(self, key, entry):
+        self._write(self._path(key), pickle.dumps(entry, pickle.HIGHEST_PROTOCOL))
+        with self._lock:
+            self._count += 1
+            if self._count <= self.max_files:
+                return
+            self._count = self.prune()
+
+    def prune(self):
+        """Удаляет устаревшие записи, затем самые старые — до 90 % лимита; возвращает сколько осталось."""
+        now = time.time()
+        files = []
+        for entry in self._entries():
+            try:
+                files.append((entry.stat().st_mtime, entry.path))
+            except OSError:
+                pass  # удалена другим процессом
+        files.sort()
+        keep = int(self.max_files * 0.9)
+        removed = 0
+        for modified, path in files:
+            expired = self.ttl and now - modified > self.ttl
+            if not expired and len(files) - removed <= keep:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            removed += 1
+        return len(files) - removed
+
+    def tag_version(self, tag):
+        try:
+            with open(os.path.join(self.directory, 'tags', tag), 'rb') as f:
+                return int(f.read() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def bump_tag(self, tag):
+        self._write(os.path.join(self.directory, 'tags', tag), str(time.time_ns()).encode('ascii'))
+
+
+class PageCache:
+    """Создаётся один раз на модуль (как db) и подключается через init_app."""
+
+    def __init__(self):
+        self.memory = None
+        self.store = None
+        self.ttl = None
+        self._tags = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        backend = app.config.get('PAGE_CACHE_TYPE')
+        if not backend:
+            return
+        self.memory = MemoryLRU(app.config.get('PAGE_CACHE_SIZE', 256))
+        self.ttl = app.config.get('PAGE_CACHE_TTL')
+        if backend == 'filesystem':
+            self.store = FileStore(app.config['PAGE_CACHE_DIR'], app.config.get('PAGE_CACHE_MAX_FILES', 2000),
+                                   self.ttl)
+        app.extensions['page_cache'] = self
+
+    @property
+    def enabled(self):
+        return self.memory is not None
+
+    # --- версии тегов ---
+
+    def tag_version(self, tag):
+        if self.store is not None:
+            return self.store.tag_version(tag)
+        return self._tags.get(tag, 0)
+
+    def invalidate(self, *tags):
+        if not self.enabled:
+            return
+        for tag in tags:
+            if self.store is not None:
+                self.store.bump_tag(tag)
+            else:
+                with self._lock:
+                    self._tags[tag] = self._tags.get(tag, 0) + 1
+
+    # --- записи ---
+
+    def _lookup(self, key, tags):
+        entry = self.memory.get(key)
+        if entry is None and self.store is not None:
+            entry = self.store.get(key)
+            if entry is not None:
+                self.memory.set(key, entry)
+        if entry is None:
+            return None
+        if self.ttl and time.time() - entry['created'] > self.ttl:
+            return None
+        if any(entry['tags'].get(tag) != self.tag_version(tag) for tag in tags):
+            return None
+        return entry
+
+    def _save(self, key, entry):
+        self.memory.set(key, entry)
+        if self.store is not None:
+            self.store.set(key, entry)
+
+    def cached(self, *tags, state=None, params=()):
+        """
+        Декоратор GET-представления. state() возвращает строку состояния
+        входа (например, 'anon' или роль пользователя) для ключа, params —
+        параметры запроса, которые читает представление.
+        Страницы с ожидающими flash-сообщениями и запросы с другими
+        параметрами не кэшируются.
+        """
+        def wrapper(f):
+            @wraps(f)
+            def decorated_function(*args, **kwargs):
+                if (not self.enabled or request.method != 'GET' or session.get('_flashes')
+                        or not set(request.args) <= set(params)):
+                    return f(*args, **kwargs)
+
+                key = '|'.join([
+                    request.endpoint,
+                    repr(sorted(kwargs.items())),
+                    repr(sorted(request.args.items(multi=True))),
+                    state() if state else '',
+                ])
+                entry = self._lookup(key, tags)
+                if entry is None:
+                    versions = {tag: self.tag_version(tag) for tag in tags}
+                    response = make_response(f(*args, **kwargs))
+                    if response.status_code != 200 or response.is_streamed:
+                        return response
+                    body = response.get_data()
+                    entry = {
+                        'body': body,
+                        'mimetype': response.mimetype,
+                        'etag': hashlib.sha1(body).hexdigest(),
+                        'created': time.time(),
+                        'tags': versions,
+                    }
+                    self._save(key, entry)
+
+                response = current_app.response_class(entry['body'], mimetype=entry['mimetype'])
+                response.set_etag(entry['etag'])
+                response.last_modified = datetime.fromtimestamp(int(entry['created']), timezone.utc)
+                response.cache_control.no_cache = True
+                if state and state() != 'anon':
+                    response.cache_control.private = True
+                return response.make_conditional(request)
+            return decorated_function
+        return wrapper
+
+
+page_cache = PageCache()
+
+
+# --- Инвалидация по изменениям данных ---
+# Теги собираются при flush и сбрасываются только после commit,
+# чтобы параллельный запрос не закэшировал ещё не зафиксированные данные.
+
+def _collect_tags(session, flush_context, instances):
+    tags = session.info.setdefault('page_cache_tags', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, News):
+            tags.add('news')
+        elif isinstance(obj, Publication):
+            tags.add('publications')
+        elif isinstance(obj, Manuscript):
+            # опубликованные рукописи выводятся в списке и карточке выпуска
+            history = inspect(obj).attrs.status.history
+            if 'published' in (list(history.added) + list(history.deleted) + list(history.unchanged)):
+                tags.add('publications')
+
+
+def invalidate_on_commit(*tags):
+    """Сбросить теги после commit — для массовых UPDATE, которые не проходят через flush."""
+    db.session.info.setdefault('page_cache_tags', set()).update(tags)
+
+
+def _flush_tags(session):
+    tags = session.info.pop('page_cache_tags', None)
+    if tags:
+        page_cache.invalidate(*tags)
+
+
+def _drop_tags(session):
+    session.info.pop('page_cache_tags', None)
+
+
+event.listen(db.session, 'before_flush', _collect_tags)
+event.listen(db.session, 'after_commit', _flush_tags)
+event.listen(db.session, 'after_rollback', _drop_tags)
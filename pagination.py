@@ -0,0 +1,179 @@
+"""
+Постраничный вывод списков по «курсору» (keyset pagination).
+
+Вместо OFFSET следующая страница выбирается условием по паре
+(колонка сортировки, id) последней показанной записи, поэтому время
+ответа не зависит от того, насколько глубоко пролистан список.
+"""
+import base64
+import json
+from datetime import date, datetime
+
+from flask import current_app, request, url_for
+from sqlalchemy import and_, tuple_
+
+# параметры запроса, которые читает keyset_paginate (для ключа кэша страниц)
+PAGE_PARAMS = ('after', 'before', 'per_page')
+
+
+class KeysetPage:
+    """
+    Одна страница выборки: записи и ссылки на соседние страницы.
+    Передаётся в шаблон как ``page`` и выводится через pagination.html.
+    """
+
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    @property
+    def next_url(self):
+        if not self.has_next:
+            return None
+        return _page_url(after=self.next_cursor)
+
+    @property
+    def prev_url(self):
+        if not self.has_prev:
+            return None
+        return _page_url(before=self.prev_cursor)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+
+def encode_cursor(value, ident):
+    if isinstance(value, (datetime, date)):
+        value = value.isoformat()
+    raw = json.dumps([value, ident], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, column):
+    """Возвращает (значение, id) или None, если курсор повреждён."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        value, ident = json.loads(raw)
+        ident = int(ident)
+        if value is not None:
+            python_type = column.type.python_type
+            if python_type is datetime:
+                value = datetime.fromisoformat(value)
+            elif python_type is date:
+                value = date.fromisoformat(value)
+        return value, ident
+    except (ValueError, TypeError, NotImplementedError):
+        return None
+
+
+def get_per_page():
+    default = current_app.config.get('PAGE_SIZE', 50)
+    maximum = current_app.config.get('PAGE_SIZE_MAX', 200)
+    per_page = request.args.get('per_page', default, type=int)
+    return max(1, min(per_page, maximum))
+
+
+def page_segments(column, id_column, position, backwards=False):
+    """
+    Участки выборки страницы в порядке выдачи: [(условие или None, порядок)].
+
+    Условие по курсору — сравнение пар (column, id) целиком: индекс
+    (column, id) ищет по нему сразу с нужного места, а OR из отдельных
+    сравнений заставляет читать индекс с начала. Строки с NULL в колонке
+    в сравнение пар не попадают и выбираются отдельным участком.
+    """
+    by_value = (column.desc(), id_column.desc())
+    by_id = (id_column.desc(),)
+    if backwards:
+        by_value = (column.asc(), id_column.asc())
+        by_id = (id_column.asc(),)
+    if position is None:
+        return [(None, (column.desc().nullslast(), id_column.desc()))]
+    value, ident = position
+    pair = tuple_(column, id_column)
+    if backwards and value is None:
+        return [(and_(column.is_(None), id_column > ident), by_id),
+                (column.isnot(None), by_value)]
+    if backwards:
+        return [(pair > (value, ident), by_value)]
+    if value is None:
+        return [(and_(column.is_(None), id_column < ident), by_id)]
+    return [(pair < (value, ident), by_value),
+            (column.is_(None), by_id)]
+
+
+def keyset_paginate(query, column, id_column, per_page=None):
+    """
+    Выбирает одну страницу ``query`` в порядке (column DESC, id DESC).
+
+    Курсоры берутся из параметров запроса ``after`` (следующая страница,
+    более старые записи) и ``before`` (предыдущая страница). NULL в колонке
+    сортировки идут в конце списка, как и в прежних .order_by(...desc()).
+    """
+    if per_page is None:
+        per_page = get_per_page()
+
+    after = request.args.get('after')
+    before = request.args.get('before')
+    position = None
+    backwards = False
+    if after:
+        position = decode_cursor(after, column)
+    elif before:
+        position = decode_cursor(before, column)
+        backwards = position is not None
+
+    segments = page_segments(column, id_column, position, backwards)
+
+    rows = []
+    for condition, order in segments:
+        segment = query if condition is None else query.filter(condition)
+        rows += segment.order_by(*order).limit(per_page + 1 - len(rows)).all()
+        if len(rows) > per_page:
+            break
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    attr, id_attr = column.key, id_column.key
+
+    def cursor_of(row):
+        return encode_cursor(getattr(row, attr), getattr(row, id_attr))
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if backwards:
+            # назад листаем от курсора, значит дальше (вперёд) записи точно есть
+            next_cursor = cursor_of(rows[-1])
+            prev_cursor = cursor_of(rows[0]) if has_more else None
+        else:
+            next_cursor = cursor_of(rows[-1]) if has_more else None
+            prev_cursor = cursor_of(rows[0]) if position is not None else None
+
+    return KeysetPage(rows, per_page, next_cursor=next_cursor, prev_cursor=prev_cursor)
+
+
+def _page_url(**cursor):
+    args = request.args.to_dict()
+    args.pop('after', None)
+    args.pop('before', None)
+    args.update(cursor)
+    return url_for(request.endpoint, **dict(request.view_args or {}, **args))
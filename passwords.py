@@ -0,0 +1,114 @@
+"""
+Хэширование и проверка паролей в ограниченном пуле.
+
+generate_password_hash / check_password_hash намеренно дорогие (scrypt —
+около 0,1 с процессорного времени). Если считать их прямо в потоке
+запроса, поток входов (перебор паролей по утёкшим базам) занимает все
+ядра, и сайт перестаёт отвечать остальным. Поэтому хэши считаются в пуле
+из PASSWORD_HASH_WORKERS потоков (или процессов, PASSWORD_HASH_POOL =
+'process'): hashlib отпускает GIL на время scrypt/pbkdf2, так что потоки
+работают параллельно на разных ядрах, а число одновременно занятых ядер
+ограничено размером пула. В очереди пула ждут не больше
+PASSWORD_HASH_QUEUE задач; если она полна, запрос сразу получает
+HashingBusy (сайт отвечает 503), а не ждёт в общей очереди.
+
+Параметры хэша задаёт PASSWORD_HASH_METHOD (формат werkzeug, например
+'scrypt:32768:8:1' или 'pbkdf2:sha256:600000'). Если при успешном входе
+оказывается, что пароль пользователя захэширован другим методом или
+с другой стоимостью, хэш пересчитывается (needs_rehash / verify_password).
+"""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from functools import lru_cache
+
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HashingBusy(RuntimeError):
+    """Очередь пула хэширования заполнена или ответ не получен вовремя."""
+
+
+class HashPool:
+    """Создаётся один раз на модуль и настраивается в init_passwords (как page_cache)."""
+
+    def __init__(self):
+        self.executor = None
+        self.timeout = None
+        self._slots = None
+
+    def configure(self, kind, workers, queue, timeout):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+        if kind == 'process':
+            self.executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        # выполняемые + ожидающие задачи
+        self._slots = threading.BoundedSemaphore(workers + queue)
+        self.timeout = timeout
+
+    def run(self, function, *args):
+        if self.executor is None:
+            return function(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy('Очередь хэширования паролей заполнена')
+        try:
+            future = self.executor.submit(function, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise HashingBusy('Хэширование пароля не завершилось за %s с' % self.timeout)
+
+
+hash_pool = HashPool()
+
+
+@lru_cache(maxsize=8)
+def _method_prefix(method):
+    # werkzeug дописывает параметры по умолчанию ('pbkdf2:sha256' -> 'pbkdf2:sha256:600000'),
+    # поэтому префикс берётся из настоящего хэша
+    return generate_password_hash('', method).split('$', 1)[0]
+
+
+def _method():
+    return current_app.config.get('PASSWORD_HASH_METHOD', 'scrypt')
+
+
+def hash_password(password):
+    return hash_pool.run(generate_password_hash, password, _method())
+
+
+def needs_rehash(password_hash):
+    return password_hash.split('$', 1)[0] != _method_prefix(_method())
+
+
+def verify_password(user, password):
+    """
+    Проверяет пароль пользователя; при успехе и устаревших параметрах хэша
+    записывает в user.password_hash новый хэш (commit — за вызывающим).
+    """
+    if not user.password_hash or not password:
+        return False
+    if not hash_pool.run(check_password_hash, user.password_hash, password):
+        return False
+    if needs_rehash(user.password_hash):
+        user.password_hash = hash_password(password)
+    return True
+
+
+def init_passwords(app):
+    workers = app.config.get('PASSWORD_HASH_WORKERS') or max(1, (os.cpu_count() or 2) // 2)
+    hash_pool.configure(
+        app.config.get('PASSWORD_HASH_POOL', 'thread'),
+        workers,
+        app.config.get('PASSWORD_HASH_QUEUE', 16),
+        app.config.get('PASSWORD_HASH_TIMEOUT', 10),
+    )
@@ -0,0 +1,280 @@
+"""
+Профилирование работающего сайта из админ-панели (/admin/profiler):
+когда маршрут замедлился в production, его можно разобрать на месте,
+не воспроизводя нагрузку локально.
+
+Администратор запускает сеанс на N секунд или на следующие N запросов,
+путь или endpoint которых подходит под шаблон (fnmatch: '/manuscripts*',
+'routes.admin_*'). Для каждого выбранного запроса:
+  - включается cProfile, но не больше чем для одного запроса за раз:
+    с Python 3.12 cProfile построен на sys.monitoring, общем для всего
+    интерпретатора, второй экземпляр включить нельзя (ValueError), а
+    в статистику могут попасть и вызовы других потоков. Запросы,
+    пришедшие во время профилирования другого, и запросы при постороннем
+    включённом профилировщике (отладчик, coverage) учитываются только
+    выборкой стеков. Статистика cProfile всех запросов сеанса
+    складывается в один pstats-дамп;
+  - поток запроса попадает под статистический профилировщик: фоновый
+    поток раз в PROFILER_INTERVAL_MS снимает его стек
+    (sys._current_frames) и считает одинаковые стеки.
+По окончании сеанса в PROFILER_DIR записываются:
+  <сеанс>.collapsed — стеки в формате collapsed stacks («f1;f2;f3 N»),
+      вход для flamegraph.pl и speedscope;
+  <сеанс>.prof — дамп cProfile (python -m pstats, snakeviz);
+  <сеанс>.txt — самые затратные функции по cProfile;
+  <сеанс>.json — параметры и итоги сеанса.
+Хранятся последние PROFILER_KEEP сеансов.
+
+Без активного сеанса профилировщик стоит одну проверку в before_request,
+фонового потока нет. Сеанс ограничен PROFILER_MAX_SECONDS и
+PROFILER_MAX_REQUESTS, одновременно идёт не больше одного. Сеанс
+действует в том процессе сервера, который принял команду запуска.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from fnmatch import fnmatchcase
+
+from flask import current_app, g, request
+
+SAFE_NAME = re.compile(r'^[\w-]+\.(collapsed|prof|txt|json)$')
+
+_lock = threading.Lock()
+_state = {'session': None}
+
+
+class ProfileSession:
+    def __init__(self, app, seconds=None, requests=None, pattern='', started_by=None):
+        config = app.config
+        self.id = '%s-%d' % (datetime.now().strftime('%Y%m%d-%H%M%S'), os.getpid())
+        self.root = app.root_path
+        self.directory = config['PROFILER_DIR']
+        self.keep = config.get('PROFILER_KEEP', 20)
+        self.interval = config.get('PROFILER_INTERVAL_MS', 5) / 1000.0
+        max_seconds = config.get('PROFILER_MAX_SECONDS', 300)
+        self.seconds = min(seconds or max_seconds, max_seconds)
+        self.requests = min(requests, config.get('PROFILER_MAX_REQUESTS', 500)) if requests else None
+        self.pattern = pattern or ''
+        self.started_by = started_by
+        self.started_at = datetime.now()
+        self.deadline = time.monotonic() + self.seconds
+        self.remaining = self.requests
+        self.profiled = 0
+        self.cprofiled = 0
+        self.samples = 0
+        self.stacks = Counter()
+        self.stats = None
+        self.active = {}  # id потока выбранного запроса -> cProfile.Profile или None (только выборка)
+        self.finished = threading.Event()
+
+    # --- выбор запросов ---
+
+    def matches(self, path, endpoint):
+        if not self.pattern:
+            return True
+        return fnmatchcase(path, self.pattern) or bool(endpoint and fnmatchcase(endpoint, self.pattern))
+
+    def claim(self, path, endpoint):
+        """Берёт запрос в сеанс, если он подходит и лимит не исчерпан."""
+        if self.finished.is_set() or time.monotonic() >= self.deadline:
+            return False
+        if not self.matches(path, endpoint):
+            return False
+        with _lock:
+            if self.remaining is not None:
+                if self.remaining <= 0:
+                    return False
+                self.remaining -= 1
+            self.profiled += 1
+        return True
+
+    def attach(self):
+        """Ставит поток запроса под выборку стеков; возвращает включённый cProfile или None."""
+        ident = threading.get_ident()
+        with _lock:
+            profile = None if any(self.active.values()) else cProfile.Profile()
+            self.active[ident] = profile
+        if profile is not None:
+            try:
+                profile.enable()
+            except ValueError:
+                # включён другой профилировщик (отладчик, coverage) — остаётся только выборка
+                with _lock:
+                    self.active[ident] = None
+                return None
+        return profile
+
+    def detach(self, profile):
+        if profile is not None:
+            profile.disable()
+        with _lock:
+            self.active.pop(threading.get_ident(), None)
+            if profile is not None:
+                self.cprofiled += 1
+                if self.stats is None:
+                    self.stats = pstats.Stats(profile)
+                else:
+                    self.stats.add(profile)
+            done = self.remaining == 0 and not self.active
+        if done:
+            self.finish()
+
+    # --- статистический профилировщик ---
+
+    def sample(self):
+        while not self.finished.wait(self.interval):
+            if time.monotonic() >= self.deadline:
+                self.finish()
+                break
+            with _lock:
+                threads = list(self.active)
+            if not threads:
+                continue
+            frames = sys._current_frames()
+            for ident in threads:
+                frame = frames.get(ident)
+                if frame is not None:
+                    self.stacks[collapse(frame, self.root)] += 1
+                    self.samples += 1
+
+    # --- завершение ---
+
+    def finish(self):
+        with _lock:
+            if self.finished.is_set():
+                return
+            self.finished.set()
+            if _state['session'] is self:
+                _state['session'] = None
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, self.id)
+        with open(base + '.collapsed', 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write('%s %d\n' % (stack, count))
+        summary = ''
+        if self.stats is not None:
+            self.stats.dump_stats(base + '.prof')
+            out = io.StringIO()
+            self.stats.stream = out
+            self.stats.sort_stats('cumulative').print_stats(40)
+            summary = out.getvalue()
+        with open(base + '.txt', 'w', encoding='utf-8') as f:
+            f.write(summary)
+        with open(base + '.json', 'w', encoding='utf-8') as f:
+            json.dump(self.describe(), f, ensure_ascii=False, indent=2)
+        _prune(self.directory, self.keep)
+
+    def describe(self):
+        return {
+            'id': self.id,
+            'pattern': self.pattern,
+            'seconds': self.seconds,
+            'requests': self.requests,
+            'started_by': self.started_by,
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'finished_at': datetime.now().isoformat(timespec='seconds') if self.finished.is_set() else None,
+            'profiled': self.profiled,
+            'cprofiled': self.cprofiled,
+            'samples': self.samples,
+        }
+
+
+def collapse(frame, root):
+    """Стек потока в строку collapsed stacks: от внешнего вызова к текущему."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append('%s (%s:%d)' % (code.co_name, _short_path(code.co_filename, root), code.co_firstlineno))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def _short_path(path, root):
+    # пути библиотек — от site-packages, модули сайта — от корня приложения
+    if 'site-packages' + os.sep in path:
+        return path.split('site-packages' + os.sep, 1)[1]
+    if path.startswith(root + os.sep):
+        return path[len(root) + 1:]
+    return path
+
+
+def _prune(directory, keep):
+    sessions = sorted({name.split('.', 1)[0] for name in os.listdir(directory) if SAFE_NAME.match(name)})
+    for old in sessions[:-keep] if keep else []:
+        for name in os.listdir(directory):
+            if name.split('.', 1)[0] == old:
+                os.remove(os.path.join(directory, name))
+
+
+# --- Управление (маршруты /admin/profiler в routes.py) ---
+
+def current_session():
+    return _state['session']
+
+
+def start(seconds=None, requests=None, pattern='', started_by=None):
+    """Запускает сеанс; возвращает его или None, если уже идёт другой."""
+    session = ProfileSession(current_app._get_current_object(), seconds, requests, pattern, started_by)
+    with _lock:
+        if _state['session'] is not None:
+            return None
+        _state['session'] = session
+    threading.Thread(target=session.sample, name='profiler', daemon=True).start()
+    return session
+
+
+def stop():
+    session = _state['session']
+    if session is not None:
+        session.finish()
+    return session
+
+
+def saved_sessions(directory):
+    """Сохранённые сеансы, новые первыми: [(описание, имена файлов)]."""
+    if not os.path.isdir(directory):
+        return []
+    files = {}
+    for name in os.listdir(directory):
+        if SAFE_NAME.match(name):
+            files.setdefault(name.split('.', 1)[0], []).append(name)
+    sessions = []
+    for session_id in sorted(files, reverse=True):
+        try:
+            with open(os.path.join(directory, session_id + '.json'), encoding='utf-8') as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            info = {'id': session_id}
+        sessions.append((info, sorted(files[session_id])))
+    return sessions
+
+
+# --- Подключение ---
+
+def init_profiler(app):
+    app.config.setdefault('PROFILER_DIR', os.path.join(app.instance_path, 'profiles'))
+
+    @app.before_request
+    def _profile_request():
+        session = _state['session']
+        if session is None:
+            return
+        if (request.endpoint or '').startswith('routes.admin_profiler'):
+            return  # страница управления профилировщиком сама не профилируется
+        if session.claim(request.path, request.endpoint):
+            g.profile = (session, session.attach())
+
+    @app.teardown_request
+    def _finish_profile(exc):
+        item = g.pop('profile', None)
+        if item is not None:
+            session, profile = item
+            session.detach(profile)
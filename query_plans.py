@@ -0,0 +1,176 @@
+"""
+Проверка планов частых запросов: каждый из них должен использовать индекс.
+
+HOT_QUERIES повторяет запросы маршрутов (первая страница списков и
+страница по курсору, выборки ЛК, рецензии по рукописи, выгрузки
+отчётов). Для каждого выполняется EXPLAIN и ищутся полный просмотр
+таблицы и сортировка во временной структуре вместо индекса:
+  SQLite     — «SCAN <таблица>» без индекса и «USE TEMP B-TREE FOR ORDER BY»;
+  PostgreSQL — «Seq Scan» (при enable_seqscan = off, чтобы на маленьких
+               таблицах планировщик не выбирал его из-за дешевизны) и «Sort».
+Для страниц по курсору (SEEK_QUERIES) индекс к тому же должен читаться
+с позиции курсора: в SQLite — «SEARCH», в PostgreSQL — «Index Cond».
+
+Запуск: `flask check-indexes` (код возврата 1, если есть замечания).
+"""
+import re
+from datetime import date
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import exists, func, select, text
+
+from models import db, User, Manuscript, Review, Publication, News, Message, ManuscriptHistory
+from pagination import page_segments
+
+PAGE = 51  # keyset_paginate выбирает per_page + 1 строк
+
+
+def cursor_page(model, column, backwards=False):
+    # основной участок страницы keyset_paginate по курсору из середины списка
+    condition, order = page_segments(column, model.id, (date(2024, 1, 1), 1000), backwards)[0]
+    return select(model).where(condition).order_by(*order).limit(PAGE)
+
+
+HOT_QUERIES = {
+    'index / news: лента новостей': lambda: (
+        select(News).order_by(News.published_at.desc().nullslast(), News.id.desc()).limit(PAGE)
+    ),
+    'index / publications: выпуски': lambda: (
+        select(Publication).order_by(Publication.pub_date.desc().nullslast(), Publication.id.desc()).limit(PAGE)
+    ),
+    'publication_detail: рукописи выпуска': lambda: (
+        select(Manuscript).where(Manuscript.publication_id == 1, Manuscript.status == 'published')
+    ),
+    'lk / manuscript_status: рукописи автора': lambda: (
+        select(Manuscript).where(Manuscript.author_id == 1).order_by(Manuscript.created_at.desc())
+    ),
+    'lk: рецензии рецензента': lambda: (
+        select(Review).where(Review.reviewer_id == 1).order_by(Review.created_at.desc())
+    ),
+    'lk / manuscript_list: все рукописи': lambda: (
+        select(Manuscript).order_by(Manuscript.created_at.desc().nullslast(), Manuscript.id.desc()).limit(PAGE)
+    ),
+    'manuscript_list: страница по курсору': lambda: cursor_page(Manuscript, Manuscript.created_at),
+    'manuscript_list: предыдущая страница по курсору': lambda: (
+        cursor_page(Manuscript, Manuscript.created_at, backwards=True)
+    ),
+    'news: страница по курсору': lambda: cursor_page(News, News.published_at),
+    'review_form: рецензия рецензента': lambda: (
+        select(Review).where(Review.manuscript_id == 1, Review.reviewer_id == 1).limit(1)
+    ),
+    'assignment: нагрузка рецензентов': lambda: (
+        select(Review.reviewer_id, func.count()).where(Review.status == 'pending').group_by(Review.reviewer_id)
+    ),
+    'review_list: рецензии по рукописи': lambda: (
+        select(Review).where(Review.manuscript_id == 1)
+    ),
+    'manuscript.history: история рукописи': lambda: (
+        select(ManuscriptHistory).where(ManuscriptHistory.manuscript_id == 1)
+        .order_by(ManuscriptHistory.created_at)
+    ),
+    'admin_contacts: обращения': lambda: (
+        select(Message).order_by(Message.sent_at.desc().nullslast(), Message.id.desc()).limit(PAGE)
+    ),
+    'admin_contacts: новые обращения': lambda: (
+        select(Message).where(Message.status == 'new').order_by(Message.sent_at.desc())
+    ),
+    'admin_users: пользователи': lambda: (
+        select(User).order_by(User.registered_at.desc().nullslast(), User.id.desc()).limit(PAGE)
+    ),
+    'admin_reports: выгрузка за период': lambda: (
+        select(Manuscript.id, Manuscript.title, Manuscript.status, Manuscript.created_at)
+        .where(Manuscript.created_at >= date(2024, 1, 1))
+        .order_by(Manuscript.created_at.desc(), Manuscript.id.desc())
+    ),
+    'admin_reports: выгрузка по статусу': lambda: (
+        select(Manuscript.id, Manuscript.title, Manuscript.status, Manuscript.created_at)
+        .where(Manuscript.status == 'published')
+        .order_by(Manuscript.created_at.desc(), Manuscript.id.desc())
+    ),
+    'changes: изменённые рукописи': lambda: (
+        select(Manuscript.id, Manuscript.updated_at)
+        .where(Manuscript.updated_at > date(2024, 1, 1)).order_by(Manuscript.updated_at, Manuscript.id).limit(PAGE)
+    ),
+    'changes: события истории': lambda: (
+        select(ManuscriptHistory.id, ManuscriptHistory.action)
+        .where(ManuscriptHistory.id > 1).order_by(ManuscriptHistory.id).limit(PAGE)
+    ),
+    'media: право на скачивание': lambda: (
+        select(exists().where(Manuscript.file_path == 'media/manuscripts/x.pdf'))
+    ),
+}
+
+# запросы по курсору должны начинать чтение индекса с позиции курсора,
+# а не просматривать его с начала (время страницы росло бы с глубиной)
+SEEK_QUERIES = {name for name in HOT_QUERIES if 'по курсору' in name}
+
+_SQLITE_TABLE_SCAN = re.compile(r'^SCAN (\w+)$')
+
+
+def explain(connection, statement):
+    """Строки плана запроса для текущей СУБД."""
+    compiled = statement.compile(dialect=connection.dialect)
+    params = compiled.params
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    if connection.dialect.name == 'sqlite':
+        rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled), params)
+        return [row[-1] for row in rows]
+    rows = connection.exec_driver_sql('EXPLAIN ' + str(compiled), params)
+    return [row[0] for row in rows]
+
+
+def plan_problems(dialect_name, plan, seek=False):
+    problems = []
+    if seek and dialect_name == 'sqlite' and not any(line.strip().startswith('SEARCH') for line in plan):
+        problems.append('индекс читается с начала, а не с позиции курсора')
+    elif seek and dialect_name != 'sqlite' and not any('Index Cond' in line for line in plan):
+        problems.append('индекс читается с начала, а не с позиции курсора')
+    for line in plan:
+        if dialect_name == 'sqlite':
+            match = _SQLITE_TABLE_SCAN.match(line.strip())
+            if match:
+                problems.append('полный просмотр таблицы %s' % match.group(1))
+            elif 'USE TEMP B-TREE FOR ORDER BY' in line:
+                problems.append('сортировка без индекса')
+        else:
+            match = re.search(r'Seq Scan on (\w+)', line)
+            if match:
+                problems.append('полный просмотр таблицы %s' % match.group(1))
+            elif line.strip().lstrip('-> ').startswith('Sort'):
+                problems.append('сортировка без индекса')
+    return problems
+
+
+def check_hot_queries(connection):
+    """Возвращает [(название, план, замечания)] для всех HOT_QUERIES."""
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text('SET LOCAL enable_seqscan = off'))
+    results = []
+    for name, build in HOT_QUERIES.items():
+        plan = explain(connection, build())
+        results.append((name, plan, plan_problems(connection.dialect.name, plan, name in SEEK_QUERIES)))
+    return results
+
+
+@click.command('check-indexes')
+@click.option('--verbose', '-v', is_flag=True, help='Печатать планы всех запросов.')
+@with_appcontext
+def check_indexes_command(verbose):
+    """Проверить по EXPLAIN, что частые запросы маршрутов используют индексы."""
+    with db.engine.begin() as connection:
+        results = check_hot_queries(connection)
+    failed = 0
+    for name, plan, problems in results:
+        click.echo('%-4s %s' % ('OK' if not problems else 'FAIL', name))
+        if problems:
+            failed += 1
+            for problem in problems:
+                click.echo('       ! ' + problem)
+        if problems or verbose:
+            for line in plan:
+                click.echo('       ' + line)
+    click.echo('Запросов: %d, без индекса: %d' % (len(results), failed))
+    if failed:
+        raise SystemExit(1)
@@ -0,0 +1,93 @@
+"""
+Именованные профили «жадной» загрузки связей и контроль числа SQL-запросов.
+
+Все связи в models.py объявлены с lazy=True, поэтому обращение
+к m.author или c.sender в цикле шаблона даёт отдельный SELECT на строку.
+Маршрут подключает к своему запросу нужный профиль через with_profile(),
+и страница рендерится за постоянное число запросов.
+"""
+import logging
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import joinedload, selectinload
+
+from models import Manuscript, Review, Publication, Message
+
+log = logging.getLogger(__name__)
+
+
+# Профили задаются функциями: backref-атрибуты (Manuscript.author и т.п.)
+# появляются у моделей только после конфигурации мапперов.
+LOADER_PROFILES = {
+    # списки рукописей с колонкой «Автор»
+    'manuscript_with_author': lambda: (
+        joinedload(Manuscript.author),
+    ),
+    # «Мои рукописи»: ссылка на выпуск
+    'manuscript_with_publication': lambda: (
+        joinedload(Manuscript.publication),
+    ),
+    # ЛК рецензента: название рукописи в списке рецензий
+    'review_with_manuscript': lambda: (
+        joinedload(Review.manuscript),
+    ),
+    # рецензии по рукописи: ФИО рецензента
+    'review_with_reviewer': lambda: (
+        joinedload(Review.reviewer),
+    ),
+    # обращения: ФИО и email отправителя
+    'message_with_sender': lambda: (
+        joinedload(Message.sender),
+    ),
+    # список выпусков с опубликованными в них рукописями и авторами
+    'publication_with_manuscripts': lambda: (
+        selectinload(Publication.manuscripts).joinedload(Manuscript.author),
+    ),
+}
+
+
+def with_profile(query, *names):
+    """Подключает к запросу опции загрузки из одного или нескольких профилей."""
+    options = []
+    for name in names:
+        options.extend(LOADER_PROFILES[name]())
+    return query.options(*options)
+
+
+# --- Бюджет SQL-запросов на один HTTP-запрос ---
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'query_count' in g:
+        g.query_count += 1
+
+
+def init_query_budget(app):
+    """
+    Считает SQL-запросы в каждом HTTP-запросе. Если задан QUERY_BUDGET и
+    приложение работает в режиме отладки или тестирования, превышение
+    бюджета прерывает запрос AssertionError; в остальных случаях
+    превышение только пишется в лог.
+    """
+    budget = app.config.get('QUERY_BUDGET')
+    if not budget:
+        return
+
+    if not event.contains(Engine, 'before_cursor_execute', _count_query):
+        event.listen(Engine, 'before_cursor_execute', _count_query)
+
+    @app.before_request
+    def _start_query_count():
+        g.query_count = 0
+
+    @app.after_request
+    def _check_query_count(response):
+        count = g.get('query_count', 0)
+        if count > budget:
+            message = 'Запрос %s выполнил %d SQL-запросов при бюджете %d' % (
+                request.endpoint, count, budget)
+            if current_app.debug or current_app.testing:
+                raise AssertionError(message)
+            log.warning(message)
+        return response
@@ -0,0 +1,125 @@
+"""
+Ограничение частоты попыток входа и регистрации («корзина токенов»).
+
+У каждого ключа (IP-адрес, email) своя корзина ёмкостью burst токенов,
+которая пополняется со скоростью per_minute токенов в минуту; каждая
+попытка забирает токен, пустая корзина — отказ (429 с Retry-After).
+Проверка выполняется до запроса к БД и до хэширования пароля, поэтому
+отклонённая попытка почти ничего не стоит, а пользователи с других
+адресов и с другими email продолжают входить как обычно.
+
+Хранилища (RATE_LIMIT_STORAGE):
+  'memory' — словарь в памяти процесса (у каждого процесса сервера
+             свои корзины; предел фактически умножается на их число);
+  'sqlite' — общий файл SQLite RATE_LIMIT_DB на машине, корзины видят
+             все процессы сервера;
+  ''       — ограничение выключено.
+Лимиты по видам ключей — RATE_LIMITS в config.py.
+
+Ключ по IP — request.remote_addr. За nginx это адрес самого прокси,
+поэтому там нужно задать TRUSTED_PROXIES (число прокси перед сайтом):
+адрес клиента тогда берётся из X-Forwarded-For, причём только из тех
+позиций, которые дописали доверенные прокси, — подставленный клиентом
+заголовок корзину не меняет.
+"""
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from flask import current_app
+
+
+class MemoryBuckets:
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = {}  # ключ -> (токены, время обновления, когда корзина снова полна)
+        self._lock = threading.Lock()
+
+    def take(self, key, burst, per_second, now=None):
+        """Забирает токен; возвращает 0, если можно, иначе сколько секунд ждать."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, updated, _ = self._buckets.get(key, (burst, now, now))
+            tokens, wait = _take(tokens, updated, now, burst, per_second)
+            full_at = now + (burst - tokens) / per_second if per_second else float('inf')
+            self._buckets[key] = (tokens, now, full_at)
+            if len(self._buckets) > self.max_keys:
+                # полные корзины ничего не ограничивают — их можно забыть
+                for stale in [k for k, item in self._buckets.items() if item[2] <= now]:
+                    del self._buckets[stale]
+        return wait
+
+
+class SQLiteBuckets:
+    """Корзины в файле SQLite: BEGIN IMMEDIATE делает «прочитать-изменить-записать» атомарным между процессами."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        connection = self._connection()
+        connection.execute('CREATE TABLE IF NOT EXISTS rate_buckets '
+                           '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)')
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('PRAGMA synchronous = NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def take(self, key, burst, per_second, now=None):
+        now = time.time() if now is None else now  # общее для процессов время
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute('SELECT tokens, updated FROM rate_buckets WHERE key = ?', (key,)).fetchone()
+            tokens, updated = row if row else (burst, now)
+            tokens, wait = _take(tokens, updated, now, burst, per_second)
+            connection.execute('INSERT OR REPLACE INTO rate_buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                               (key, tokens, now))
+            if not row and random.random() < 0.001:
+                # изредка удаляются давно не тронутые (уже полные) корзины
+                connection.execute('DELETE FROM rate_buckets WHERE updated < ?', (now - 86400,))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return wait
+
+
+def _take(tokens, updated, now, burst, per_second):
+    tokens = min(burst, tokens + max(0.0, now - updated) * per_second)
+    if tokens >= 1:
+        return tokens - 1, 0
+    return tokens, (1 - tokens) / per_second if per_second else 60.0
+
+
+_state = {'storage': None}
+
+
+def check(kind, value):
+    """
+    Попытка вида kind ('login_ip', 'login_email', ...) для значения ключа.
+    Возвращает 0, если попытка разрешена, иначе — через сколько секунд повторить.
+    """
+    storage = _state['storage']
+    limit = current_app.config.get('RATE_LIMITS', {}).get(kind)
+    if storage is None or not limit or not value:
+        return 0
+    burst, per_minute = limit
+    return storage.take('%s:%s' % (kind, value), burst, per_minute / 60.0)
+
+
+def init_rate_limits(app):
+    backend = app.config.get('RATE_LIMIT_STORAGE')
+    if backend == 'sqlite':
+        _state['storage'] = SQLiteBuckets(app.config['RATE_LIMIT_DB'])
+    elif backend == 'memory':
+        _state['storage'] = MemoryBuckets()
+    else:
+        _state['storage'] = None
@@ -1,16 +1,34 @@
 from flask import (
     Blueprint, render_template, redirect, url_for,
-    request, flash, session, send_from_directory,
-    abort, current_app, make_response
+    request, flash, session, g,
+    abort, current_app, make_response, Response, stream_with_context, jsonify, send_from_directory
 )
-from werkzeug.security import check_password_hash
-from werkzeug.utils import secure_filename
+from werkzeug.security import safe_join
+import math
 import os
+import time
+from collections import namedtuple
 from datetime import datetime
-import csv
-import io
 
-from models import db, User, Manuscript, Review, Publication, News, Message, ManuscriptHistory
+from models import db, User, Manuscript, Review, Publication, News, Message, StoredFile, Job, JournalSection, Keyword
+from pagination import PAGE_PARAMS, keyset_paginate
+from query_profiles import with_profile
+from stats import collect_stats
+from exports import parse_report_filters, manuscript_report_batches, stream_csv, stream_xlsx
+from page_cache import page_cache
+from pagination import get_per_page
+import search as fulltext
+import jobs
+from jobs import enqueue
+from history import record_history
+from notifications import notify
+import bulk
+import profiler
+import ratelimit
+from passwords import HashingBusy, hash_password, verify_password
+from assignment import assign_reviewers
+from storage import store_upload, stored_file_path
+from media import can_download, send_media
 
 
 
@@ -20,10 +38,54 @@ routes = Blueprint('routes', __name__)
 # --- Вспомогательные функции ---
 
 def current_user():
+    # пользователь загружается один раз за запрос и хранится в flask.g
+    if 'current_user' not in g:
+        uid = session.get('user_id')
+        g.current_user = db.session.get(User, uid) if uid else None
+        if g.current_user is not None:
+            _refresh_session_identity(g.current_user)
+    return g.current_user
+
+
+# Лёгкая «личность» для публичных страниц: то, что нужно шапке сайта (base.html)
+SessionUser = namedtuple('SessionUser', ['id', 'full_name', 'role', 'is_blocked'])
+
+def _refresh_session_identity(user):
+    ttl = current_app.config.get('SESSION_USER_CACHE_TTL')
+    if not ttl:
+        return
+    cached = session.get('user_cache')
+    if (cached and cached.get('id') == user.id and cached.get('role') == user.role
+            and cached.get('is_blocked') == bool(user.is_blocked)
+            and time.time() - cached.get('ts', 0) < ttl):
+        return
+    session['user_cache'] = {
+        'id': user.id,
+        'full_name': user.full_name,
+        'role': user.role,
+        'is_blocked': bool(user.is_blocked),
+        'ts': time.time(),
+    }
+
+def current_identity():
+    """
+    Для публичных страниц: при включённом SESSION_USER_CACHE_TTL роль и статус
+    блокировки берутся из подписанной сессии, пока запись не устарела,
+    и таблица users не читается. Иначе — обычный current_user().
+    """
     uid = session.get('user_id')
-    if uid:
-        return User.query.get(uid)
-    return None
+    if not uid:
+        return None
+    ttl = current_app.config.get('SESSION_USER_CACHE_TTL')
+    cached = session.get('user_cache')
+    if ttl and cached and cached.get('id') == uid and time.time() - cached.get('ts', 0) < ttl:
+        return SessionUser(uid, cached['full_name'], cached['role'], cached['is_blocked'])
+    return current_user()
+
+def login_state():
+    # часть ключа кэша страниц: шапка сайта зависит только от роли
+    identity = current_identity()
+    return identity.role if identity else 'anon'
 
 def login_required(role=None):
     def wrapper(f):
@@ -31,6 +93,12 @@ def login_required(role=None):
         @wraps(f)
         def decorated_function(*args, **kwargs):
             user = current_user()
+            if request.blueprint == 'api':
+                # JSON API (api.py): код ошибки вместо перенаправления
+                if not user:
+                    return jsonify(error='Требуется вход.'), 401
+                if role and user.role != role:
+                    return jsonify(error='Недостаточно прав.'), 403
             if not user:
                 flash("Для доступа требуется вход.", "warning")
                 return redirect(url_for('routes.login'))
@@ -41,9 +109,23 @@ def login_required(role=None):
         return decorated_function
     return wrapper
 
+def keywords_from_text(text, limit=10):
+    # «слово, слово» -> объекты Keyword; новые слова добавляются в справочник
+    values = []
+    for value in (text or '').split(','):
+        value = ' '.join(value.split()).lower()[:64]
+        if value and value not in values:
+            values.append(value)
+    values = values[:limit]
+    if not values:
+        return []
+    found = {k.value: k for k in Keyword.query.filter(Keyword.value.in_(values))}
+    return [found.get(value) or Keyword(value=value) for value in values]
+
 # --- Главная страница, О проекте, новости, публикации (публичная часть) ---
 
 @routes.route('/')
+@page_cache.cached('news', 'publications', state=login_state)
 def index():
     news = News.query.order_by(News.published_at.desc()).all()
     publications = Publication.query.order_by(Publication.pub_date.desc()).all()
@@ -51,15 +133,16 @@ def index():
         'index.html',
         news=news,
         publications=publications,
-        user=current_user(),
+        user=current_identity(),
         breadcrumbs=[("Главная", None)]
     )
 
 @routes.route('/about')
+@page_cache.cached(state=login_state)
 def about():
     return render_template(
         'about.html',
-        user=current_user(),
+        user=current_identity(),
         breadcrumbs=[
             ("Главная", url_for('routes.index')),
             ("О проекте", None)
@@ -67,12 +150,14 @@ def about():
     )
 
 @routes.route('/news')
+@page_cache.cached('news', state=login_state, params=PAGE_PARAMS)
 def news():
-    all_news = News.query.order_by(News.published_at.desc()).all()
+    page = keyset_paginate(News.query, News.published_at, News.id)
     return render_template(
         'news/news.html',
-        news=all_news,
-        user=current_user(),
+        news=page,
+        page=page,
+        user=current_identity(),
         breadcrumbs=[
             ("Главная", url_for('routes.index')),
             ("Новости", None)
@@ -80,12 +165,13 @@ def news():
     )
 
 @routes.route('/news/<int:news_id>')
+@page_cache.cached('news', state=login_state)
 def news_detail(news_id):
     item = News.query.get_or_404(news_id)
     return render_template(
         'news/news_detail.html',
         item=item,
-        user=current_user(),
+        user=current_identity(),
         breadcrumbs=[
             ("Главная", url_for('routes.index')),
             ("Новости", url_for('routes.news')),
@@ -94,12 +180,17 @@ def news_detail(news_id):
     )
 
 @routes.route('/publications')
+@page_cache.cached('publications', state=login_state, params=PAGE_PARAMS)
 def publications():
-    pubs = Publication.query.order_by(Publication.pub_date.desc()).all()
+    page = keyset_paginate(
+        with_profile(Publication.query, 'publication_with_manuscripts'),
+        Publication.pub_date, Publication.id
+    )
     return render_template(
         'publications/publication_list.html',
-        publications=pubs,
-        user=current_user(),
+        publications=page,
+        page=page,
+        user=current_identity(),
         breadcrumbs=[
             ("Главная", url_for('routes.index')),
             ("Публикации", None)
@@ -107,9 +198,10 @@ def publications():
     )
 
 @routes.route('/publications/<int:pub_id>')
+@page_cache.cached('publications', state=login_state)
 def publication_detail(pub_id):
     pub = Publication.query.get_or_404(pub_id)
-    manuscripts = Manuscript.query.filter_by(
+    manuscripts = with_profile(Manuscript.query, 'manuscript_with_author').filter_by(
         publication_id=pub.id,
         status="published"
     ).all()
@@ -117,7 +209,7 @@ def publication_detail(pub_id):
         'publications/publication_detail.html',
         publication=pub,
         manuscripts=manuscripts,
-        user=current_user(),
+        user=current_identity(),
         breadcrumbs=[
             ("Главная", url_for('routes.index')),
             ("Публикации", url_for('routes.publications')),
@@ -126,31 +218,81 @@ def publication_detail(pub_id):
     )
 
 
+# --- Поиск по рукописям, публикациям и новостям ---
+
+@routes.route('/search')
+def search():
+    user = current_user()
+    q = request.args.get('q', '').strip()
+    kinds = fulltext.KINDS_BY_ROLE.get(user.role if user else None, ())
+    kind = request.args.get('kind', '').strip()
+    if kind:
+        kinds = tuple(k for k in kinds if k == kind)
+    page = max(1, request.args.get('page', 1, type=int))
+    hits, has_next = fulltext.search(q, kinds, page=page, per_page=get_per_page()) if q else ([], False)
+    return render_template(
+        'search.html',
+        q=q,
+        kind=kind,
+        hits=hits,
+        page_number=page,
+        has_next=has_next,
+        search_available=fulltext.search_enabled(),
+        user=user,
+        breadcrumbs=[
+            ("Главная", url_for('routes.index')),
+            ("Поиск", None)
+        ]
+    )
+
+
 # --- Аутентификация ---
 
+def _retry_after(*checks):
+    # первая исчерпанная корзина (ratelimit.py): через сколько секунд можно повторить, иначе 0
+    for kind, value in checks:
+        wait = ratelimit.check(kind, value)
+        if wait:
+            return math.ceil(wait)
+    return 0
+
 @routes.route('/login', methods=['GET', 'POST'])
 def login():
+    retry_after = 0
     if request.method == 'POST':
         email = request.form.get('email')
         password = request.form.get('password')
-        user = User.query.filter_by(email=email).first()
-        if user and check_password_hash(user.password_hash, password):
-            session['user_id'] = user.id
-            flash('Вы успешно вошли.', 'success')
-            return redirect(url_for('routes.lk'))
-        flash('Неверные email или пароль.', 'danger')
-    return render_template(
+        # лимит проверяется до запроса к БД и хэширования пароля
+        retry_after = _retry_after(('login_ip', request.remote_addr),
+                                   ('login_email', (email or '').strip().lower()))
+        if retry_after:
+            flash('Слишком много попыток входа. Повторите через %d с.' % retry_after, 'danger')
+        else:
+            user = User.query.filter_by(email=email).first()
+            if user and verify_password(user, password):
+                if db.session.is_modified(user):
+                    db.session.commit()  # хэш пересчитан под текущие параметры
+                session['user_id'] = user.id
+                _refresh_session_identity(user)
+                flash('Вы успешно вошли.', 'success')
+                return redirect(url_for('routes.lk'))
+            flash('Неверные email или пароль.', 'danger')
+    response = make_response(render_template(
         'auth/login.html',
         user=current_user(),
         breadcrumbs=[
             ("Главная", url_for('routes.index')),
             ("Вход", None)
         ]
-    )
+    ), 429 if retry_after else 200)
+    if retry_after:
+        response.headers['Retry-After'] = str(retry_after)
+    return response
 
 @routes.route('/logout')
 def logout():
     session.pop('user_id', None)
+    session.pop('user_cache', None)
     flash('Выход выполнен.', 'info')
     return redirect(url_for('routes.index'))
 
@@ -161,11 +303,16 @@ def register():
         email = request.form.get('email')
         password = request.form.get('password')
         role = 'author'
+        retry_after = _retry_after(('register_ip', request.remote_addr))
+        if retry_after:
+            flash('Слишком много регистраций с вашего адреса. Повторите через %d с.' % retry_after, 'danger')
+            response = redirect(url_for('routes.register'))
+            response.headers['Retry-After'] = str(retry_after)
+            return response
         if User.query.filter_by(email=email).first():
             flash('Такой email уже зарегистрирован.', 'danger')
             return redirect(url_for('routes.register'))
-        from werkzeug.security import generate_password_hash
-        user = User(full_name=full_name, email=email, password_hash=generate_password_hash(password), role=role)
+        user = User(full_name=full_name, email=email, password_hash=hash_password(password), role=role)
         db.session.add(user)
         db.session.commit()
         flash('Регистрация успешна. Войдите.', 'success')
@@ -190,21 +337,20 @@ def lk():
     author_manuscripts = []
     reviewer_reviews = []
     staff_manuscripts = []
-    admin_stats = {}
+    admin_stats = None
 
     if user.role == 'author':
         author_manuscripts = Manuscript.query.filter_by(author_id=user.id).order_by(Manuscript.created_at.desc()).all()
     elif user.role == 'reviewer':
-        reviewer_reviews = Review.query.filter_by(reviewer_id=user.id).order_by(Review.created_at.desc()).all()
+        reviewer_reviews = with_profile(Review.query, 'review_with_manuscript').filter_by(
+            reviewer_id=user.id
+        ).order_by(Review.created_at.desc()).all()
     elif user.role == 'staff':
-        staff_manuscripts = Manuscript.query.order_by(Manuscript.created_at.desc()).limit(20).all()
+        staff_manuscripts = with_profile(Manuscript.query, 'manuscript_with_author').order_by(
+            Manuscript.created_at.desc()
+        ).limit(20).all()
     elif user.role == 'admin':
-        admin_stats = {
-            'users_total': User.query.count(),
-            'manuscripts_total': Manuscript.query.count(),
-            'publications_total': Publication.query.count(),
-            'news_total': News.query.count(),
-        }
+        admin_stats = collect_stats()
 
     return render_template(
         'auth/profile.html',  # здесь будет универсальный ЛК
@@ -237,24 +383,34 @@ def submit_manuscript():
         if not title or not file:
             flash('Укажите название и приложите файл.', 'danger')
             return redirect(request.url)
-        filename = secure_filename(file.filename)
-        save_path = os.path.join('media', 'manuscripts', filename)
-        os.makedirs(os.path.dirname(save_path), exist_ok=True)
-        file.save(save_path)
+        # файл пишется потоком в хранилище по содержимому (одинаковые файлы — один экземпляр)
+        stored = store_upload(file)
+        section_id = request.form.get('section_id', type=int)
         manuscript = Manuscript(
             title=title,
             description=description,
-            file_path=save_path,
+            file_path='media/' + stored.path,
+            stored_file=stored,
+            file_size=stored.size,
+            file_name=file.filename,
             status='submitted',
-            author_id=current_user().id
+            author_id=current_user().id,
+            section=db.session.get(JournalSection, section_id) if section_id else None,
+            keywords=keywords_from_text(request.form.get('keywords')),
         )
         db.session.add(manuscript)
+        db.session.flush()  # id рукописи нужен истории и фоновым задачам
+        record_history([manuscript.id], 'submitted', current_user(), 'Автор отправил рукопись в редакцию.')
+        # текст файла для поиска извлекается фоновой задачей, ответ ждёт только commit
+        enqueue('extract_text', manuscript_id=manuscript.id)
+        notify('manuscript_submitted', manuscript_id=manuscript.id)
         db.session.commit()
         flash('Рукопись отправлена на рассмотрение!', 'success')
         return redirect(url_for('routes.manuscript_status'))
     return render_template(
         'manuscripts/submit_manuscript.html',
         user=current_user(),
+        sections=JournalSection.query.order_by(JournalSection.title).all(),
         breadcrumbs=[
             ("Главная", url_for('routes.index')),
             ("Личный кабинет", url_for('routes.lk')),
@@ -266,7 +422,9 @@ def submit_manuscript():
 @login_required('author')
 def manuscript_status():
     user = current_user()
-    manuscripts = Manuscript.query.filter_by(author_id=user.id).order_by(Manuscript.created_at.desc()).all()
+    manuscripts = with_profile(Manuscript.query, 'manuscript_with_publication').filter_by(
+        author_id=user.id
+    ).order_by(Manuscript.created_at.desc()).all()
     return render_template(
         'manuscripts/manuscript_status.html',
         manuscripts=manuscripts,
@@ -285,17 +443,25 @@ def manuscript_status():
 def manuscript_list():
     user = current_user()
     if user.role == 'staff':
-        manuscripts = Manuscript.query.order_by(Manuscript.created_at.desc()).all()
+        query = Manuscript.query
         crumbs_title = "Все рукописи"
     elif user.role == 'reviewer':
-        manuscripts = [r.manuscript for r in Review.query.filter_by(reviewer_id=user.id).all()]
+        query = Manuscript.query.join(Review).filter(Review.reviewer_id == user.id)
         crumbs_title = "Рецензирование"
     else:
         abort(403)
+    page = keyset_paginate(
+        with_profile(query, 'manuscript_with_author'),
+        Manuscript.created_at, Manuscript.id
+    )
     return render_template(
         'manuscripts/manuscript_list.html',
-        manuscripts=manuscripts,
+        manuscripts=page,
+        page=page,
         user=user,
+        publications=Publication.query.order_by(Publication.pub_date.desc().nullslast()).all()
+        if user.role == 'staff' else [],
+        bulk_statuses=bulk.STATUSES,
         breadcrumbs=[
             ("Главная", url_for('routes.index')),
             ("Личный кабинет", url_for('routes.lk')),
@@ -326,14 +492,8 @@ def publish_manuscript(manuscript_id):
                 manuscript.publication_id = last_publication.id
 
         # 3. пишем запись в историю
-        history = ManuscriptHistory(
-            manuscript_id=manuscript.id,
-            actor_id=user.id,
-            actor_role=user.role,
-            action='published',
-            comment='Рукопись допущена к публикации редактором.'
-        )
-        db.session.add(history)
+        record_history([manuscript.id], 'published', user, 'Рукопись допущена к публикации редактором.')
+        notify('manuscript_published', manuscript_id=manuscript.id)
         db.session.commit()
 
         flash('Рукопись опубликована и привязана к выпуску.', 'success')
@@ -343,6 +503,80 @@ def publish_manuscript(manuscript_id):
     return redirect(url_for('routes.manuscript_list'))
 
 
+# --- Массовые операции над рукописями (редактор) ---
+
+def _bulk_params():
+    """Параметры из формы (ids — несколько полей) или из JSON {"ids": [...], ...}."""
+    if request.is_json:
+        data = request.get_json(silent=True) or {}
+        ids = data.get('ids') or []
+        if not isinstance(ids, list):
+            ids = [ids]
+        return ids, data
+    return request.form.getlist('ids'), request.form
+
+
+def _bulk_response(operation, *args):
+    wants_json = request.is_json or request.accept_mimetypes.best == 'application/json'
+    user = current_user()
+    values, data = _bulk_params()
+    try:
+        ids = bulk.parse_ids(values, current_app.config.get('BULK_MAX_ITEMS', 1000))
+        results = operation(ids, user, *(data.get(name) for name in args))
+        db.session.commit()
+    except bulk.BulkError as e:
+        db.session.rollback()
+        if wants_json:
+            return jsonify(error=str(e)), 400
+        flash(str(e), 'danger')
+        return redirect(url_for('routes.manuscript_list'))
+
+    updated = sum(1 for item in results if item.result == 'ok')
+    if wants_json:
+        return jsonify(updated=updated, results=[item._asdict() for item in results])
+    skipped = len(results) - updated
+    flash('Изменено рукописей: %d.' % updated + (' Пропущено: %d.' % skipped if skipped else ''),
+          'success' if updated else 'info')
+    return redirect(url_for('routes.manuscript_list'))
+
+
+@routes.route('/manuscripts/bulk/publish', methods=['POST'])
+@login_required('staff')
+def bulk_publish():
+    return _bulk_response(bulk.bulk_publish, 'publication_id')
+
+
+@routes.route('/manuscripts/bulk/assign', methods=['POST'])
+@login_required('staff')
+def bulk_assign():
+    return _bulk_response(bulk.bulk_assign, 'publication_id')
+
+
+@routes.route('/manuscripts/bulk/reviewers', methods=['POST'])
+@login_required('staff')
+def bulk_reviewers():
+    return _bulk_response(bulk.bulk_assign_reviewers)
+
+
+@routes.route('/manuscripts/assign-reviewers', methods=['POST'])
+@login_required('staff')
+def assign_all_reviewers():
+    tables, assignments, shortfall = assign_reviewers(current_user())
+    db.session.commit()
+    manuscripts = len({a.manuscript_id for a in assignments})
+    flash('Назначено рецензий: %d (рукописей: %d).' % (len(assignments), manuscripts),
+          'success' if assignments else 'info')
+    if shortfall:
+        flash('Не хватило свободных рецензентов для рукописей: %d.' % len(shortfall), 'warning')
+    return redirect(url_for('routes.manuscript_list'))
+
+
+@routes.route('/manuscripts/bulk/status', methods=['POST'])
+@login_required('staff')
+def bulk_status():
+    return _bulk_response(bulk.bulk_set_status, 'status', 'comment')
+
+
 # --- Добавление/просмотр рецензии (рецензент) ---
 
 @routes.route('/reviews/<int:manuscript_id>', methods=['GET', 'POST'])
@@ -367,6 +601,8 @@ def review_form(manuscript_id):
             review.text = text
             review.score = int(score)
             review.status = 'submitted'
+        record_history([manuscript.id], 'review_submitted', user, 'Рецензент отправил рецензию (оценка %s).' % score)
+        notify('review_submitted', manuscript_id=manuscript.id, reviewer_id=user.id)
         db.session.commit()
         flash('Рецензия сохранена.', 'success')
         return redirect(url_for('routes.manuscript_list'))
@@ -387,7 +623,7 @@ def review_form(manuscript_id):
 @login_required('staff')
 def review_list(manuscript_id):
     manuscript = Manuscript.query.get_or_404(manuscript_id)
-    reviews = Review.query.filter_by(manuscript_id=manuscript.id).all()
+    reviews = with_profile(Review.query, 'review_with_reviewer').filter_by(manuscript_id=manuscript.id).all()
     return render_template(
         'reviews/review_list.html',
         manuscript=manuscript,
@@ -411,12 +647,7 @@ from sqlalchemy import func
 @routes.route('/admin/dashboard')
 @login_required('admin')
 def admin_dashboard():
-    stats = {
-        'news_total': News.query.count(),
-        'publications_total': Publication.query.count(),
-        'users_total': User.query.count(),
-        'contacts_new': Message.query.filter_by(status='new').count() if hasattr(Message, 'status') else 0,
-    }
+    stats = collect_stats()
     contacts = Message.query.order_by(Message.sent_at.desc()).limit(5).all()
     news = News.query.order_by(News.published_at.desc()).limit(5).all()
     publications = Publication.query.order_by(Publication.pub_date.desc()).limit(5).all()
@@ -447,10 +678,11 @@ def admin_news():
                 db.session.commit()
                 flash('Новость удалена.', 'info')
             return redirect(url_for('routes.admin_news'))
-    news_list = News.query.order_by(News.published_at.desc()).all()
+    page = keyset_paginate(News.query, News.published_at, News.id)
     return render_template(
         'admin/news_list.html',
-        news_list=news_list,
+        news_list=page,
+        page=page,
         user=current_user(),
         breadcrumbs=[
             ("Главная", url_for('routes.index')),
@@ -507,10 +739,11 @@ def admin_publications():
                 db.session.commit()
                 flash('Публикация удалена.', 'info')
             return redirect(url_for('routes.admin_publications'))
-    publications = Publication.query.order_by(Publication.pub_date.desc()).all()
+    page = keyset_paginate(Publication.query, Publication.pub_date, Publication.id)
     return render_template(
         'admin/publications_list.html',
-        publications=publications,
+        publications=page,
+        page=page,
         user=current_user(),
         breadcrumbs=[
             ("Главная", url_for('routes.index')),
@@ -576,7 +809,9 @@ def admin_users():
     role = request.args.get('role', '').strip()
 
     users_query = User.query
-    if q:
+    if q and fulltext.search_enabled() and fulltext.build_match(q):
+        users_query = users_query.filter(User.id.in_(fulltext.matching_ids('user', q)))
+    elif q:
         users_query = users_query.filter(
             (User.full_name.ilike(f'%{q}%')) |
             (User.email.ilike(f'%{q}%'))
@@ -584,11 +819,12 @@ def admin_users():
     if role:
         users_query = users_query.filter_by(role=role)
 
-    users = users_query.order_by(User.registered_at.desc()).all()
+    page = keyset_paginate(users_query, User.registered_at, User.id)
 
     return render_template(
         'admin/users_list.html',
-        users=users,
+        users=page,
+        page=page,
         user=current_user(),
         breadcrumbs=[
             ("Главная", url_for('routes.index')),
@@ -619,6 +855,14 @@ def admin_user_edit(user_id):
             else:
                 flash('Некорректное значение роли.', 'error')
 
+        # специализация рецензента (для назначения рецензентов)
+        elif action == 'specialization':
+            section_ids = [int(v) for v in request.form.getlist('section_ids') if v.isdigit()]
+            user.sections = JournalSection.query.filter(JournalSection.id.in_(section_ids)).all() if section_ids else []
+            user.keywords = keywords_from_text(request.form.get('keywords'), limit=50)
+            db.session.commit()
+            flash('Специализация рецензента сохранена.', 'success')
+
         # блокировка / разблокировка
         elif action == 'block':
             user.is_blocked = True
@@ -665,6 +909,7 @@ def admin_user_edit(user_id):
         'admin/user_edit.html',
         user=user,
         user_viewer=viewer,
+        sections=JournalSection.query.order_by(JournalSection.title).all() if user.role == 'reviewer' else [],
         breadcrumbs=[
             ("Главная", url_for('routes.index')),
             ("Личный кабинет", url_for('routes.lk')),
@@ -712,11 +957,10 @@ def admin_user_create():
                 ]
             )
 
-        from werkzeug.security import generate_password_hash
         new_user = User(
             full_name=full_name,
             email=email,
-            password_hash=generate_password_hash(password),
+            password_hash=hash_password(password),
             role=role
         )
         db.session.add(new_user)
@@ -750,10 +994,14 @@ def admin_contacts():
             db.session.commit()
             flash('Обращение отмечено как обработанное.', 'success')
         return redirect(url_for('routes.admin_contacts'))
-    contacts = Message.query.order_by(Message.sent_at.desc()).all()
+    page = keyset_paginate(
+        with_profile(Message.query, 'message_with_sender'),
+        Message.sent_at, Message.id
+    )
     return render_template(
         'admin/contacts_list.html',
-        contacts=contacts,
+        contacts=page,
+        page=page,
         user=current_user(),
         breadcrumbs=[
             ("Главная", url_for('routes.index')),
@@ -763,24 +1011,102 @@ def admin_contacts():
         ]
     )
 
+# --- Фоновые задачи ---
+@routes.route('/admin/jobs', methods=['GET', 'POST'])
+@login_required('admin')
+def admin_jobs():
+    if request.method == 'POST':
+        job = db.session.get(Job, request.form.get('job_id', type=int))
+        if job and job.status == 'failed' and request.form.get('action') == 'retry':
+            jobs.retry(job)
+            db.session.commit()
+            flash('Задача снова поставлена в очередь.', 'success')
+        return redirect(url_for('routes.admin_jobs', status=request.args.get('status')))
+    status = request.args.get('status')
+    query = Job.query
+    if status in jobs.STATUSES:
+        query = query.filter_by(status=status)
+    page = keyset_paginate(query, Job.created_at, Job.id)
+    return render_template(
+        'admin/jobs.html',
+        jobs=page,
+        page=page,
+        summary=jobs.queue_summary(),
+        statuses=jobs.STATUSES,
+        status=status,
+        workers=current_app.config.get('JOB_WORKERS', 0),
+        user=current_user(),
+        breadcrumbs=[
+            ("Главная", url_for('routes.index')),
+            ("Личный кабинет", url_for('routes.lk')),
+            ("Админ-панель", url_for('routes.admin_dashboard')),
+            ("Фоновые задачи", None)
+        ]
+    )
+
+# --- Профилировщик ---
+@routes.route('/admin/profiler', methods=['GET', 'POST'])
+@login_required('admin')
+def admin_profiler():
+    if request.method == 'POST':
+        action = request.form.get('action')
+        if action == 'start':
+            seconds = request.form.get('seconds', type=int)
+            count = request.form.get('requests', type=int)
+            if request.form.get('mode') == 'requests' and not count:
+                flash('Укажите число запросов.', 'danger')
+            else:
+                started = profiler.start(
+                    seconds=seconds if request.form.get('mode') == 'seconds' else None,
+                    requests=count if request.form.get('mode') == 'requests' else None,
+                    pattern=request.form.get('pattern', '').strip(),
+                    started_by=current_user().email,
+                )
+                if started:
+                    flash('Профилирование запущено (сеанс %s).' % started.id, 'success')
+                else:
+                    flash('Уже идёт другой сеанс профилирования.', 'danger')
+        elif action == 'stop' and profiler.stop():
+            flash('Профилирование остановлено, результаты сохранены.', 'success')
+        return redirect(url_for('routes.admin_profiler'))
+    directory = current_app.config['PROFILER_DIR']
+    sessions = profiler.saved_sessions(directory)
+    selected = request.args.get('session') or (sessions[0][0]['id'] if sessions else None)
+    summary = None
+    if selected and profiler.SAFE_NAME.match(selected + '.txt'):
+        path = os.path.join(directory, selected + '.txt')
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                summary = f.read()
+    active = profiler.current_session()
+    return render_template(
+        'admin/profiler.html',
+        active=active.describe() if active else None,
+        sessions=sessions,
+        selected=selected,
+        summary=summary,
+        limits=current_app.config,
+        user=current_user(),
+        breadcrumbs=[
+            ("Главная", url_for('routes.index')),
+            ("Личный кабинет", url_for('routes.lk')),
+            ("Админ-панель", url_for('routes.admin_dashboard')),
+            ("Профилировщик", None)
+        ]
+    )
+
+@routes.route('/admin/profiler/files/<name>')
+@login_required('admin')
+def admin_profiler_file(name):
+    if not profiler.SAFE_NAME.match(name):
+        abort(404)
+    return send_from_directory(current_app.config['PROFILER_DIR'], name, as_attachment=True)
+
 # --- Отчёты и аналитика ---
 @routes.route('/admin/reports')
 @login_required('admin')
 def admin_reports():
-    stats = {
-        'users_total': User.query.count(),
-        'users_authors': User.query.filter_by(role='author').count(),
-        'users_staff': User.query.filter_by(role='staff').count(),
-        'users_reviewers': User.query.filter_by(role='reviewer').count(),
-        'users_admins': User.query.filter_by(role='admin').count(),
-        'publications_total': Publication.query.count(),
-        'manuscripts_total': Manuscript.query.count(),
-        'published_manuscripts': Manuscript.query.filter_by(status='published').count(),
-        'in_review': Manuscript.query.filter_by(status='under_review').count(),
-        'contacts_total': Message.query.count(),
-        'contacts_new': Message.query.filter_by(status='new').count() if hasattr(Message, 'status') else 0,
-        'contacts_done': Message.query.filter_by(status='done').count() if hasattr(Message, 'status') else 0,
-    }
+    stats = collect_stats()
     return render_template(
         'admin/reports.html',
         stats=stats,
@@ -793,41 +1119,81 @@ def admin_reports():
         ]
     )
 
-# --- Выгрузка отчёта в CSV ---
+# --- Выгрузка отчёта в CSV / XLSX ---
+# Необязательные фильтры: ?date_from=ГГГГ-ММ-ДД&date_to=ГГГГ-ММ-ДД&status=published
 @routes.route('/admin/reports/export/csv')
 @login_required('admin')
 def admin_reports_export_csv():
-    # Пример: выгружаем сводный отчёт по рукописям
-    output = io.StringIO()
-    writer = csv.writer(output, delimiter=';')
-
-    writer.writerow([
-        "ID рукописи",
-        "Название",
-        "Автор",
-        "Статус",
-        "Дата создания"
-    ])
-
-    manuscripts = Manuscript.query.order_by(Manuscript.created_at.desc()).all()
-    for m in manuscripts:
-        author_name = m.author.full_name if hasattr(m, "author") and m.author else "—"
-        created = m.created_at.strftime('%Y-%m-%d %H:%M') if m.created_at else ""
-        writer.writerow([m.id, m.title, author_name, m.status, created])
-
-    csv_data = output.getvalue().encode('utf-8-sig')  # BOM для корректного открытия в Excel
-    response = make_response(csv_data)
+    batches = manuscript_report_batches(parse_report_filters(request.args))
+    response = Response(stream_with_context(stream_csv(batches)), mimetype='text/csv')
     response.headers["Content-Disposition"] = "attachment; filename=manuscripts_report.csv"
     response.headers["Content-Type"] = "text/csv; charset=utf-8"
     return response
 
+@routes.route('/admin/reports/export/xlsx')
+@login_required('admin')
+def admin_reports_export_xlsx():
+    batches = manuscript_report_batches(parse_report_filters(request.args))
+    response = Response(
+        stream_with_context(stream_xlsx(batches)),
+        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    )
+    response.headers["Content-Disposition"] = "attachment; filename=manuscripts_report.xlsx"
+    return response
+
 # --- Загрузка файлов (рукописи, рецензии) ---
 
+def _deny_download():
+    # гостю — вход (файл может быть доступен после него), остальным — 403
+    if current_user() is None:
+        flash("Для доступа требуется вход.", "warning")
+        return redirect(url_for('routes.login'))
+    abort(403)
+
+# Файлы опубликованных рукописей доступны и без входа (ссылки есть на страницах выпусков)
 @routes.route('/media/<path:filename>')
-@login_required()
 def media(filename):
-    dirpath = os.path.join(current_app.root_path, 'media')
-    return send_from_directory(directory=dirpath, filename=filename, as_attachment=True)
+    path = safe_join(current_app.config['UPLOAD_FOLDER'], filename)
+    if path is None:
+        abort(404)
+    if not can_download(current_user(), Manuscript.file_path == 'media/' + filename):
+        return _deny_download()
+    response = send_media(path, filename, os.path.basename(filename))
+    if response is None:
+        abort(404)
+    return response
+
+# Файлы из хранилища по содержимому: адрес не меняется, пока не изменится файл,
+# поэтому браузер может кэшировать его надолго (Range и 304 — см. media.send_media)
+@routes.route('/media/sha256/<sha256>')
+def media_file(sha256):
+    stored = db.session.get(StoredFile, sha256)
+    if stored is None:
+        abort(404)
+    if not can_download(current_user(), Manuscript.file_sha256 == sha256):
+        return _deny_download()
+    # имя для сохранения у пользователя; кириллица допустима, отбрасываем только путь
+    name = os.path.basename(request.args.get('name', '').replace('\\', '/')).strip() or os.path.basename(stored.path)
+    response = send_media(
+        stored_file_path(stored),
+        stored.path,
+        name,
+        etag=sha256,
+        max_age=365 * 24 * 3600
+    )
+    if response is None:
+        abort(404)
+    response.cache_control.private = True
+    response.cache_control.public = False
+    response.cache_control.immutable = True
+    return response
+
+@routes.app_template_global()
+def manuscript_file_url(manuscript):
+    if manuscript.file_sha256:
+        return url_for('routes.media_file', sha256=manuscript.file_sha256, name=manuscript.file_name)
+    path = manuscript.file_path
+    return url_for('routes.media', filename=path[6:] if path.startswith('media/') else path)
 
 # --- Контакты, обратная связь (для пользователей) ---
 
@@ -848,6 +1214,8 @@ def contact():
                 status='new'
             )
             db.session.add(msg)
+            db.session.flush()
+            notify('message_received', message_id=msg.id)
             db.session.commit()
             flash('Сообщение отправлено.', 'success')
         else:
@@ -862,10 +1230,11 @@ def contact():
     )
 
 @routes.route('/author-rules')
+@page_cache.cached(state=login_state)
 def author_rules():
     return render_template(
         'author_rules.html',
-        user=current_user(),
+        user=current_identity(),
         breadcrumbs=[
             ("Главная", url_for('routes.index')),
             ("Требования к авторам", None)
@@ -874,11 +1243,33 @@ def author_rules():
 
 # --- Обработка 404 ---
 
+@routes.app_errorhandler(HashingBusy)
+def hashing_busy(e):
+    # пул хэширования паролей перегружен (passwords.py) — отказ сразу, без ожидания
+    retry_after = 5
+    if request.path.startswith('/api/'):
+        response = jsonify(error='Сервер перегружен, повторите попытку позже.')
+    else:
+        response = make_response(render_template(
+            '503.html',
+            user=current_identity(),
+            retry_after=retry_after,
+            breadcrumbs=[
+                ("Главная", url_for('routes.index')),
+                ("Сервер перегружен", None)
+            ]
+        ))
+    response.status_code = 503
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
 @routes.app_errorhandler(404)
 def page_not_found(e):
+    if request.path.startswith('/api/'):
+        return jsonify(error='Не найдено.'), 404
     return render_template(
         '404.html',
-        user=current_user(),
+        user=current_identity(),
         breadcrumbs=[
             ("Главная", url_for('routes.index')),
             ("Страница не найдена", None)
@@ -0,0 +1,216 @@
+"""
+Полнотекстовый поиск по рукописям (включая текст загруженных файлов),
+публикациям, новостям и пользователям на основе SQLite FTS5.
+
+Все документы лежат в одной виртуальной таблице search_index; rowid
+кодирует вид документа и id исходной строки (ref_id * 8 + код вида),
+поэтому обновление и удаление документа — операции по rowid.
+Индекс поддерживается событиями SQLAlchemy и пересчитывается командой
+``flask --app app rebuild-search-index``. Если FTS5 недоступен
+(другая СУБД или сборка SQLite без FTS5), поиск выключается, а
+admin_users продолжает искать через LIKE.
+"""
+import logging
+
+import click
+from flask.cli import with_appcontext
+from markupsafe import Markup, escape
+from sqlalchemy import Integer, event, inspect, text
+from sqlalchemy.exc import OperationalError
+
+from models import db, User, Manuscript, ManuscriptText, Publication, News
+
+log = logging.getLogger(__name__)
+
+# вид документа -> (код в rowid, модель, функция (title, body))
+KINDS = {
+    'manuscript': (1, Manuscript, lambda m: (m.title, m.description)),
+    'publication': (2, Publication, lambda p: (p.title, p.description)),
+    'news': (3, News, lambda n: (n.title, n.content)),
+    'user': (4, User, lambda u: (u.full_name, u.email)),
+    'manuscript_file': (5, ManuscriptText, lambda t: (t.source_name, t.content)),
+}
+KIND_BY_CODE = {code: kind for kind, (code, _, _) in KINDS.items()}
+
+# какие виды документов видит каждая роль (None — аноним)
+KINDS_BY_ROLE = {
+    None: ('publication', 'news'),
+    'author': ('publication', 'news'),
+    'reviewer': ('publication', 'news'),
+    'staff': ('manuscript', 'manuscript_file', 'publication', 'news'),
+    'admin': ('manuscript', 'manuscript_file', 'publication', 'news', 'user'),
+}
+
+_MARK_OPEN, _MARK_CLOSE = '\x02', '\x03'
+
+_state = {'enabled': False}
+
+
+def search_enabled():
+    return _state['enabled']
+
+
+def _rowid(kind, ref_id):
+    return ref_id * 8 + KINDS[kind][0]
+
+
+def _ref(rowid):
+    return KIND_BY_CODE[rowid % 8], rowid // 8
+
+
+def index_document(connection, kind, ref_id, title, body):
+    rowid = _rowid(kind, ref_id)
+    connection.execute(text('DELETE FROM search_index WHERE rowid = :rowid'), {'rowid': rowid})
+    connection.execute(
+        text('INSERT INTO search_index (rowid, kind, title, body) VALUES (:rowid, :kind, :title, :body)'),
+        {'rowid': rowid, 'kind': kind, 'title': title or '', 'body': body or ''}
+    )
+
+
+def remove_document(connection, kind, ref_id):
+    connection.execute(text('DELETE FROM search_index WHERE rowid = :rowid'),
+                       {'rowid': _rowid(kind, ref_id)})
+
+
+def _ref_id(obj):
+    # id документа — первичный ключ строки (у manuscript_texts это manuscript_id)
+    return inspect(obj).mapper.primary_key_from_instance(obj)[0]
+
+
+def _register(kind, model, extract):
+    def after_save(mapper, connection, target):
+        if _state['enabled']:
+            index_document(connection, kind, _ref_id(target), *extract(target))
+
+    def after_delete(mapper, connection, target):
+        if _state['enabled']:
+            remove_document(connection, kind, _ref_id(target))
+
+    event.listen(model, 'after_insert', after_save)
+    event.listen(model, 'after_update', after_save)
+    event.listen(model, 'after_delete', after_delete)
+
+
+for _kind, (_code, _model, _extract) in KINDS.items():
+    _register(_kind, _model, _extract)
+
+
+# --- Построение индекса ---
+
+def _create_index(connection):
+    connection.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+        "kind UNINDEXED, title, body, tokenize = 'unicode61 remove_diacritics 2')"
+    ))
+
+
+def index_table(connection, kind, title, body, since_id=1):
+    """
+    Массовое добавление в индекс строк вида kind с id >= since_id одним
+    INSERT ... SELECT (для строк, вставленных через Core в обход событий,
+    см. seed в db_init.py); title и body — имена колонок таблицы.
+    """
+    _, model, _ = KINDS[kind]
+    connection.execute(text(
+        'INSERT OR REPLACE INTO search_index (rowid, kind, title, body) '
+        "SELECT id * 8 + :code, :kind, coalesce(%s, ''), coalesce(%s, '') FROM %s WHERE id >= :since"
+        % (title, body, model.__tablename__)
+    ), {'code': KINDS[kind][0], 'kind': kind, 'since': since_id})
+
+
+def rebuild_search_index():
+    connection = db.session.connection()
+    connection.execute(text('DELETE FROM search_index'))
+    count = 0
+    for kind, (_, model, extract) in KINDS.items():
+        for obj in model.query.yield_per(1000):
+            index_document(connection, kind, _ref_id(obj), *extract(obj))
+            count += 1
+    db.session.commit()
+    return count
+
+
+def init_search(app):
+    """Создаёт индекс, если его нет (и сразу заполняет), либо выключает поиск без FTS5."""
+    app.cli.add_command(rebuild_search_index_command)
+    with app.app_context():
+        if db.engine.dialect.name != 'sqlite':
+            _state['enabled'] = False
+            return
+        try:
+            with db.engine.begin() as connection:
+                exists = connection.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_index'"
+                )).first()
+                _create_index(connection)
+        except OperationalError:
+            log.warning('SQLite собран без FTS5 — полнотекстовый поиск выключен')
+            _state['enabled'] = False
+            return
+        _state['enabled'] = True
+        if not exists:
+            rebuild_search_index()
+
+
+# --- Поиск ---
+
+def build_match(query):
+    """Строка пользователя -> выражение FTS5: все слова, каждое как префикс."""
+    words = [w.replace('"', '') for w in query.split()]
+    return ' '.join('"%s"*' % w for w in words if w)
+
+
+def _marked(fragment):
+    return Markup(str(escape(fragment))
+                  .replace(_MARK_OPEN, '<mark>')
+                  .replace(_MARK_CLOSE, '</mark>'))
+
+
+class SearchHit:
+    def __init__(self, kind, ref_id, title, snippet):
+        self.kind = kind
+        self.ref_id = ref_id
+        self.title = _marked(title)
+        self.snippet = _marked(snippet)
+
+
+def search(query, kinds, page=1, per_page=20):
+    """
+    Возвращает (список SearchHit, есть_ли_следующая_страница), по убыванию
+    релевантности (bm25, заголовок весит больше текста).
+    """
+    match = build_match(query)
+    if not match or not kinds or not _state['enabled']:
+        return [], False
+    kind_params = {'k%d' % i: kind for i, kind in enumerate(kinds)}
+    rows = db.session.execute(text(
+        "SELECT rowid, "
+        "highlight(search_index, 1, :mo, :mc), "
+        "snippet(search_index, 2, :mo, :mc, '…', 24) "
+        "FROM search_index "
+        "WHERE search_index MATCH :match AND kind IN (%s) "
+        "ORDER BY bm25(search_index, 0.0, 4.0, 1.0) "
+        "LIMIT :limit OFFSET :offset" % ', '.join(':' + k for k in kind_params)
+    ), dict(kind_params, mo=_MARK_OPEN, mc=_MARK_CLOSE, match=match,
+            limit=per_page + 1, offset=(page - 1) * per_page)).all()
+    hits = [SearchHit(*_ref(rowid), title, snippet) for rowid, title, snippet in rows[:per_page]]
+    return hits, len(rows) > per_page
+
+
+def matching_ids(kind, query):
+    """Подзапрос id строк вида kind, подходящих под query (для фильтров в ORM-запросах)."""
+    code = KINDS[kind][0]
+    return text(
+        "SELECT rowid / 8 AS ref_id FROM search_index "
+        "WHERE search_index MATCH :match AND rowid %% 8 = %d" % code
+    ).bindparams(match=build_match(query)).columns(ref_id=Integer)
+
+
+@click.command('rebuild-search-index')
+@with_appcontext
+def rebuild_search_index_command():
+    """Пересобрать полнотекстовый индекс search_index."""
+    if not search_enabled():
+        click.echo('Полнотекстовый поиск недоступен (нужен SQLite с FTS5).')
+        return
+    click.echo('Проиндексировано документов: %d' % rebuild_search_index())
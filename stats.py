@@ -0,0 +1,212 @@
+"""
+Сводная статистика для админ-панели, отчётов и ЛК администратора.
+
+Счётчики хранятся в таблице stats_counters и обновляются событиями
+SQLAlchemy при вставке, изменении и удалении записей, поэтому чтение
+статистики — один запрос к маленькой таблице. Если счётчики разошлись
+с данными, их пересчитывает команда ``flask --app app rebuild-counters``
+(один сгруппированный запрос на таблицу).
+"""
+from dataclasses import dataclass, field
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event, func, inspect, select, insert, delete
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import db, User, Manuscript, Publication, News, Message, StatsCounter
+
+
+@dataclass(frozen=True)
+class StatsSnapshot:
+    users_by_role: dict = field(default_factory=dict)
+    manuscripts_by_status: dict = field(default_factory=dict)
+    messages_by_status: dict = field(default_factory=dict)
+    publications_total: int = 0
+    news_total: int = 0
+
+    # --- пользователи ---
+    @property
+    def users_total(self):
+        return sum(self.users_by_role.values())
+
+    @property
+    def users_authors(self):
+        return self.users_by_role.get('author', 0)
+
+    @property
+    def users_staff(self):
+        return self.users_by_role.get('staff', 0)
+
+    @property
+    def users_reviewers(self):
+        return self.users_by_role.get('reviewer', 0)
+
+    @property
+    def users_admins(self):
+        return self.users_by_role.get('admin', 0)
+
+    # --- рукописи ---
+    @property
+    def manuscripts_total(self):
+        return sum(self.manuscripts_by_status.values())
+
+    @property
+    def published_manuscripts(self):
+        return self.manuscripts_by_status.get('published', 0)
+
+    @property
+    def in_review(self):
+        return self.manuscripts_by_status.get('under_review', 0)
+
+    # --- обращения ---
+    @property
+    def contacts_total(self):
+        return sum(self.messages_by_status.values())
+
+    @property
+    def contacts_new(self):
+        return self.messages_by_status.get('new', 0)
+
+    @property
+    def contacts_done(self):
+        return self.messages_by_status.get('done', 0)
+
+
+# scope счётчика -> (модель, атрибут группировки или None для общего числа строк)
+COUNTED = {
+    'users.role': (User, 'role'),
+    'manuscripts.status': (Manuscript, 'status'),
+    'messages.status': (Message, 'status'),
+    'publications': (Publication, None),
+    'news': (News, None),
+}
+
+counters_table = StatsCounter.__table__
+
+# INSERT с ON CONFLICT для поддерживаемых СУБД
+_UPSERT = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+def _key(value):
+    return '' if value is None else str(value)
+
+
+def _bump(connection, scope, key, delta):
+    # один оператор INSERT ... ON CONFLICT DO UPDATE: при UPDATE и INSERT вслед за ним
+    # два первых увеличения одного ключа оба доходили до INSERT, и второй падал на первичном ключе
+    statement = _UPSERT[connection.dialect.name](counters_table).values(scope=scope, key=key, value=delta)
+    connection.execute(statement.on_conflict_do_update(
+        index_elements=[counters_table.c.scope, counters_table.c.key],
+        set_={'value': counters_table.c.value + delta},
+    ))
+
+
+def adjust_counter(connection, scope, old_key, new_key, count=1):
+    """
+    Переносит count записей из группы old_key в new_key (None — нет группы).
+    Нужна и для массовых UPDATE, которые обходят события ORM.
+    """
+    if old_key == new_key or count == 0:
+        return
+    if old_key is not None:
+        _bump(connection, scope, _key(old_key), -count)
+    if new_key is not None:
+        _bump(connection, scope, _key(new_key), count)
+
+
+def _keep_history(target, value, oldvalue, initiator):
+    return value
+
+
+def _register(scope, model, attr):
+    def after_insert(mapper, connection, target):
+        value = getattr(target, attr) if attr else ''
+        adjust_counter(connection, scope, None, value)
+
+    def after_delete(mapper, connection, target):
+        value = getattr(target, attr) if attr else ''
+        adjust_counter(connection, scope, value, None)
+
+    event.listen(model, 'after_insert', after_insert)
+    event.listen(model, 'after_delete', after_delete)
+
+    if attr:
+        # active_history: при присваивании в «просроченный» объект (после commit)
+        # старое значение подгружается, иначе в history.deleted его не будет
+        event.listen(getattr(model, attr), 'set', _keep_history, active_history=True)
+
+        def after_update(mapper, connection, target):
+            history = inspect(target).attrs[attr].history
+            if history.deleted and history.added:
+                adjust_counter(connection, scope, history.deleted[0], history.added[0])
+
+        event.listen(model, 'after_update', after_update)
+
+
+for _scope, (_model, _attr) in COUNTED.items():
+    _register(_scope, _model, _attr)
+
+
+# --- Пересчёт и чтение ---
+
+def compute_counters():
+    """Полный пересчёт: по одному агрегатному запросу на таблицу."""
+    counters = {}
+    for scope, (model, attr) in COUNTED.items():
+        if attr:
+            column = getattr(model, attr)
+            rows = db.session.execute(
+                select(column, func.count()).group_by(column)
+            ).all()
+            counters[scope] = {_key(key): count for key, count in rows}
+        else:
+            total = db.session.execute(select(func.count()).select_from(model)).scalar()
+            counters[scope] = {'': total}
+    return counters
+
+
+def rebuild_counters():
+    counters = compute_counters()
+    db.session.execute(delete(counters_table))
+    rows = [
+        {'scope': scope, 'key': key, 'value': value}
+        for scope, groups in counters.items()
+        for key, value in groups.items()
+    ]
+    if rows:
+        db.session.execute(insert(counters_table), rows)
+    db.session.commit()
+    return counters
+
+
+def init_counters(app):
+    """Заполняет таблицу счётчиков (создаётся миграцией), если она пуста."""
+    with app.app_context():
+        if db.session.execute(select(counters_table.c.scope).limit(1)).first() is None:
+            rebuild_counters()
+    app.cli.add_command(rebuild_counters_command)
+
+
+def collect_stats():
+    """Снимок всех счётчиков из stats_counters."""
+    counters = {}
+    for scope, key, value in db.session.execute(
+            select(counters_table.c.scope, counters_table.c.key, counters_table.c.value)):
+        counters.setdefault(scope, {})[key] = value
+    return StatsSnapshot(
+        users_by_role=counters.get('users.role', {}),
+        manuscripts_by_status=counters.get('manuscripts.status', {}),
+        messages_by_status=counters.get('messages.status', {}),
+        publications_total=counters.get('publications', {}).get('', 0),
+        news_total=counters.get('news', {}).get('', 0),
+    )
+
+
+@click.command('rebuild-counters')
+@with_appcontext
+def rebuild_counters_command():
+    """Пересчитать таблицу stats_counters по фактическим данным."""
+    counters = rebuild_counters()
+    for scope, groups in counters.items():
+        click.echo('%s: %s' % (scope, ', '.join('%s=%d' % (k or '*', v) for k, v in sorted(groups.items()))))
@@ -0,0 +1,118 @@
+"""
+Хранилище загруженных файлов рукописей по содержимому.
+
+Загрузка читается потоком по CHUNK_SIZE байт во временный файл с
+одновременным подсчётом SHA-256, после чего файл переносится в
+manuscripts/objects/<aa>/<bb>/<sha256>.<ext> внутри UPLOAD_FOLDER.
+Одинаковые файлы хранятся один раз (таблица stored_files со счётчиком
+ссылок), а одноимённые файлы разных авторов больше не перезаписывают
+друг друга.
+"""
+import hashlib
+import os
+import tempfile
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import event, update
+from sqlalchemy.exc import IntegrityError
+from werkzeug.utils import secure_filename
+
+from models import db, Manuscript, StoredFile
+
+CHUNK_SIZE = 64 * 1024
+OBJECTS_DIR = os.path.join('manuscripts', 'objects')
+
+
+def _extension(filename):
+    # расширение берётся до secure_filename: из «статья.pdf» он оставил бы только «pdf»
+    extension = os.path.splitext(filename or '')[1][1:]
+    return secure_filename(extension).lower()
+
+
+def store_upload(file):
+    """
+    Сохраняет FileStorage в хранилище и увеличивает счётчик ссылок.
+    Возвращает StoredFile (изменения фиксируются вместе с рукописью при commit).
+    """
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    tmp_dir = os.path.join(upload_folder, 'uploads')
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = file.stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+        sha256 = digest.hexdigest()
+
+        stored = db.session.get(StoredFile, sha256)
+        if stored is None:
+            extension = _extension(file.filename)
+            relative = os.path.join(OBJECTS_DIR, sha256[:2], sha256[2:4],
+                                    sha256 + ('.' + extension if extension else ''))
+            target = os.path.join(upload_folder, relative)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            if not os.path.exists(target):
+                os.replace(tmp_path, target)
+            stored = StoredFile(sha256=sha256, path=relative.replace(os.sep, '/'), size=size, ref_count=1)
+            try:
+                # точка сохранения: вставку можно откатить, не теряя остальную транзакцию
+                with db.session.begin_nested():
+                    db.session.add(stored)
+            except IntegrityError:
+                # тот же файл одновременно загрузили впервые в другом запросе,
+                # и его строка уже зафиксирована — увеличиваем её счётчик
+                stored = db.session.get(StoredFile, sha256)
+                stored.ref_count = StoredFile.ref_count + 1
+        else:
+            # такой файл уже есть: счётчик увеличиваем в SQL, без гонки чтения-записи
+            stored.ref_count = StoredFile.ref_count + 1
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return stored
+
+
+def stored_file_path(stored):
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], stored.path)
+
+
+def _release(mapper, connection, target):
+    # рукопись удалена — файл больше на неё не ссылается
+    if target.file_sha256:
+        connection.execute(
+            update(StoredFile.__table__)
+            .where(StoredFile.__table__.c.sha256 == target.file_sha256)
+            .values(ref_count=StoredFile.__table__.c.ref_count - 1)
+        )
+
+event.listen(Manuscript, 'after_delete', _release)
+
+
+def init_storage(app):
+    # таблица stored_files и колонки manuscripts создаются миграцией 4 (migrations.py)
+    app.cli.add_command(gc_uploads_command)
+
+
+@click.command('gc-uploads')
+@with_appcontext
+def gc_uploads_command():
+    """Удалить из хранилища файлы, на которые не ссылается ни одна рукопись."""
+    removed = 0
+    for stored in StoredFile.query.filter(StoredFile.ref_count <= 0).all():
+        path = stored_file_path(stored)
+        if os.path.exists(path):
+            os.remove(path)
+        db.session.delete(stored)
+        removed += 1
+    db.session.commit()
+    click.echo('Удалено файлов: %d' % removed)
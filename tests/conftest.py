@@ -0,0 +1,81 @@
+"""
+Общие фикстуры тестов: приложение на временных файлах SQLite.
+
+Каждый тест получает свою БД в tmp_path, наполненную демо-данными
+(db_init.py) при первом запуске приложения. Кэш страниц, ограничение
+попыток входа и воркеры фоновых задач в тестах выключены: задачи
+выполняются явно через jobs.work_off().
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+import search  # noqa: E402
+from app import create_app  # noqa: E402
+from models import db  # noqa: E402
+
+ACCOUNTS = {
+    'admin': ('admin@editorial.ru', 'adminpass'),
+    'editor': ('editor@editorial.ru', 'editorpass'),
+    'reviewer': ('reviewer@editorial.ru', 'reviewpass'),
+    'author': ('author@editorial.ru', 'authorpass'),
+}
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    """Фабрика приложений; именованные аргументы переопределяют поля Config."""
+    apps = []
+
+    def factory(**overrides):
+        settings = {
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'database.sqlite3'),
+            'SQLALCHEMY_BINDS': {},
+            'UPLOAD_FOLDER': str(tmp_path / 'media'),
+            'PAGE_CACHE_TYPE': '',
+            'RATE_LIMIT_STORAGE': '',
+            'JOB_WORKERS': 0,
+            'INSTRUMENTATION': False,
+        }
+        settings.update(overrides)
+        for name, value in settings.items():
+            monkeypatch.setattr(config.Config, name, value, raising=False)
+        # состояние индекса модульное: новая БД ещё без search_index до init_search
+        monkeypatch.setitem(search._state, 'enabled', False)
+        app = create_app()
+        app.config['TESTING'] = True
+        apps.append(app)
+        return app
+
+    yield factory
+    for app in apps:
+        with app.app_context():
+            db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose()
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def login(client):
+    """login('author') — вход демо-пользователем с указанной ролью."""
+    def log_in(role):
+        email, password = ACCOUNTS[role]
+        client.get('/logout')
+        response = client.post('/login', data={'email': email, 'password': password})
+        assert response.status_code == 302
+        return client
+    return log_in
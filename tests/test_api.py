@@ -0,0 +1,49 @@
+"""JSON API (api.py): права ролей на рукописи, рецензии и историю."""
+import pytest
+
+from history import record_history
+from models import db, Manuscript, User
+
+
+@pytest.fixture
+def manuscript_id(app):
+    with app.app_context():
+        author = User.query.filter_by(email='author@editorial.ru').one()
+        reviewer = User.query.filter_by(role='reviewer').first()
+        manuscript = Manuscript.query.filter_by(author_id=author.id).first()
+        record_history([manuscript.id], 'reviewer_assigned', None, 'Назначен рецензент.')
+        record_history([manuscript.id], 'review_submitted', reviewer, 'Рецензент отправил рецензию (оценка 2).')
+        db.session.commit()
+        return manuscript.id
+
+
+def test_author_history_is_redacted(client, login, manuscript_id):
+    login('author')
+    response = client.get('/api/v1/manuscripts/%d/history' % manuscript_id)
+    assert response.status_code == 200
+    entries = response.get_json()['data']
+    assert entries
+    assert {tuple(entry) for entry in entries} == {('id', 'manuscript_id', 'action', 'created_at')}
+    assert not {'reviewer_assigned', 'review_submitted'} & {entry['action'] for entry in entries}
+
+    included = client.get('/api/v1/manuscripts/%d?include=history' % manuscript_id).get_json()['data']
+    assert included['history'] == entries
+
+    assert client.get('/api/v1/manuscripts/%d/history?fields=comment' % manuscript_id).status_code == 400
+    assert client.get('/api/v1/manuscripts/%d/history?include=actor' % manuscript_id).status_code == 400
+    assert client.get('/api/v1/manuscripts/%d?include=history&fields[history]=actor_id'
+                      % manuscript_id).status_code == 400
+
+
+def test_staff_history_is_complete(client, login, manuscript_id):
+    login('editor')
+    entries = client.get('/api/v1/manuscripts/%d/history?include=actor' % manuscript_id).get_json()['data']
+    assert {'reviewer_assigned', 'review_submitted'} <= {entry['action'] for entry in entries}
+    assert 'Рецензент отправил рецензию (оценка 2).' in {entry['comment'] for entry in entries}
+
+
+@pytest.mark.parametrize('url', ['/api/v1/manuscripts', '/api/v1/reviews', '/api/v1/manuscripts/1/history',
+                                 '/api/v1/manuscripts/1?include=reviews,history', '/api/v1/changes'])
+def test_admin_sees_what_staff_sees(client, login, url):
+    login('admin')
+    assert client.get(url).status_code == 200
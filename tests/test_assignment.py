@@ -0,0 +1,87 @@
+"""Распределение рецензентов (assignment.py): plan() на данных в памяти и запись назначений."""
+from collections import Counter
+
+from assignment import Item, Settings, Tables, assign_reviewers, plan
+from models import db, Manuscript, ManuscriptHistory, Review, User
+
+SETTINGS = Settings(per_manuscript=2, max_open=0, section_weight=3, keyword_weight=1, load_penalty=1)
+
+
+def _tables(manuscripts, reviewers=(10, 11, 12, 13), load=None, sections=None, keywords=None, existing=None):
+    return Tables(
+        reviewers={r: 'Рецензент %d' % r for r in reviewers},
+        load=load or {},
+        reviewer_sections=sections or {},
+        reviewer_keywords=keywords or {},
+        manuscripts=manuscripts,
+        existing=existing or {},
+    )
+
+
+def _item(ident, author_id=1, section_id=None, status='submitted', keywords=()):
+    return Item(ident, author_id, section_id, status, frozenset(keywords))
+
+
+def _by_manuscript(assignments):
+    chosen = {}
+    for a in assignments:
+        chosen.setdefault(a.manuscript_id, []).append(a.reviewer_id)
+    return chosen
+
+
+def test_author_and_existing_reviewers_are_excluded():
+    tables = _tables([_item(1, author_id=10)], existing={1: {11}})
+    assignments, shortfall = plan(tables, SETTINGS)
+    chosen = _by_manuscript(assignments)[1]
+    assert len(chosen) == 1  # одна рецензия уже есть
+    assert chosen[0] not in (10, 11)
+    assert shortfall == {}
+
+
+def test_specialization_outweighs_small_load():
+    tables = _tables([_item(1, section_id=5, keywords={7})],
+                     load={12: 2}, sections={12: {5}}, keywords={13: {7}})
+    assignments, _ = plan(tables, Settings(1, 0, 3, 1, 1))
+    # 12: 3 за раздел - 2 за нагрузку = 1, 13: 1 за слово; при равенстве — кто меньше загружен
+    assert [a.reviewer_id for a in assignments] == [13]
+    assignments, _ = plan(tables, Settings(1, 0, 5, 1, 1))
+    assert [(a.reviewer_id, a.score) for a in assignments] == [(12, 5)]
+
+
+def test_batch_is_spread_evenly():
+    tables = _tables([_item(n) for n in range(1, 9)])
+    assignments, shortfall = plan(tables, SETTINGS)
+    assert shortfall == {}
+    assert len(assignments) == 16
+    assert set(Counter(a.reviewer_id for a in assignments).values()) == {4}
+    assert all(len(set(chosen)) == 2 for chosen in _by_manuscript(assignments).values())
+
+
+def test_open_review_limit_and_shortfall():
+    tables = _tables([_item(1), _item(2)], reviewers=(10, 11, 12), load={10: 1})
+    assignments, shortfall = plan(tables, Settings(2, 1, 3, 1, 1))
+    # у 10 уже одна открытая рецензия — свободны только 11 и 12, по одному разу
+    assert sorted((a.manuscript_id, a.reviewer_id) for a in assignments) == [(1, 11), (1, 12)]
+    assert shortfall == {2: 2}
+
+
+def test_only_assignable_statuses():
+    tables = _tables([_item(1, status='accepted'), _item(2, status='under_review')])
+    assert set(_by_manuscript(plan(tables, SETTINGS)[0])) == {2}
+
+
+def test_assign_reviewers_history_has_no_reviewer_names(app):
+    with app.app_context():
+        editor = User.query.filter_by(role='staff').first()
+        manuscript = Manuscript(title='Новая', file_path='x.txt', status='submitted',
+                                author_id=User.query.filter_by(role='author').first().id)
+        db.session.add(manuscript)
+        db.session.commit()
+
+        _, assignments, _ = assign_reviewers(editor, [manuscript.id])
+        db.session.commit()
+        assert assignments
+        assert Review.query.filter_by(manuscript_id=manuscript.id, status='pending').count() == len(assignments)
+        history = ManuscriptHistory.query.filter_by(manuscript_id=manuscript.id, action='reviewer_assigned').all()
+        assert [entry.comment for entry in history] == ['Назначен рецензент.'] * len(assignments)
+        assert db.session.get(Manuscript, manuscript.id).status == 'under_review'
@@ -0,0 +1,52 @@
+"""Массовые операции редактора (bulk.py)."""
+import sqlite3
+
+import bulk
+from models import db, Manuscript, ManuscriptHistory, StatsCounter, User
+
+
+def _counters():
+    return {c.key: c.value for c in StatsCounter.query.filter_by(scope='manuscripts.status')}
+
+
+def test_bulk_status_updates_rows_history_and_counters(app):
+    with app.app_context():
+        editor = User.query.filter_by(role='staff').first()
+        ids = [m.id for m in Manuscript.query.filter(Manuscript.status != 'rejected')]
+        before = _counters()
+        results = bulk.bulk_set_status(ids, editor, 'rejected')
+        db.session.commit()
+        assert {item.result for item in results} == {'ok'}
+        assert {m.status for m in Manuscript.query.filter(Manuscript.id.in_(ids))} == {'rejected'}
+        assert ManuscriptHistory.query.filter_by(action='rejected').count() == len(ids)
+        assert _counters().get('rejected', 0) == before.get('rejected', 0) + len(ids)
+
+
+def test_concurrent_change_is_skipped(app):
+    path = app.config['SQLALCHEMY_DATABASE_URI'].removeprefix('sqlite:///')
+    with app.app_context():
+        editor = User.query.filter_by(role='staff').first()
+        ids = [m.id for m in Manuscript.query.filter(Manuscript.status != 'rejected')]
+        raced = ids[0]
+        before = _counters()
+
+        def check(status, publication_id):
+            # пока проверяются остальные рукописи, другой редактор отклоняет первую
+            if not check.done:
+                check.done = True
+                connection = sqlite3.connect(path)
+                connection.execute("UPDATE manuscripts SET status = 'rejected' WHERE id = ?", (raced,))
+                connection.commit()
+                connection.close()
+            return None
+        check.done = False
+
+        results = bulk._apply(ids, editor, check, {'status': 'accepted'}, 'accepted', 'Принята.')
+        db.session.commit()
+        by_id = {item.id: item for item in results}
+        assert by_id[raced].result == 'skipped'
+        assert all(by_id[ident].result == 'ok' for ident in ids[1:])
+        assert db.session.get(Manuscript, raced).status == 'rejected'
+        assert ManuscriptHistory.query.filter_by(action='accepted').count() == len(ids) - 1
+        # внешний UPDATE счётчики не трогал, а массовая операция перенесла только свои строки
+        assert _counters().get('accepted', 0) == before.get('accepted', 0) + len(ids) - 1
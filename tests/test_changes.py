@@ -0,0 +1,48 @@
+"""Лента изменений (changes.py): курсор не проходит мимо ещё не устоявшихся записей."""
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, select
+
+import changes
+from models import db, ManuscriptHistory
+
+
+def _add(created_at):
+    return db.session.execute(insert(ManuscriptHistory).values(
+        manuscript_id=1, action='comment', created_at=created_at)).inserted_primary_key[0]
+
+
+def test_history_waits_for_settle_window(app):
+    app.config['CHANGES_SETTLE_SECONDS'] = 60
+    with app.app_context():
+        old = datetime.utcnow() - timedelta(minutes=5)
+        ManuscriptHistory.query.update({'created_at': old})  # демо-данные созданы только что
+        start = db.session.scalar(select(func.max(ManuscriptHistory.id))) or 0
+        settled = _add(old)
+        fresh = _add(datetime.utcnow())
+        # запись с большим id, но более ранним временем: её транзакция начата раньше
+        behind = _add(old)
+        db.session.commit()
+
+        history, _, position, has_more = changes.read_changes((start, None, 0), 100)
+        assert [entry['id'] for entry in history] == [settled]
+        assert position[0] == settled and not has_more
+        assert changes.latest_position()[0] == settled
+
+        ManuscriptHistory.query.filter_by(id=fresh).update({'created_at': old})
+        db.session.commit()
+        history, _, position, _ = changes.read_changes(position, 100)
+        assert [entry['id'] for entry in history] == [fresh, behind]
+        assert changes.latest_position()[0] == behind
+
+
+def test_history_page_limit(app):
+    app.config['CHANGES_SETTLE_SECONDS'] = 0
+    with app.app_context():
+        start = db.session.scalar(select(func.max(ManuscriptHistory.id))) or 0
+        ids = [_add(datetime.utcnow() - timedelta(seconds=10)) for _ in range(3)]
+        db.session.commit()
+        history, _, position, has_more = changes.read_changes((start, None, 0), 2)
+        assert [entry['id'] for entry in history] == ids[:2] and has_more
+        history, _, _, has_more = changes.read_changes(position, 2)
+        assert [entry['id'] for entry in history] == ids[2:]
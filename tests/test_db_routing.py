@@ -0,0 +1,74 @@
+"""Чтение из реплики (db_routing.py): основная БД и реплика — два файла SQLite."""
+import shutil
+import sqlite3
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select
+
+from models import db, News
+
+
+def _titles(path):
+    connection = sqlite3.connect(path)
+    try:
+        return {title for (title,) in connection.execute('SELECT title FROM news')}
+    finally:
+        connection.close()
+
+
+@pytest.fixture
+def replicated(make_app, tmp_path):
+    primary = tmp_path / 'primary.sqlite3'
+    replica = tmp_path / 'replica.sqlite3'
+    seeded = make_app(SQLALCHEMY_DATABASE_URI='sqlite:///%s' % primary)
+    with seeded.app_context():
+        db.session.remove()
+        db.engine.dispose()
+    shutil.copy(primary, replica)
+    app = make_app(SQLALCHEMY_DATABASE_URI='sqlite:///%s' % primary,
+                   SQLALCHEMY_BINDS={'replica': 'sqlite:///%s' % replica})
+    return app, str(primary), str(replica)
+
+
+def test_replica_endpoints_read_from_replica(replicated):
+    app, primary, replica = replicated
+    connection = sqlite3.connect(replica)
+    connection.execute("INSERT INTO news (title, content, published_at) VALUES ('только в реплике', 'x', ?)",
+                       (datetime.now().isoformat(' '),))
+    connection.commit()
+    connection.close()
+
+    client = app.test_client()
+    assert 'только в реплике' in client.get('/news').get_data(as_text=True)
+    assert 'только в реплике' in client.get('/api/v1/news').get_data(as_text=True)
+
+
+def test_writes_go_to_primary(replicated):
+    app, primary, replica = replicated
+    client = app.test_client()
+    response = client.post('/login', data={'email': 'admin@editorial.ru', 'password': 'adminpass'})
+    assert response.status_code == 302
+
+    response = client.post('/admin/news/edit', data={'title': 'новость в основной БД', 'content': 'x'})
+    assert response.status_code == 302
+    assert 'новость в основной БД' in _titles(primary)
+    assert 'новость в основной БД' not in _titles(replica)
+    # админка читает основную БД, публичная лента — ещё не догнавшую реплику
+    assert 'новость в основной БД' in client.get('/admin/news').get_data(as_text=True)
+    assert 'новость в основной БД' not in client.get('/news').get_data(as_text=True)
+
+
+def test_read_after_write_uses_primary(replicated):
+    app, primary, replica = replicated
+    with app.test_request_context('/news'):
+        app.preprocess_request()
+        query = select(News.id)
+        assert db.session.get_bind(clause=query) is db.engines['replica']
+
+        db.session.add(News(title='запись в запросе чтения', content='x'))
+        db.session.flush()
+        # после записи запрос до конца работает с основной БД
+        assert db.session.get_bind(clause=query) is db.engine
+        assert db.session.scalar(select(News.id).where(News.title == 'запись в запросе чтения'))
+        db.session.rollback()
@@ -0,0 +1,27 @@
+"""Извлечение текста рукописей (extraction.py)."""
+import io
+
+from jobs import work_off
+from models import db, Manuscript, ManuscriptText
+from extraction import process_manuscript
+
+
+def test_extracted_text_keeps_uploaded_file_name(app, login):
+    client = login('author')
+    response = client.post('/manuscripts/submit',
+                           data={'title': 'Текст', 'file': (io.BytesIO('Текст рукописи'.encode('utf-8')), 'статья.txt')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 302
+    with app.app_context():
+        work_off()
+        manuscript = Manuscript.query.filter_by(title='Текст').one()
+        record = db.session.get(ManuscriptText, manuscript.id)
+        assert record.status == 'done' and record.content == 'Текст рукописи'
+        assert record.source_name == 'статья.txt'
+
+
+def test_legacy_row_uses_path_name(app):
+    with app.app_context():
+        manuscript = Manuscript.query.filter(Manuscript.file_name.is_(None)).first()
+        record = process_manuscript(manuscript.id)
+        assert record.source_name == manuscript.file_path.rsplit('/', 1)[-1]
@@ -0,0 +1,23 @@
+"""Замер запросов (instrumentation.py): доступ к /metrics."""
+from instrumentation import fingerprint
+
+
+def test_metrics_closed_without_token(make_app):
+    client = make_app(INSTRUMENTATION=True, METRICS_TOKEN='').test_client()
+    assert client.get('/metrics', environ_base={'REMOTE_ADDR': '127.0.0.1'}).status_code == 403
+
+
+def test_metrics_with_token(make_app):
+    client = make_app(INSTRUMENTATION=True, METRICS_TOKEN='secret').test_client()
+    client.get('/')
+    assert client.get('/metrics').status_code == 403
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 403
+    response = client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+    assert response.status_code == 200
+    assert 'editorial_requests_total{endpoint="routes.index"' in response.get_data(as_text=True)
+    assert 'Server-Timing' in client.get('/').headers
+
+
+def test_fingerprint_folds_literals_and_in_lists():
+    assert fingerprint("SELECT * FROM t WHERE id IN (1, 2, 3) AND name = 'x'") == \
+        fingerprint("SELECT * FROM t WHERE id IN (4, 5) AND name = 'y'")
@@ -0,0 +1,136 @@
+"""Очередь фоновых задач (jobs.py) и синхронная запись истории (history.py)."""
+import io
+from datetime import datetime, timedelta
+
+import pytest
+
+import jobs
+from jobs import claim, enqueue, task, work_off
+from models import db, Job, Manuscript, ManuscriptHistory
+
+CALLS = []
+
+
+@task('test_record', priority=0)
+def _record(value):
+    CALLS.append(value)
+
+
+@task('test_urgent', priority=5)
+def _urgent(value):
+    CALLS.append(value)
+
+
+@task('test_flaky', max_attempts=2)
+def _flaky(value):
+    raise RuntimeError('сбой %s' % value)
+
+
+@pytest.fixture(autouse=True)
+def _calls():
+    CALLS.clear()
+    yield
+    CALLS.clear()
+
+
+def test_job_is_stored_with_the_transaction(app):
+    with app.app_context():
+        enqueue('test_record', value='откат')
+        db.session.rollback()
+        enqueue('test_record', value='готово')
+        db.session.commit()
+        assert Job.query.filter(Job.name.like('test_%')).count() == 1
+        assert work_off() == (1, 0)
+        job = Job.query.filter_by(name='test_record').one()
+        assert (job.status, job.attempts, job.locked_by) == ('done', 1, None)
+    assert CALLS == ['готово']
+
+
+def test_claim_by_priority_and_only_once(app):
+    with app.app_context():
+        enqueue('test_record', value='обычная')
+        enqueue('test_urgent', value='срочная')
+        enqueue('test_record', value='отложенная', delay=3600)
+        db.session.commit()
+
+        first = claim('worker-1')
+        assert first.name == 'test_urgent'
+        second = claim('worker-2')
+        assert second.name == 'test_record' and second.id != first.id
+        assert (second.status, second.locked_by) == ('running', 'worker-2')
+        # отложенная задача ещё не готова
+        assert claim('worker-3') is None
+
+
+def test_concurrency_limit(app):
+    app.config['JOB_CONCURRENCY'] = {'test_record': 1}
+    with app.app_context():
+        enqueue('test_record', value=1)
+        enqueue('test_record', value=2)
+        db.session.commit()
+        assert claim('worker-1') is not None
+        assert claim('worker-2') is None
+
+
+def test_failed_job_is_retried_with_backoff_then_fails(app):
+    app.config['JOB_RETRY_DELAY'] = 30
+    with app.app_context():
+        enqueue('test_flaky', value=1)
+        db.session.commit()
+        started = datetime.utcnow()
+        assert work_off() == (0, 1)
+
+        job = Job.query.filter_by(name='test_flaky').one()
+        assert (job.status, job.attempts) == ('queued', 1)
+        assert 'сбой 1' in job.last_error
+        assert job.run_at >= started + timedelta(seconds=30)
+        assert work_off() == (0, 0)  # повтор ещё не наступил
+
+        job.run_at = datetime.utcnow()
+        db.session.commit()
+        assert work_off() == (0, 1)
+        job = Job.query.filter_by(name='test_flaky').one()
+        assert (job.status, job.attempts) == ('failed', 2)
+        assert job.finished_at is not None
+
+        jobs.retry(job)
+        db.session.commit()
+        assert (job.status, job.attempts) == ('queued', 0)
+
+
+def test_stale_running_job_is_requeued(app):
+    app.config['JOB_TIMEOUT'] = 60
+    with app.app_context():
+        enqueue('test_record', value=1)
+        db.session.commit()
+        job = claim('dead-worker')
+        job.locked_at = datetime.utcnow() - timedelta(seconds=120)
+        db.session.commit()
+        assert jobs.requeue_stale() == 1
+        assert work_off() == (1, 0)
+    assert CALLS == [1]
+
+
+def test_workers_start_with_the_app(make_app, monkeypatch):
+    started = []
+    monkeypatch.setattr(jobs, '_start_workers', started.append)
+    app = make_app(JOB_WORKERS=2)
+    assert started == [app]
+    make_app(JOB_WORKERS=0)
+    make_app(JOB_WORKERS=2, TESTING=True)
+    assert started == [app]
+
+
+def test_history_is_written_with_the_request(client, login):
+    login('author')
+    response = client.post('/manuscripts/submit', data={
+        'title': 'История без очереди',
+        'file': (io.BytesIO(b'text'), 'article.txt'),
+    }, content_type='multipart/form-data')
+    assert response.status_code == 302
+    with client.application.app_context():
+        manuscript = Manuscript.query.filter_by(title='История без очереди').one()
+        history = ManuscriptHistory.query.filter_by(manuscript_id=manuscript.id).all()
+        assert [entry.action for entry in history] == ['submitted']
+        assert Job.query.filter_by(name='record_history').count() == 0
+        assert Job.query.filter_by(name='extract_text').count() == 1
@@ -0,0 +1,123 @@
+"""Отправка писем (mailer.py, notifications.py) через локальную SMTP-заглушку."""
+import email
+import email.policy
+import socketserver
+import threading
+
+import pytest
+
+from jobs import work_off
+from mailer import build_message, send_messages, smtp_pool
+from models import db, Notification
+
+
+class SMTPStub(socketserver.ThreadingTCPServer):
+    """Минимальный SMTP-сервер: принимает письма, адреса bad@... отклоняет."""
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _SMTPHandler)
+        self.messages = []
+        self.connections = 0
+        self.quits = 0
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write((line + '\r\n').encode('ascii'))
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        self.reply('220 stub')
+        recipients = []
+        while True:
+            line = self.rfile.readline().decode('utf-8').rstrip('\r\n')
+            if not line:
+                return
+            command = line[:4].upper()
+            if command in ('EHLO', 'HELO', 'NOOP', 'RSET'):
+                self.reply('250 ok')
+            elif command == 'MAIL':
+                recipients = []
+                self.reply('250 ok')
+            elif command == 'RCPT':
+                if 'bad@' in line:
+                    self.reply('550 no such user')
+                else:
+                    recipients.append(line.split(':', 1)[1].strip('<> '))
+                    self.reply('250 ok')
+            elif command == 'DATA':
+                self.reply('354 go ahead')
+                data = []
+                while True:
+                    chunk = self.rfile.readline().decode('utf-8')
+                    if chunk in ('.\r\n', '.\n'):
+                        break
+                    data.append(chunk)
+                server.messages.append((recipients, email.message_from_string(
+                    ''.join(data), policy=email.policy.default)))
+                self.reply('250 queued')
+            elif command == 'QUIT':
+                server.quits += 1
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('500 unknown command')
+
+
+@pytest.fixture
+def smtp(app):
+    server = SMTPStub()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    app.config.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=server.server_address[1],
+                      MAIL_RATE_LIMIT=0, NOTIFY_DIGEST_WINDOW=0)
+    yield server
+    smtp_pool.close_all()
+    server.shutdown()
+    server.server_close()
+
+
+def _messages(app, *addresses):
+    with app.app_context():
+        return [(address, build_message(address, 'Тема', 'Текст письма')) for address in addresses]
+
+
+def test_batch_uses_one_pooled_connection(app, smtp):
+    with app.app_context():
+        results = list(send_messages(_messages(app, 'a@example.com', 'bad@example.com', 'b@example.com')))
+        assert [key for key, _ in results] == ['a@example.com', 'bad@example.com', 'b@example.com']
+        assert results[0][1] is None and results[2][1] is None
+        assert 'bad@example.com' in results[1][1]
+
+        # следующая пачка — через то же соединение из пула
+        assert list(send_messages(_messages(app, 'c@example.com'))) == [('c@example.com', None)]
+    assert smtp.connections == 1
+    assert [recipients for recipients, _ in smtp.messages] == [['a@example.com'], ['b@example.com'],
+                                                               ['c@example.com']]
+    assert smtp.messages[0][1]['Subject'] == 'Тема'
+
+
+def test_abandoned_batch_releases_connection(app, smtp):
+    with app.app_context():
+        results = send_messages(_messages(app, 'a@example.com', 'b@example.com'))
+        assert next(results) == ('a@example.com', None)
+        results.close()
+        assert smtp_pool._idle == []
+    assert smtp.quits == 1
+    assert len(smtp.messages) == 1
+
+
+def test_digest_is_sent_and_marked(app, smtp):
+    client = app.test_client()
+    response = client.post('/contact', data={'email': 'guest@example.com', 'subject': 'Вопрос',
+                                             'body': 'Как подать рукопись?'})
+    assert 'Сообщение отправлено.' in response.get_data(as_text=True)
+    with app.app_context():
+        work_off()
+        notifications = Notification.query.all()
+        assert notifications and {n.status for n in notifications} == {'sent'}
+        admins = {n.email for n in notifications}
+    assert {recipients[0] for recipients, _ in smtp.messages} == admins
+    assert 'Как подать рукопись?' in smtp.messages[0][1].get_body().get_content()
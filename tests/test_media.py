@@ -0,0 +1,84 @@
+"""Скачивание файлов рукописей (media.py, маршруты media и media_file): права по ролям."""
+import hashlib
+import os
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from models import db, Manuscript, StoredFile, User
+
+FILES = {'published': b'published file', 'submitted': b'submitted file'}
+
+
+@pytest.fixture
+def files(app):
+    """Опубликованная и поданная рукописи демо-автора; у каждой свой файл по пути и по SHA-256."""
+    folder = app.config['UPLOAD_FOLDER']
+    result = {}
+    with app.app_context():
+        author = User.query.filter_by(email='author@editorial.ru').one()
+        db.session.add(User(full_name='Другой автор', email='other@editorial.ru', role='author',
+                            password_hash=generate_password_hash('otherpass')))
+        for status, content in FILES.items():
+            sha256 = hashlib.sha256(content).hexdigest()
+            relative = 'manuscripts/objects/%s.txt' % sha256
+            os.makedirs(os.path.join(folder, 'manuscripts', 'objects'), exist_ok=True)
+            with open(os.path.join(folder, relative), 'wb') as f:
+                f.write(content)
+            db.session.add(StoredFile(sha256=sha256, path=relative, size=len(content), ref_count=1))
+            db.session.add(Manuscript(title=status, file_path='media/' + relative, file_name=status + '.txt',
+                                      file_sha256=sha256, status=status, author_id=author.id))
+            result[status] = (relative, sha256)
+        db.session.commit()
+    return result
+
+
+def _statuses(client, files):
+    """Коды ответа для каждого файла по обоим адресам: {статус: (по пути, по SHA-256)}."""
+    return {status: (client.get('/media/' + relative).status_code,
+                     client.get('/media/sha256/' + sha256).status_code)
+            for status, (relative, sha256) in files.items()}
+
+
+def _log_in(client, email, password):
+    client.get('/logout')
+    assert client.post('/login', data={'email': email, 'password': password}).status_code == 302
+
+
+def test_guest_gets_published_files_only(client, files):
+    assert _statuses(client, files) == {'published': (200, 200), 'submitted': (302, 302)}
+    response = client.get('/media/sha256/' + files['published'][1])
+    assert response.get_data() == FILES['published']
+
+
+def test_author_gets_own_files(login, files):
+    client = login('author')
+    assert _statuses(client, files) == {'published': (200, 200), 'submitted': (200, 200)}
+
+
+def test_unrelated_author_gets_published_only(client, files):
+    _log_in(client, 'other@editorial.ru', 'otherpass')
+    assert _statuses(client, files) == {'published': (200, 200), 'submitted': (403, 403)}
+
+
+@pytest.mark.parametrize('role', ['reviewer', 'editor', 'admin'])
+def test_reviewers_and_staff_get_everything(login, files, role):
+    client = login(role)
+    assert _statuses(client, files) == {'published': (200, 200), 'submitted': (200, 200)}
+
+
+def test_unknown_files(login, files):
+    client = login('admin')
+    assert client.get('/media/sha256/' + '0' * 64).status_code == 404
+    assert client.get('/media/manuscripts/missing.txt').status_code == 404
+    assert client.get('/media/../config.py').status_code == 404
+
+
+def test_x_accel_hands_off_after_the_check(app, login, files):
+    app.config['MEDIA_DELIVERY'] = 'x-accel'
+    client = login('author')
+    relative, sha256 = files['submitted']
+    response = client.get('/media/sha256/' + sha256)
+    assert response.headers['X-Accel-Redirect'] == '/protected-media/' + relative
+    assert response.get_data() == b''
+    assert client.get('/media/sha256/' + sha256, headers={'If-None-Match': '"%s"' % sha256}).status_code == 304
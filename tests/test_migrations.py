@@ -0,0 +1,59 @@
+"""Миграции схемы (migrations.py): цепочка миграций даёт ту же схему, что и модели."""
+from sqlalchemy import create_engine, inspect, text
+
+from migrations import MIGRATIONS, upgrade
+from models import db
+
+
+def _schema(engine):
+    inspector = inspect(engine)
+    schema = {}
+    for table in inspector.get_table_names():
+        if table == 'schema_migrations':
+            continue
+        schema[table] = {
+            'columns': {c['name']: (str(c['type']), c['nullable']) for c in inspector.get_columns(table)},
+            'primary_key': inspector.get_pk_constraint(table)['constrained_columns'],
+            'indexes': {i['name']: tuple(i['column_names']) for i in inspector.get_indexes(table)},
+            'unique': sorted(tuple(u['column_names']) for u in inspector.get_unique_constraints(table)),
+        }
+    return schema
+
+
+def test_migrations_match_models(tmp_path):
+    migrated = create_engine('sqlite:///%s' % (tmp_path / 'migrated.sqlite3'))
+    for item in MIGRATIONS:
+        with migrated.begin() as connection:
+            item.function(connection)
+    created = create_engine('sqlite:///%s' % (tmp_path / 'created.sqlite3'))
+    db.metadata.create_all(created)
+    assert _schema(migrated) == _schema(created)
+
+
+def test_migrations_are_repeatable(tmp_path):
+    engine = create_engine('sqlite:///%s' % (tmp_path / 'twice.sqlite3'))
+    for _ in range(2):
+        for item in MIGRATIONS:
+            with engine.begin() as connection:
+                item.function(connection)
+
+
+def test_upgrade_legacy_database(tmp_path):
+    # БД, созданная до миграций: таблицы начальной схемы с данными, schema_migrations нет
+    engine = create_engine('sqlite:///%s' % (tmp_path / 'legacy.sqlite3'))
+    with engine.begin() as connection:
+        MIGRATIONS[0].function(connection)
+        connection.execute(text(
+            "INSERT INTO users (id, full_name, email, password_hash, role) "
+            "VALUES (1, 'Автор', 'author@example.org', 'x', 'author')"))
+        connection.execute(text(
+            "INSERT INTO manuscripts (id, title, file_path, status, author_id) "
+            "VALUES (1, 'Рукопись', 'media/manuscripts/a.pdf', 'submitted', 1)"))
+    applied = upgrade(engine)
+    assert [item.version for item in applied] == [item.version for item in MIGRATIONS]
+    indexes = {index['name'] for index in inspect(engine).get_indexes('manuscripts')}
+    assert {'ix_manuscripts_created', 'ix_manuscripts_updated'} <= indexes
+    assert 'section_id' in {column['name'] for column in inspect(engine).get_columns('manuscripts')}
+    with engine.connect() as connection:
+        assert connection.execute(text('SELECT title FROM manuscripts')).scalar() == 'Рукопись'
+    assert upgrade(engine) == []
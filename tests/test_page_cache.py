@@ -0,0 +1,43 @@
+"""Кэш публичных страниц (page_cache.py)."""
+import os
+import time
+
+from page_cache import FileStore
+
+
+def _pages(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith('.page'))
+
+
+def test_unknown_query_args_are_not_cached(make_app, tmp_path):
+    directory = tmp_path / 'page_cache'
+    client = make_app(PAGE_CACHE_TYPE='filesystem', PAGE_CACHE_DIR=str(directory)).test_client()
+    for n in range(5):
+        assert client.get('/news?x=%d' % n).status_code == 200
+    assert _pages(directory) == []
+    client.get('/news')
+    client.get('/news')
+    client.get('/news?per_page=2')
+    assert len(_pages(directory)) == 2
+
+
+def test_file_store_limit(tmp_path):
+    store = FileStore(str(tmp_path), max_files=10, ttl=300)
+    for n in range(11):
+        store.set('key%d' % n, {'n': n})
+        if n < 10:
+            stamp = time.time() - 100 + n  # порядок записи без совпадающих mtime
+            os.utime(store._path('key%d' % n), (stamp, stamp))
+    assert len(_pages(tmp_path)) == 9
+    assert store.get('key0') is None and store.get('key10') == {'n': 10}
+
+
+def test_file_store_prunes_expired_first(tmp_path):
+    store = FileStore(str(tmp_path), max_files=10, ttl=300)
+    for n in range(5):
+        store.set('old%d' % n, {'n': n})
+    stale = time.time() - 600
+    for name in _pages(tmp_path):
+        os.utime(tmp_path / name, (stale, stale))
+    assert store.prune() == 0
+    assert _pages(tmp_path) == []
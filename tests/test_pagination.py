@@ -0,0 +1,75 @@
+"""Постраничный вывод по курсору (pagination.py)."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, News
+import query_plans
+from pagination import decode_cursor, encode_cursor, keyset_paginate
+
+
+@pytest.fixture
+def news_ids(app):
+    """Девять новостей: по две на дату (одинаковые значения сортировки) и две без даты."""
+    with app.app_context():
+        News.query.delete()
+        for n in range(7):
+            db.session.add(News(title='n%d' % n, content='x',
+                                published_at=datetime(2020, 1, 1) + timedelta(days=n // 2)))
+        for n in range(2):
+            db.session.add(News(title='без даты %d' % n, content='x', published_at=None))
+        db.session.commit()
+        rows = News.query.all()
+        # ожидаемый порядок: дата по убыванию, при равенстве id по убыванию, NULL в конце
+        rows.sort(key=lambda row: (row.published_at is not None, row.published_at or datetime.min, row.id),
+                  reverse=True)
+        return [row.id for row in rows]
+
+
+def _page(app, **args):
+    with app.test_request_context('/news', query_string=args):
+        page = keyset_paginate(News.query, News.published_at, News.id, per_page=3)
+        return [row.id for row in page], page.next_cursor, page.prev_cursor
+
+
+def test_forward_walk_visits_every_row_once(app, news_ids):
+    seen, cursor = [], None
+    while True:
+        ids, cursor, _ = _page(app, **({'after': cursor} if cursor else {}))
+        seen += ids
+        if cursor is None:
+            break
+    assert seen == news_ids
+
+
+def test_backward_returns_previous_page(app, news_ids):
+    first, after_first, prev = _page(app)
+    assert prev is None
+    second, after_second, before_second = _page(app, after=after_first)
+    assert second == news_ids[3:6]
+    back, _, before_back = _page(app, before=before_second)
+    assert back == first
+    assert before_back is None
+
+    # назад от страницы со строками без даты
+    third, _, before_third = _page(app, after=after_second)
+    assert third == news_ids[6:]
+    assert _page(app, before=before_third)[0] == second
+
+
+def test_damaged_cursor_starts_from_first_page(app, news_ids):
+    assert _page(app, after='garbage')[0] == news_ids[:3]
+
+
+def test_cursor_round_trip():
+    stamp = datetime(2024, 5, 17, 12, 30)
+    assert decode_cursor(encode_cursor(stamp, 42), News.published_at) == (stamp, 42)
+    assert decode_cursor(encode_cursor(None, 7), News.published_at) == (None, 7)
+    assert decode_cursor('!!!', News.published_at) is None
+
+
+def test_cursor_pages_seek_the_index(app):
+    with app.app_context(), db.engine.connect() as connection:
+        results = query_plans.check_hot_queries(connection)
+    cursor_pages = [(name, problems) for name, plan, problems in results if name in query_plans.SEEK_QUERIES]
+    assert cursor_pages and all(not problems for name, problems in cursor_pages)
@@ -0,0 +1,37 @@
+"""Пароли (passwords.py): пересчёт хэша при смене параметров и отказ при перегрузке пула."""
+import passwords
+from models import db, User
+from passwords import HashingBusy, needs_rehash
+
+
+def _hash_of(app, email):
+    with app.app_context():
+        return db.session.execute(db.select(User.password_hash).filter_by(email=email)).scalar()
+
+
+def test_login_rehashes_with_new_method(make_app):
+    app = make_app(PASSWORD_HASH_METHOD='pbkdf2:sha256:1000')
+    assert _hash_of(app, 'author@editorial.ru').startswith('scrypt:')
+    client = app.test_client()
+    assert client.post('/login', data={'email': 'author@editorial.ru', 'password': 'authorpass'}).status_code == 302
+    rehashed = _hash_of(app, 'author@editorial.ru')
+    assert rehashed.startswith('pbkdf2:sha256:1000$')
+    with app.app_context():
+        assert not needs_rehash(rehashed)
+
+    # неверный пароль хэш не меняет, с новым хэшем вход работает
+    client.get('/logout')
+    assert client.post('/login', data={'email': 'author@editorial.ru', 'password': 'wrong'}).status_code == 200
+    assert _hash_of(app, 'author@editorial.ru') == rehashed
+    assert client.post('/login', data={'email': 'author@editorial.ru', 'password': 'authorpass'}).status_code == 302
+
+
+def test_busy_pool_answers_503(client, monkeypatch):
+    def busy(function, *args):
+        raise HashingBusy('Очередь хэширования паролей заполнена')
+
+    monkeypatch.setattr(passwords.hash_pool, 'run', busy)
+    response = client.post('/login', data={'email': 'author@editorial.ru', 'password': 'authorpass'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
+    assert 'Сервер перегружен' in response.get_data(as_text=True)
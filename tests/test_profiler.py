@@ -0,0 +1,50 @@
+"""Профилировщик (profiler.py): cProfile — не больше чем для одного запроса за раз."""
+import threading
+
+import profiler
+
+
+def _in_thread(function):
+    result = []
+    thread = threading.Thread(target=lambda: result.append(function()))
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+def test_one_cprofile_at_a_time(app, tmp_path):
+    app.config['PROFILER_DIR'] = str(tmp_path / 'profiles')
+    session = profiler.ProfileSession(app, seconds=60)
+    first = session.attach()
+    assert first is not None
+    # второй запрос в другом потоке, пока первый ещё профилируется, — только выборка стеков
+    second = _in_thread(session.attach)
+    assert second is None and len(session.active) == 2
+    session.detach(first)
+
+    def request():
+        profile = session.attach()
+        session.detach(profile)
+        return profile
+
+    assert _in_thread(request) is not None
+    assert session.cprofiled == 2
+    session.finish()
+
+
+def test_enable_failure_falls_back_to_sampling(app, tmp_path, monkeypatch):
+    class Busy(profiler.cProfile.Profile):
+        def enable(self, *args, **kwargs):
+            raise ValueError('Another profiling tool is already active')
+
+    monkeypatch.setattr(profiler.cProfile, 'Profile', Busy)
+    app.config['PROFILER_DIR'] = str(tmp_path / 'profiles')
+    with app.app_context():
+        session = profiler.start(seconds=60)
+    try:
+        client = app.test_client()
+        assert client.get('/about').status_code == 200
+        assert session.profiled == 1 and session.cprofiled == 0 and not session.active
+    finally:
+        profiler.stop()
+    assert (tmp_path / 'profiles' / (session.id + '.json')).exists()
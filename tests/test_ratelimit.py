@@ -0,0 +1,29 @@
+"""Ограничение попыток входа (ratelimit.py) за обратным прокси."""
+
+
+def _attempt(client, address, forwarded=None):
+    headers = {'X-Forwarded-For': forwarded} if forwarded else {}
+    response = client.post('/login', data={'email': address + '@example.org', 'password': 'wrong'},
+                           headers=headers, environ_base={'REMOTE_ADDR': address})
+    return 'Слишком много попыток входа' in response.get_data(as_text=True)
+
+
+def test_login_limit_keys_on_forwarded_client(make_app):
+    app = make_app(RATE_LIMIT_STORAGE='memory', TRUSTED_PROXIES=1,
+                   RATE_LIMITS={'login_ip': (2, 0), 'login_email': (100, 0)})
+    client = app.test_client()
+    # все запросы приходят от nginx (10.0.0.1), клиенты различаются по X-Forwarded-For
+    assert not _attempt(client, '10.0.0.1', '203.0.113.5')
+    assert not _attempt(client, '10.0.0.1', '203.0.113.5')
+    assert _attempt(client, '10.0.0.1', '203.0.113.5')
+    assert not _attempt(client, '10.0.0.1', '203.0.113.6')
+    # адрес, подставленный клиентом перед настоящим, не учитывается
+    assert _attempt(client, '10.0.0.1', '198.51.100.1, 203.0.113.5')
+
+
+def test_forwarded_header_ignored_without_trusted_proxies(make_app):
+    app = make_app(RATE_LIMIT_STORAGE='memory', TRUSTED_PROXIES=0,
+                   RATE_LIMITS={'login_ip': (1, 0), 'login_email': (100, 0)})
+    client = app.test_client()
+    assert not _attempt(client, '192.0.2.7', '203.0.113.5')
+    assert _attempt(client, '192.0.2.7', '203.0.113.6')
@@ -0,0 +1,38 @@
+"""Счётчики статистики (stats.py)."""
+from werkzeug.security import generate_password_hash
+
+from models import db, User
+from stats import adjust_counter, collect_stats, compute_counters
+
+
+def _stored(scope):
+    snapshot = collect_stats()
+    return {'users.role': snapshot.users_by_role, 'manuscripts.status': snapshot.manuscripts_by_status}[scope]
+
+
+def test_counters_follow_changes(app):
+    with app.app_context():
+        # первая запись новой группы (роль, которой ещё не было) и изменение существующей
+        db.session.add(User(full_name='Гость', email='guest@example.org', role='guest',
+                            password_hash=generate_password_hash('x', 'pbkdf2:sha256:1000')))
+        db.session.add(User(full_name='Автор 2', email='author2@example.org', role='author',
+                            password_hash=generate_password_hash('x', 'pbkdf2:sha256:1000')))
+        db.session.commit()
+        user = User.query.filter_by(email='guest@example.org').one()
+        user.role = 'reviewer'
+        db.session.commit()
+        stored = _stored('users.role')
+        assert stored['guest'] == 0
+        assert {role: n for role, n in stored.items() if n} == compute_counters()['users.role']
+
+
+def test_adjust_counter_creates_and_updates_keys(app):
+    with app.app_context():
+        before = dict(_stored('manuscripts.status'))
+        connection = db.session.connection()
+        adjust_counter(connection, 'manuscripts.status', None, 'archived', 2)
+        adjust_counter(connection, 'manuscripts.status', 'archived', 'rejected', 1)
+        db.session.commit()
+        after = _stored('manuscripts.status')
+        assert after['archived'] == 1
+        assert after['rejected'] == before.get('rejected', 0) + 1
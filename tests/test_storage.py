@@ -0,0 +1,76 @@
+"""Хранилище файлов по содержимому (storage.py): одинаковые файлы, счётчик ссылок, gc-uploads."""
+import hashlib
+import io
+import os
+
+from models import db, Manuscript, ManuscriptHistory, StoredFile
+from storage import stored_file_path
+
+
+def _submit(client, title, content, filename='paper.txt'):
+    response = client.post('/manuscripts/submit', data={'title': title, 'file': (io.BytesIO(content), filename)},
+                           content_type='multipart/form-data')
+    assert response.status_code == 302
+    return Manuscript.query.filter_by(title=title).one()
+
+
+def _delete(manuscript):
+    ManuscriptHistory.query.filter_by(manuscript_id=manuscript.id).delete()
+    db.session.delete(manuscript)
+    db.session.commit()
+
+
+def test_same_file_is_stored_once(app, login):
+    client = login('author')
+    content = b'same manuscript text'
+    sha256 = hashlib.sha256(content).hexdigest()
+    with app.app_context():
+        first = _submit(client, 'Первая', content, 'first.txt')
+        second = _submit(client, 'Вторая', content, 'second.txt')
+        stored = db.session.get(StoredFile, sha256)
+        assert StoredFile.query.filter_by(sha256=sha256).count() == 1
+        assert stored.ref_count == 2 and stored.size == len(content)
+        assert first.file_sha256 == second.file_sha256 == sha256
+        assert (first.file_name, second.file_name) == ('first.txt', 'second.txt')
+        with open(stored_file_path(stored), 'rb') as f:
+            assert f.read() == content
+        assert os.listdir(os.path.join(app.config['UPLOAD_FOLDER'], 'uploads')) == []
+
+
+def test_delete_releases_the_file(app, login):
+    client = login('author')
+    content = b'shared text'
+    sha256 = hashlib.sha256(content).hexdigest()
+    with app.app_context():
+        first = _submit(client, 'Первая', content)
+        second = _submit(client, 'Вторая', content)
+        _delete(first)
+        assert db.session.get(StoredFile, sha256).ref_count == 1
+        _delete(second)
+        db.session.expire_all()
+        assert db.session.get(StoredFile, sha256).ref_count == 0
+
+
+def test_gc_removes_only_unreferenced_files(app, login):
+    client = login('author')
+    with app.app_context():
+        kept = _submit(client, 'Остаётся', b'kept text')
+        dropped = _submit(client, 'Удаляется', b'dropped text')
+        kept_path = stored_file_path(kept.stored_file)
+        dropped_path = stored_file_path(dropped.stored_file)
+        kept_sha256, dropped_sha256 = kept.file_sha256, dropped.file_sha256
+        _delete(dropped)
+
+    result = app.test_cli_runner().invoke(args=['gc-uploads'])
+    assert 'Удалено файлов: 1' in result.output
+    assert os.path.exists(kept_path) and not os.path.exists(dropped_path)
+    with app.app_context():
+        assert db.session.get(StoredFile, dropped_sha256) is None
+        assert db.session.get(StoredFile, kept_sha256).ref_count == 1
+
+
+def test_blob_keeps_extension_of_non_latin_name(app, login):
+    client = login('author')
+    with app.app_context():
+        manuscript = _submit(client, 'Кириллица', b'text', 'статья.PDF')
+        assert manuscript.stored_file.path.endswith(manuscript.file_sha256 + '.pdf')